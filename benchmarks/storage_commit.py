@@ -0,0 +1,104 @@
+"""
+Measures how fast MetricsStorage.commit() writes rows to a local MySQL database.
+
+Rows are written one by one (batch_size=1, how commit() worked before bulk INSERTs)
+and in multi-row batches. The same env variables as storage integration tests are used:
+
+$ TEST_DATABASE=mycroft_holmes TEST_DATABASE_USER=foo TEST_DATABASE_PASSWORD=bar \\
+    python benchmarks/storage_commit.py
+
+When TEST_DATABASE is not set, a temporary SQLite database is used instead.
+
+> Please note that the benchmark removes all rows from the storage tables.
+"""
+import logging
+import time
+
+from os import environ, path
+from tempfile import TemporaryDirectory
+
+from mycroft_holmes.config import Config
+from mycroft_holmes.storage import MetricsStorage
+
+FEATURES = 500
+METRICS = 15
+
+TIMESTAMP = '2019-03-02 20:22:24'
+
+
+class ConfigForBenchmark(Config):
+    """
+    Storage config taken from env variables
+    """
+    # pylint: disable=super-init-not-called
+    def __init__(self, batch_size, sqlite_path):
+        if sqlite_path:
+            self.data = {
+                'storage': {
+                    'engine': 'sqlite',
+                    'path': sqlite_path,
+                }
+            }
+            return
+
+        self.data = {
+            'storage': {
+                'engine': 'mysql',
+                'host': '127.0.0.1',
+                'database': environ['TEST_DATABASE'],
+                'user': environ.get('TEST_DATABASE_USER', 'root'),
+                'password': environ.get('TEST_DATABASE_PASSWORD', ''),
+                'batch_size': batch_size,
+            }
+        }
+
+
+def run(batch_size, sqlite_path=None):
+    """
+    :type batch_size int
+    :type sqlite_path str|None
+    :rtype: float
+    """
+    storage = MetricsStorage(
+        config=ConfigForBenchmark(batch_size, sqlite_path), use_slave=False)
+
+    cursor = storage.storage.cursor()
+
+    for table in ('features_metrics', 'features_metrics_latest', 'features_metrics_daily'):
+        cursor.execute('DELETE FROM {}'.format(table))
+
+    storage.storage.commit()
+
+    for feature in range(FEATURES):
+        storage.push('feature_%d' % feature, {
+            'metric_%d' % metric: metric * 1.5 for metric in range(METRICS)
+        })
+
+    start = time.time()
+    storage.commit(timestamp=TIMESTAMP)
+
+    return time.time() - start
+
+
+def main():
+    """
+    Runs the benchmark
+    """
+    logging.basicConfig(level=logging.WARNING)
+    rows = FEATURES * METRICS
+
+    if 'TEST_DATABASE' not in environ:
+        with TemporaryDirectory() as tmp_dir:
+            took = run(batch_size=None, sqlite_path=path.join(tmp_dir, 'metrics.sqlite'))
+            print('sqlite {:>6} rows in {:.3f} s ({:.0f} rows/s)'.format(
+                rows, took, rows / took))
+        return
+
+    for batch_size in (1, 100, MetricsStorage.DEFAULT_BATCH_SIZE, rows):
+        took = run(batch_size)
+        print('batch_size={:<5} {:>6} rows in {:.3f} s ({:.0f} rows/s)'.format(
+            batch_size, rows, took, rows / took))
+
+
+if __name__ == '__main__':
+    main()
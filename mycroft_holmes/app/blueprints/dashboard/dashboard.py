@@ -12,7 +12,7 @@ from flask import Blueprint, jsonify, render_template, url_for, abort, make_resp
 from mycroft_holmes.app.utils import get_config, get_feature_spec_by_id
 from mycroft_holmes.storage import MetricsStorage
 
-from .models import get_components_with_metrics
+from .models import get_components_with_metrics, get_metrics_snapshot, set_metrics_values
 
 
 dashboard = Blueprint('dashboard', __name__, template_folder='templates')
@@ -25,7 +25,6 @@ def index():
     """
     config = get_config()
     components = get_components_with_metrics(config=config)
-    storage = MetricsStorage(config=config)
     features = []
 
     for component in components:
@@ -37,10 +36,18 @@ def index():
 
         features.append(component)
 
+    storage = MetricsStorage(config=config)
+
+    # return the connection to the pool
+    try:
+        the_latest_timestamp = storage.get_the_latest_timestamp()
+    finally:
+        storage.close()
+
     return render_template(
         'index.html',
         components=components,
-        the_latest_timestamp=storage.get_the_latest_timestamp(),
+        the_latest_timestamp=the_latest_timestamp,
         _json=url_for('dashboard.index_json'),
         _csv=url_for('dashboard.index_csv'),
     )
@@ -123,7 +130,6 @@ def feature(feature_id):
     :rtype: flask.Response
     """
     config = get_config()
-    storage = MetricsStorage(config=config)
 
     # find a feature by ID
     feature_spec = get_feature_spec_by_id(config, feature_id)
@@ -132,6 +138,23 @@ def feature(feature_id):
     if feature_spec is None:
         abort(404, 'Feature "%s" not found' % (feature_id,))
 
+    feature_metrics = config.get_metrics_for_feature(feature_spec['name'])
+    storage = MetricsStorage(config=config)
+
+    # read all values at once and return the connection to the pool
+    try:
+        snapshot = get_metrics_snapshot(
+            storage,
+            pairs=[(feature_id, 'score')] +
+            [(feature_id, metric.get_name()) for metric in feature_metrics]
+        )
+
+        the_latest_timestamp = storage.get_the_latest_timestamp()
+    finally:
+        storage.close()
+
+    set_metrics_values(feature_id, feature_metrics, snapshot)
+
     metrics = [
         {
             'name': metric.get_name(),
@@ -143,7 +166,7 @@ def feature(feature_id):
             'label': metric.get_label(),
             'more_link': metric.get_more_link(),
         }
-        for metric in config.get_metrics_for_feature(feature_spec['name'])
+        for metric in feature_metrics
     ]
 
     # render a spec as YAML
@@ -154,8 +177,8 @@ def feature(feature_id):
         component=feature_spec,
         spec_yaml=spec_yaml,
         metrics=metrics,
-        score=storage.get(feature_id, feature_metric='score'),
-        the_latest_timestamp=storage.get_the_latest_timestamp(),
+        score=snapshot.get((feature_id, 'score')),
+        the_latest_timestamp=the_latest_timestamp,
         _csv=url_for('dashboard.feature_csv', feature_id=feature_id),
         _json='#',
         _yaml=url_for('dashboard.feature_yaml', feature_id=feature_id),
@@ -185,14 +208,17 @@ def feature_csv(feature_id):
     values = defaultdict(dict)
 
     # "merge" different metrics from the same day into CSV per-day rows
-    for row in storage.get_feature_metrics_history(feature_id):
-        date = str(row['date'])
-        metric_name = row['metric']
-        metric_value = row['value']
-
-        # avoid: ValueError: dict contains fields not in fieldnames: 'analytics/events'
-        if metric_name in metrics:
-            values[date][metric_name] = metric_value
+    try:
+        for row in storage.get_feature_metrics_history(feature_id):
+            date = str(row['date'])
+            metric_name = row['metric']
+            metric_value = row['value']
+
+            # avoid: ValueError: dict contains fields not in fieldnames: 'analytics/events'
+            if metric_name in metrics:
+                values[date][metric_name] = metric_value
+    finally:
+        storage.close()
 
     # https://docs.python.org/3.6/library/csv.html#writer-objects
     output = StringIO()
@@ -3,26 +3,57 @@ Models for accessing components and metrics data
 """
 from flask import url_for
 
-from mysql.connector.errors import Error as MycroftMetricsStorageError
+from mycroft_holmes.errors import MycroftMetricsStorageError
 from mycroft_holmes.storage import MetricsStorage
 
 
+def get_metrics_snapshot(storage, pairs=None):
+    """
+    Returns (feature ID, metric) -> value dictionary read using a single query.
+    All metrics are read when no pairs are provided.
+
+    :type storage MetricsStorage
+    :type pairs list[tuple[str, str]]|None
+    :rtype: dict
+    """
+    try:
+        return storage.get_many(pairs) if pairs is not None else storage.get_all_latest()
+    except MycroftMetricsStorageError:
+        return dict()
+
+
+def set_metrics_values(feature_id, metrics, snapshot):
+    """
+    Sets values of metrics taken from the snapshot, so that they are not read one by one
+
+    :type feature_id str
+    :type metrics list[mycroft_holmes.metric.Metric]
+    :type snapshot dict
+    """
+    for metric in metrics:
+        metric.set_value(snapshot.get((feature_id, metric.get_name())))
+
+
 def get_components_with_metrics(config):
     """
     :type: config mycroft_holmes.config.Config
     """
     storage = MetricsStorage(config=config)
 
+    # read all values at once and return the connection to the pool
+    try:
+        snapshot = get_metrics_snapshot(storage)
+    finally:
+        storage.close()
+
     components = []
 
     for feature_name, feature_spec in config.get_features().items():
         feature_id = config.get_feature_id(feature_name)
         metrics = config.get_metrics_for_feature(feature_name)
 
-        try:
-            score = storage.get(feature_id, feature_metric='score')
-        except MycroftMetricsStorageError:
-            score = None
+        set_metrics_values(feature_id, metrics, snapshot)
+        score = snapshot.get((feature_id, 'score'))
 
         component = {
             'id': feature_id,
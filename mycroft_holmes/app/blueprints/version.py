@@ -1,5 +1,6 @@
 """
-Provides a blueprint that renders JSON with software version and environment details
+Provides a blueprint that renders JSON with software version, environment details
+and metrics of storage connection pools
 """
 import sys
 import socket
@@ -7,6 +8,7 @@ import socket
 from flask import Blueprint, jsonify
 
 from mycroft_holmes import VERSION
+from mycroft_holmes.storage import MetricsStorage
 from ..utils import get_config
 
 version_info = Blueprint('version', __name__)
@@ -23,3 +25,13 @@ def version():
         'mike_version': VERSION,
         'dashboard_name': get_config().get_name()
     })
+
+
+@version_info.route('/storage.json')
+def storage():
+    """
+    Metrics of storage connection pools (checkouts, waits, reconnects, ...) of this process
+
+    :rtype: flask.Response
+    """
+    return jsonify(MetricsStorage.get_pools_stats())
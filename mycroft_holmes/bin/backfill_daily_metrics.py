@@ -0,0 +1,40 @@
+"""
+This script (re)builds features_metrics_daily rollup table from the metrics history.
+It needs to be run once after the table is created.
+"""
+import logging
+from argparse import ArgumentParser
+from os import environ
+
+from mycroft_holmes.app.utils import get_config
+from mycroft_holmes.storage import MetricsStorage
+
+
+def get_arguments_parser():
+    """
+    :rtype: ArgumentParser
+    """
+    parser = ArgumentParser(description='Builds daily aggregates of metrics from their history')
+
+    parser.add_argument('config_file', nargs='?',
+                        help='YAML config file to use (defaults to MIKE_CONFIG env variable)')
+
+    return parser
+
+
+def main():
+    """
+    Script entry point
+    """
+    logger = logging.getLogger('backfill_daily_metrics')
+    args = get_arguments_parser().parse_args()
+
+    if args.config_file:
+        environ['MIKE_CONFIG'] = args.config_file
+
+    # set up the metrics storage (and connect to master database)
+    storage = MetricsStorage(config=get_config(), use_slave=False)
+
+    features = storage.backfill_daily_metrics()
+
+    logger.info('Done (%d features)', features)
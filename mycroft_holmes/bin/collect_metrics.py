@@ -2,20 +2,31 @@
 This script should be run periodically to collect metrics
 that are used to calculate scores for features.
 """
+import asyncio
 import logging
+from argparse import ArgumentParser
 from collections import OrderedDict
+from os import environ
 
 from mycroft_holmes.app.utils import get_config
+from mycroft_holmes.cache import CACHES
+from mycroft_holmes.collector import MetricsCollector
 from mycroft_holmes.config import Config
-from mycroft_holmes.errors import MycroftHolmesError
+from mycroft_holmes.errors import MycroftHolmesError, MycroftSourceError
 from mycroft_holmes.sources.base import SourceBase
 from mycroft_holmes.storage import MetricsStorage
 
 
-def get_metrics_for_feature(feature_name, config):
+def get_metrics_for_feature(feature_name, config, values=None):
     """
+    Calculates the score for a given feature.
+
+    Metrics values are fetched one by one, unless they've already been fetched
+    by MetricsCollector and passed via "values".
+
     :type feature_name str
     :type config Config
+    :type values dict|None
     :rtype: OrderedDict
     """
     logger = logging.getLogger('get_metrics_for_feature')
@@ -29,7 +40,17 @@ def get_metrics_for_feature(feature_name, config):
         metric_name = metric.get_name()
 
         try:
-            metric_value = metric.fetch_value()
+            if values is not None:
+                if (feature_name, metric_name) not in values:
+                    raise MycroftSourceError('Value has not been fetched by MetricsCollector')
+
+                metric_value = values[(feature_name, metric_name)]
+
+                # this one failed when fetched by MetricsCollector
+                if isinstance(metric_value, MycroftHolmesError):
+                    raise metric_value
+            else:
+                metric_value = metric.fetch_value()
 
             result[metric_name] = metric_value
             feature_score += metric_value * metric.get_weight()
@@ -42,11 +63,33 @@ def get_metrics_for_feature(feature_name, config):
     return result
 
 
+def get_arguments_parser():
+    """
+    :rtype: ArgumentParser
+    """
+    parser = ArgumentParser(description='Collects metrics for features defined in the config file')
+
+    parser.add_argument('config_file', nargs='?',
+                        help='YAML config file to use (defaults to MIKE_CONFIG env variable)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='fetch metrics values concurrently using N worker threads')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='fetch metrics values asynchronously on a single event loop')
+    parser.add_argument('--concurrency', type=int, default=10,
+                        help='max number of requests in flight per source (when using --async)')
+
+    return parser
+
+
 def main():
     """
     Script entry point
     """
     logger = logging.getLogger('collect_metrics')
+    args = get_arguments_parser().parse_args()
+
+    if args.config_file:
+        environ['MIKE_CONFIG'] = args.config_file
 
     # list available sources
     logger.info('Available sources: %s', SourceBase.get_sources_names())
@@ -63,11 +106,25 @@ def main():
 
     # print(storage.get('ckeditor', 'score')); exit(1)
 
-    # fetch metrics values for eac feature and calculate their score
+    # fetch metrics values for all features (using a pool of worker threads or an event loop)
+    collector = MetricsCollector(
+        config=config, workers=args.workers, concurrency=args.concurrency)
+
+    if args.use_async:
+        loop = asyncio.new_event_loop()
+
+        try:
+            values = loop.run_until_complete(collector.fetch_values_async())
+        finally:
+            loop.close()
+    else:
+        values = collector.fetch_values()
+
+    # now calculate the score of each feature
     for _, feature in config.get_features().items():
         try:
             feature_id = Config.get_feature_id(feature['name'])
-            feature_metrics = get_metrics_for_feature(feature['name'], config)
+            feature_metrics = get_metrics_for_feature(feature['name'], config, values=values)
 
             storage.push(feature_id, feature_metrics)
 
@@ -78,4 +135,9 @@ def main():
             exit(1)
 
     storage.commit()
+
+    # report how persistent caches performed
+    for namespace, cache in CACHES.items():
+        logger.info('Cache stats for "%s" sources: %s', namespace, cache.get_stats())
+
     logger.info('Done')
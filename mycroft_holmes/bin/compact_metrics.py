@@ -0,0 +1,40 @@
+"""
+This script should be run periodically (e.g. daily) to apply the retention policy
+configured in the storage section of the config file.
+"""
+import logging
+from argparse import ArgumentParser
+from os import environ
+
+from mycroft_holmes.app.utils import get_config
+from mycroft_holmes.storage import MetricsStorage
+
+
+def get_arguments_parser():
+    """
+    :rtype: ArgumentParser
+    """
+    parser = ArgumentParser(description='Removes and downsamples old metrics values')
+
+    parser.add_argument('config_file', nargs='?',
+                        help='YAML config file to use (defaults to MIKE_CONFIG env variable)')
+
+    return parser
+
+
+def main():
+    """
+    Script entry point
+    """
+    logger = logging.getLogger('compact_metrics')
+    args = get_arguments_parser().parse_args()
+
+    if args.config_file:
+        environ['MIKE_CONFIG'] = args.config_file
+
+    # set up the metrics storage (and connect to master database)
+    storage = MetricsStorage(config=get_config(), use_slave=False)
+
+    stats = storage.compact()
+
+    logger.info('Done: %s', stats)
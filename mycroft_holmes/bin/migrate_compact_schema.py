@@ -0,0 +1,42 @@
+"""
+This script copies metrics history to the compact schema tables (see schema.sql).
+It can be stopped and run again, it resumes from the last row copied.
+"""
+import logging
+from argparse import ArgumentParser
+from os import environ
+
+from mycroft_holmes.app.utils import get_config
+from mycroft_holmes.storage import MetricsStorage
+
+
+def get_arguments_parser():
+    """
+    :rtype: ArgumentParser
+    """
+    parser = ArgumentParser(description='Copies metrics history to the compact schema tables')
+
+    parser.add_argument('config_file', nargs='?',
+                        help='YAML config file to use (defaults to MIKE_CONFIG env variable)')
+    parser.add_argument('--batch-size', type=int, default=MetricsStorage.DEFAULT_COMPACT_BATCH_SIZE,
+                        help='rows copied by a single query')
+
+    return parser
+
+
+def main():
+    """
+    Script entry point
+    """
+    logger = logging.getLogger('migrate_compact_schema')
+    args = get_arguments_parser().parse_args()
+
+    if args.config_file:
+        environ['MIKE_CONFIG'] = args.config_file
+
+    # set up the metrics storage (and connect to master database)
+    storage = MetricsStorage(config=get_config(), use_slave=False)
+
+    rows = storage.migrate_to_compact_schema(batch_size=args.batch_size)
+
+    logger.info('Done (%d rows copied)', rows)
@@ -0,0 +1,40 @@
+"""
+This script (re)builds the history store (see "history_path" entry of the storage config section)
+from metrics kept in the database. It needs to be run once after the history store is enabled.
+"""
+import logging
+from argparse import ArgumentParser
+from os import environ
+
+from mycroft_holmes.app.utils import get_config
+from mycroft_holmes.storage import MetricsStorage
+
+
+def get_arguments_parser():
+    """
+    :rtype: ArgumentParser
+    """
+    parser = ArgumentParser(description='Builds the history store from metrics history')
+
+    parser.add_argument('config_file', nargs='?',
+                        help='YAML config file to use (defaults to MIKE_CONFIG env variable)')
+
+    return parser
+
+
+def main():
+    """
+    Script entry point
+    """
+    logger = logging.getLogger('rebuild_history_store')
+    args = get_arguments_parser().parse_args()
+
+    if args.config_file:
+        environ['MIKE_CONFIG'] = args.config_file
+
+    # set up the metrics storage (and connect to master database)
+    storage = MetricsStorage(config=get_config(), use_slave=False)
+
+    rows = storage.rebuild_history_store()
+
+    logger.info('Done (%d rows stored)', rows)
@@ -0,0 +1,40 @@
+"""
+This script stores metrics kept in the local spool file (see "spool_path" entry of the storage
+config section) when the database could not be reached. Runs that are already stored are skipped.
+"""
+import logging
+from argparse import ArgumentParser
+from os import environ
+
+from mycroft_holmes.app.utils import get_config
+from mycroft_holmes.storage import MetricsStorage
+
+
+def get_arguments_parser():
+    """
+    :rtype: ArgumentParser
+    """
+    parser = ArgumentParser(description='Stores metrics kept in the spool file')
+
+    parser.add_argument('config_file', nargs='?',
+                        help='YAML config file to use (defaults to MIKE_CONFIG env variable)')
+
+    return parser
+
+
+def main():
+    """
+    Script entry point
+    """
+    logger = logging.getLogger('replay_spool')
+    args = get_arguments_parser().parse_args()
+
+    if args.config_file:
+        environ['MIKE_CONFIG'] = args.config_file
+
+    # set up the metrics storage (and connect to master database)
+    storage = MetricsStorage(config=get_config(), use_slave=False)
+
+    rows = storage.replay_spool()
+
+    logger.info('Done (%d rows stored)', rows)
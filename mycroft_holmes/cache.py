@@ -0,0 +1,193 @@
+"""
+Persistent cache used by sources to keep data between collection runs
+"""
+import json
+import logging
+import sqlite3
+import time
+
+from collections import Counter
+from threading import RLock
+
+from .errors import MycroftHolmesError
+
+# namespace -> PersistentCache
+CACHES = dict()
+
+
+# pylint: disable=too-many-instance-attributes
+class PersistentCache:
+    """
+    SQLite-backed key-value cache with TTL and size limit. Values are stored JSON-encoded.
+
+    Each source kind (e.g. "http") uses its own namespace and can have its own limits.
+    """
+    def __init__(self, path, namespace, max_size=None, ttl=None):
+        """
+        :type path str
+        :type namespace str
+        :type max_size int|None
+        :type ttl int|None
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.path = path
+        self.namespace = namespace
+        self.max_size = max_size  # in bytes
+        self.ttl = ttl  # in seconds
+
+        self._connection = None
+        self._lock = RLock()
+        self._stats = Counter()
+
+    def __repr__(self):
+        """
+        :rtype: str
+        """
+        return '<{} {}:{}>'.format(self.__class__.__name__, self.path, self.namespace)
+
+    @property
+    def connection(self):
+        """
+        Lazy-connect to SQLite database file and set up the schema
+
+        :rtype: sqlite3.Connection
+        """
+        if self._connection is None:
+            self.logger.info('Using %s (max size: %s bytes, TTL: %s s)',
+                             self, self.max_size, self.ttl)
+
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                'size INTEGER NOT NULL, updated_at REAL NOT NULL, '
+                'PRIMARY KEY (namespace, key))'
+            )
+
+        return self._connection
+
+    def get(self, key):
+        """
+        Returns the cached value or None when it's not there or has expired
+
+        :type key str
+        :rtype: object|None
+        """
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT value, updated_at FROM cache WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        value, updated_at = row
+
+        if self.ttl is not None and updated_at < time.time() - self.ttl:
+            self.logger.debug('Entry for "%s" has expired', key)
+            return None
+
+        return json.loads(value)
+
+    def set(self, key, value):
+        """
+        :type key str
+        :type value object
+        """
+        value = json.dumps(value)
+
+        with self._lock:
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO cache (namespace, key, value, size, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (self.namespace, key, value, len(value), time.time())
+                )
+
+                self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently updated entries when the cache has grown over the size limit
+        """
+        if self.max_size is None:
+            return
+
+        size = self.connection.execute(
+            'SELECT SUM(size) FROM cache WHERE namespace = ?', (self.namespace,)).fetchone()[0]
+
+        if size <= self.max_size:
+            return
+
+        rows = self.connection.execute(
+            'SELECT key, size FROM cache WHERE namespace = ? ORDER BY updated_at',
+            (self.namespace,)
+        ).fetchall()
+
+        for key, entry_size in rows:
+            if size <= self.max_size:
+                break
+
+            self.connection.execute(
+                'DELETE FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+            size -= entry_size
+
+    def record(self, hit, **savings):
+        """
+        Updates cache stats, e.g. record(hit=True, seconds_saved=2.5)
+
+        :type hit bool
+        :type savings dict
+        """
+        with self._lock:
+            self._stats['hits' if hit else 'misses'] += 1
+            self._stats.update(savings)
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        """
+        stats = {'hits': 0, 'misses': 0}
+        stats.update(self._stats)
+
+        return stats
+
+
+def get_cache(config, namespace):
+    """
+    Returns the persistent cache for a given namespace as configured in "cache" section
+    of the config file. None is returned when it's not enabled.
+
+    ```yaml
+    cache:
+      path: /var/cache/mike/cache.sqlite
+      http:
+        max_size: 10485760  # in bytes
+        ttl: 86400  # in seconds
+    ```
+
+    :type config mycroft_holmes.config.Config
+    :type namespace str
+    :rtype: PersistentCache|None
+    """
+    cache_config = config.get_raw().get('cache')
+
+    if not cache_config or namespace not in cache_config:
+        return None
+
+    if 'path' not in cache_config:
+        raise MycroftHolmesError('"path" needs to be specified in "cache" config section')
+
+    if namespace not in CACHES:
+        namespace_config = cache_config[namespace] or {}
+
+        CACHES[namespace] = PersistentCache(
+            path=cache_config['path'],
+            namespace=namespace,
+            max_size=namespace_config.get('max_size'),
+            ttl=namespace_config.get('ttl'),
+        )
+
+    return CACHES[namespace]
@@ -0,0 +1,280 @@
+"""
+Fetches metrics values for all features
+"""
+import asyncio
+import logging
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .errors import MycroftHolmesError, MycroftSourceError
+from .sources.base import SourceBase
+from .sources.mysql import close_pools
+
+
+class MetricsCollector:
+    """
+    Fetches values of metrics of all features defined in the config file.
+
+    Metrics are fetched using a pool of worker threads (or on a single event loop)
+    as most of the time is spent on waiting for sources (Jira, Athena, Google Analytics, ...)
+    to respond.
+
+    Metrics that resolve to the very same source query (e.g. two features with the same
+    Jira project) are coalesced - such query is run only once per collection run.
+    """
+    def __init__(self, config, workers=1, concurrency=10):
+        """
+        :type config mycroft_holmes.config.Config
+        :type workers int
+        :type concurrency int
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.config = config
+        self.workers = max(1, int(workers))
+
+        # how many requests can be run at the same time against a single source (async mode)
+        self.concurrency = max(1, int(concurrency))
+
+    def get_metrics(self):
+        """
+        Returns (feature name, metric name) -> metric dictionary for all features
+
+        :rtype: OrderedDict
+        """
+        metrics = OrderedDict()
+
+        for feature_name in self.config.get_features().keys():
+            for metric in self.config.get_metrics_for_feature(feature_name):
+                metrics[(feature_name, metric.get_name())] = metric
+
+        return metrics
+
+    @staticmethod
+    def get_request_key(metric):
+        """
+        Returns (source instance, fully resolved query) tuple for a given metric
+
+        None is returned when the metric can not be resolved (e.g. its source is not known).
+        Such metric will be fetched on its own and will report an error then.
+
+        :type metric mycroft_holmes.metric.Metric
+        :rtype: tuple|None
+        """
+        if metric.get_source_name() is None:
+            return None
+
+        try:
+            source = metric.get_source()
+            return source, source.get_request_key(**metric.get_spec())
+        except (AssertionError, MycroftHolmesError):
+            return None
+
+    def get_requests(self):
+        """
+        Groups metrics of all features by the request they resolve to.
+
+        Returns request key -> list of ((feature name, metric name), metric) tuples
+
+        :rtype: OrderedDict
+        """
+        requests = OrderedDict()
+        metrics = self.get_metrics()
+
+        for key, metric in metrics.items():
+            request_key = self.get_request_key(metric) or key
+            requests.setdefault(request_key, []).append((key, metric))
+
+        self.logger.info('%d metrics values resolve to %d distinct requests',
+                         len(metrics), len(requests))
+
+        return requests
+
+    @staticmethod
+    def get_sources(requests):
+        """
+        Returns sources used by given requests
+
+        :type requests OrderedDict
+        :rtype: set[SourceBase]
+        """
+        return set(
+            request_key[0] for request_key in requests.keys()
+            if isinstance(request_key[0], SourceBase)
+        )
+
+    @staticmethod
+    def get_batches(requests):
+        """
+        Splits requests into batches that are run as a single task.
+
+        Requests for sources that support batching (see SourceBase.BATCH_SIZE) are grouped
+        by source, the remaining ones are run on their own. Returns the list of
+        (source, request keys) tuples, source is None for requests run on their own.
+
+        :type requests OrderedDict
+        :rtype: list[tuple]
+        """
+        batches = []
+        batched = OrderedDict()  # source -> request keys
+
+        for request_key in requests.keys():
+            source = request_key[0]
+
+            if isinstance(source, SourceBase) and source.BATCH_SIZE:
+                batched.setdefault(source, []).append(request_key)
+            else:
+                batches.append((None, [request_key]))
+
+        for source, request_keys in batched.items():
+            # the source decides which requests are asked for together
+            specs = [requests[request_key][0][1].get_spec() for request_key in request_keys]
+
+            for indices in source.get_batches(specs):
+                batches.append((source, [request_keys[index] for index in indices]))
+
+        return batches
+
+    @staticmethod
+    def fetch_batch(requests, source, request_keys):
+        """
+        Returns values for given requests, failed fetches are represented
+        by MycroftHolmesError instances.
+
+        :type requests OrderedDict
+        :type source SourceBase|None
+        :type request_keys list[tuple]
+        :rtype: list
+        """
+        # run each distinct request using the first metric that needs it
+        metrics = [requests[request_key][0][1] for request_key in request_keys]
+
+        try:
+            if source is not None:
+                return source.get_values([metric.get_spec() for metric in metrics])
+
+            return [metrics[0].fetch_value()]
+        except MycroftHolmesError as ex:
+            # the entire batch has failed
+            return [ex] * len(metrics)
+
+    def fan_out(self, requests, request_keys, results, values):
+        """
+        Passes the result of each request to every metric that needs it
+
+        :type requests OrderedDict
+        :type request_keys list[tuple]
+        :type results list
+        :type values dict
+        """
+        if len(results) != len(request_keys):
+            # results can not be matched with requests, treat the entire batch as failed
+            self.logger.error('Got %d results for a batch of %d requests',
+                              len(results), len(request_keys))
+
+            results = [MycroftSourceError(
+                'Failed to get metric value: got %d results for a batch of %d requests' %
+                (len(results), len(request_keys)))] * len(request_keys)
+
+        for request_key, value in zip(request_keys, results):
+            for key, _ in requests[request_key]:
+                values[key] = value
+
+    def fetch_values(self):
+        """
+        Fetches values of all metrics. Values are keyed by (feature name, metric name) tuple,
+        failed fetches are represented by MycroftHolmesError instances.
+
+        :rtype: dict
+        """
+        requests = self.get_requests()
+        batches = self.get_batches(requests)
+        values = dict()
+
+        self.logger.info('Fetching %d requests in %d batches using %d worker(s)',
+                         len(requests), len(batches), self.workers)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    (request_keys, executor.submit(
+                        self.fetch_batch, requests, source, request_keys))
+                    for source, request_keys in batches
+                ]
+
+                for request_keys, future in futures:
+                    self.fan_out(requests, request_keys, future.result(), values)
+        finally:
+            # let sources clean up after the run
+            for source in self.get_sources(requests):
+                source.close()
+
+            # pools of database connections are shared by sources
+            close_pools()
+
+        return values
+
+    async def fetch_values_async(self):
+        """
+        Fetches values of all metrics on the current event loop.
+
+        Each source gets its own semaphore that limits the number of requests
+        (or batches of requests) in flight. Sources with no async implementation
+        are run in the loop's default executor.
+
+        :rtype: dict
+        """
+        requests = self.get_requests()
+        batches = self.get_batches(requests)
+        semaphores = dict()
+
+        self.logger.info('Fetching %d requests in %d batches asynchronously '
+                         '(%d requests per source)',
+                         len(requests), len(batches), self.concurrency)
+
+        async def fetch_batch(source, request_keys):
+            """
+            :type source SourceBase|None
+            :type request_keys list[tuple]
+            :rtype: list
+            """
+            metrics = [requests[request_key][0][1] for request_key in request_keys]
+
+            try:
+                if source is None and metrics[0].get_source_name():
+                    semaphore_key = metrics[0].get_source()
+                else:
+                    semaphore_key = source
+
+                if semaphore_key not in semaphores:
+                    semaphores[semaphore_key] = asyncio.Semaphore(self.concurrency)
+
+                async with semaphores[semaphore_key]:
+                    if source is not None:
+                        return await source.get_values_async(
+                            [metric.get_spec() for metric in metrics])
+
+                    return [await metrics[0].fetch_value_async()]
+
+            except MycroftHolmesError as ex:
+                return [ex] * len(metrics)
+
+        try:
+            results = await asyncio.gather(*[
+                fetch_batch(source, request_keys) for source, request_keys in batches
+            ])
+        finally:
+            # close HTTP sessions set up by sources and let them clean up after the run
+            for source in self.get_sources(requests):
+                await source.close_async()
+                source.close()
+
+            close_pools()
+
+        values = dict()
+
+        for (_, request_keys), batch_results in zip(batches, results):
+            self.fan_out(requests, request_keys, batch_results, values)
+
+        return values
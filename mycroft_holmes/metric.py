@@ -58,7 +58,7 @@ class Metric:
         """
         return self.spec.get('weight', 1)
 
-    def _get_source(self):
+    def get_source(self):
         """
         :rtype: SourceBase
         """
@@ -76,10 +76,27 @@ class Metric:
         if self.get_source_name() is None:
             raise MycroftMetricError('"%s" has no source specified, skipping!' % self.get_name())
 
-        source = self._get_source()
+        source = self.get_source()
 
         return source.get_value(**self.get_spec())
 
+    async def fetch_value_async(self):
+        """
+        Fetches the metric value from the appropriate source
+        (asynchronous counterpart of fetch_value)
+
+        :raise: MycroftMetricError
+        :rtype: int
+        """
+        self.logger.debug('Fetching value for: %s', self.get_spec())
+
+        if self.get_source_name() is None:
+            raise MycroftMetricError('"%s" has no source specified, skipping!' % self.get_name())
+
+        source = self.get_source()
+
+        return await source.get_value_async(**self.get_spec())
+
     @property
     def _label(self):
         """
@@ -94,7 +111,7 @@ class Metric:
 
     def set_value(self, value):
         """
-        This one is used in unit tests
+        Used by the dashboard to set values read in bulk from the storage (and in unit tests)
 
         :type value int|float|None
         """
@@ -112,10 +129,15 @@ class Metric:
         # lazy-load value from the storage
         if self._value is False:
             storage = MetricsStorage(config=self.config)
-            self._value = storage.get(
-                feature_id=self.config.get_feature_id(self.feature_name),
-                feature_metric=self.get_name()
-            )
+
+            # return the connection to the pool even when the read fails
+            try:
+                self._value = storage.get(
+                    feature_id=self.config.get_feature_id(self.feature_name),
+                    feature_metric=self.get_name()
+                )
+            finally:
+                storage.close()
 
         return self._value
 
@@ -185,6 +207,6 @@ class Metric:
         :rtype: tuple[str, str]|None
         """
         try:
-            return self._get_source().get_more_link(**self.get_spec())
+            return self.get_source().get_more_link(**self.get_spec())
         except MycroftSourceError:
             return None
@@ -4,15 +4,23 @@ GoogleAnalyticsSource class
 """
 import json
 
+from collections import OrderedDict
+from threading import RLock, local
+
 # https://developers.google.com/api-client-library/python/start/installation
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from google.auth.exceptions import GoogleAuthError
 from google.oauth2.service_account import Credentials
 
-from mycroft_holmes.errors import MycroftSourceError
+from mycroft_holmes.errors import MycroftHolmesError, MycroftSourceError
 from mycroft_holmes.utils import format_query
 
 from .base import SourceBase
 
+# errors of Google API calls and malformed responses
+API_ERRORS = (MycroftHolmesError, HttpError, GoogleAuthError, OSError, KeyError, IndexError)
+
 
 class GoogleAnalyticsSource(SourceBase):
     """
@@ -63,10 +71,40 @@ class GoogleAnalyticsSource(SourceBase):
             metrics:
               -  name: analytics/events
     ```
+
+    #### Dimension fan-out
+
+    When features differ only in a value of a single dimension used in `filters`,
+    add `dimension` to the metric config. A single report grouped by this dimension
+    will be fetched per collection run and values for each feature will be taken from it.
+
+    ```yaml
+        metrics:
+          - name: analytics/events
+            source: foo/analytics
+            metric: "ga:totalEvents"
+            filters: "{ga_filter}"  # e.g. "ga:eventCategory==foo_bar"
+            dimension: "ga:eventCategory"
+    ```
     """
 
     NAME = 'common/analytics'
 
+    # Reporting API v4 limits: up to 5 report requests per batchGet call,
+    # up to 10 metrics per report request
+    MAX_REPORT_REQUESTS = 5
+    MAX_METRICS_PER_REPORT = 10
+
+    BATCH_SIZE = MAX_REPORT_REQUESTS * MAX_METRICS_PER_REPORT
+
+    # values are fetched for the last 24h grouped by day (20161016)
+    START_DATE = '1daysAgo'
+    END_DATE = '1daysAgo'
+    DIMENSION = 'ga:date'
+
+    # rows per page of reports grouped by a fan-out dimension
+    PAGE_SIZE = 10000
+
     def __init__(self, credentials, view_id, client=None):
         """
         :type credentials str
@@ -80,14 +118,24 @@ class GoogleAnalyticsSource(SourceBase):
 
         self._client = client or None
 
+        # httplib2 used by Google API client is not thread-safe, each worker thread gets its own
+        self._local = local()
+
+        # (metric, filters, dimension) -> dimension value -> metric value (for the current run)
+        self._dimension_reports = dict()
+        self._lock = RLock()
+
     @property
     def client(self):
         """
-        Set up Google API lazily
+        Set up Google API lazily (one client per thread)
 
         :rtype: googleapiclient.discovery.Resource
         """
-        if not self._client:
+        if self._client:
+            return self._client
+
+        if getattr(self._local, 'client', None) is None:
             self.logger.info('Setting up Google API client')
 
             try:
@@ -102,7 +150,7 @@ class GoogleAnalyticsSource(SourceBase):
             self.logger.info('Using service account for %s',
                              service_account_info.get('client_email'))
 
-            self._client = build(
+            self._local.client = build(
                 'analyticsreporting', 'v4',
                 credentials=Credentials.from_service_account_info(info=service_account_info),
                 # file_cache is unavailable when using oauth2client >= 4.0.0 or google-auth
@@ -111,13 +159,13 @@ class GoogleAnalyticsSource(SourceBase):
 
             self.logger.info('Connected with Google API for Analytics view #%d', self.view_id)
 
-        return self._client
+        return self._local.client
 
-    def _query(self, start_date, end_date, metric, filters=None, dimension=None):
+    def _get_report_request(self, start_date, end_date, metrics, filters=None, dimension=None):
         """
         :type start_date str
         :type end_date str
-        :type metric str
+        :type metrics list[str]
         :type filters str|tuple
         :type dimension str
         :rtype dict
@@ -126,7 +174,7 @@ class GoogleAnalyticsSource(SourceBase):
         report_request = {
             'viewId': str(self.view_id),
             'dateRanges': [{'startDate': start_date, 'endDate': end_date}],
-            'metrics': [{'expression': metric}],
+            'metrics': [{'expression': metric} for metric in metrics],
         }
 
         if filters is not None:
@@ -136,17 +184,50 @@ class GoogleAnalyticsSource(SourceBase):
         if dimension is not None:
             report_request['dimensions'] = [{'name': dimension}]
 
+        return report_request
+
+    def _batch_get(self, report_requests):
+        """
+        :type report_requests list[dict]
+        :rtype dict
+        """
         body = {
-            'reportRequests': [report_request]
+            'reportRequests': report_requests
         }
 
         self.logger.debug('Query: %s', body)
         return self.client.reports().batchGet(body=body).execute()
 
-    def get_value(self, **kwargs):
+    def _query(self, start_date, end_date, metric, filters=None, dimension=None):
         """
-        :raise: MycroftSourceError
-        :rtype: float
+        :type start_date str
+        :type end_date str
+        :type metric str
+        :type filters str|tuple
+        :type dimension str
+        :rtype dict
+        """
+        return self._batch_get([
+            self._get_report_request(start_date, end_date, [metric], filters, dimension)
+        ])
+
+    @staticmethod
+    def _get_values_from_report(report):
+        """
+        Returns values of all metrics of a given report
+
+        :type report dict
+        :raise: KeyError
+        :rtype: list[float]
+        """
+        # [{'metrics': [{'values': ['270634']}], 'dimensions': ['20181213']}]
+        rows = report['data']['rows']
+        return [float(value) for value in rows[0]['metrics'][0]['values']]
+
+    @staticmethod
+    def _get_metric_and_filters(**kwargs):
+        """
+        :rtype: tuple[str, str]
         """
         metric = kwargs.get('metric')
         filters = kwargs.get('filters', '')  # defaults to an empty string
@@ -155,17 +236,291 @@ class GoogleAnalyticsSource(SourceBase):
         assert isinstance(metric, str), '"metric" parameter needs to be provided'
 
         # apply template variables
-        metric = format_query(metric, kwargs.get('template'))
-        filters = format_query(filters, kwargs.get('template'))
+        return format_query(metric, kwargs.get('template')), \
+            format_query(filters, kwargs.get('template'))
+
+    def get_request_key(self, **kwargs):
+        """
+        :rtype: tuple
+        """
+        return self._get_metric_and_filters(**kwargs)
+
+    def get_batch_key(self, **kwargs):
+        """
+        Metrics with the same filters are asked for in a single report request
+
+        :rtype: str
+        """
+        return self._get_metric_and_filters(**kwargs)[1]
+
+    def _pack_reports(self, specs, values):
+        """
+        Packs metrics with the same filters into report requests (up to 10 metrics each).
+
+        Returns the list of (filters, list of (spec index, metric) tuples) tuples.
+        Values of dimension fan-out metrics are taken from grouped reports and set
+        in values list right away.
+
+        :type specs list[dict]
+        :type values list
+        :rtype: list[tuple]
+        """
+        # filters -> list of (spec index, metric) tuples
+        groups = OrderedDict()
+
+        for index, spec in enumerate(specs):
+            if spec.get('dimension'):
+                try:
+                    values[index] = self.get_value(**spec)
+                except MycroftHolmesError as ex:
+                    values[index] = ex
+                continue
+
+            metric, filters = self._get_metric_and_filters(**spec)
+            groups.setdefault(filters, []).append((index, metric))
+
+        reports = []
+
+        for filters, metrics in groups.items():
+            for offset in range(0, len(metrics), self.MAX_METRICS_PER_REPORT):
+                reports.append((filters, metrics[offset:offset + self.MAX_METRICS_PER_REPORT]))
+
+        return reports
+
+    def _fetch_reports(self, reports):
+        """
+        Sends report requests in a single batchGet call and returns the values of each report
+
+        :type reports list[tuple]
+        :raise: HttpError
+        :rtype: list[list[float]|MycroftSourceError]
+        """
+        self.logger.info('Fetching %d metrics in %d report requests',
+                         sum(len(metrics) for _, metrics in reports), len(reports))
+
+        res = self._batch_get([
+            self._get_report_request(
+                start_date=self.START_DATE, end_date=self.END_DATE,
+                metrics=[metric for _, metric in metrics],
+                filters=filters,
+                dimension=self.DIMENSION,
+            )
+            for filters, metrics in reports
+        ])
+
+        self.logger.debug('API response: %s', res)
+        return [self._get_report_values(report) for report in res['reports']]
+
+    def _fetch_metrics_values(self, reports):
+        """
+        Returns values of metrics of each report (failed fetches are represented
+        by MycroftSourceError instances).
+
+        A single invalid metric or filter makes the API reject the entire batchGet call,
+        so such calls are retried one report request and then one metric at a time.
+
+        :type reports list[tuple]
+        :rtype: list[list[float|MycroftSourceError]]
+        """
+        try:
+            return [
+                [report_values] * len(metrics) if isinstance(report_values, Exception)
+                else report_values
+                for (_, metrics), report_values in zip(reports, self._fetch_reports(reports))
+            ]
+
+        except API_ERRORS as ex:
+            self.logger.error('get_values() failed', exc_info=True)
+            error = MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+            # the request is invalid (HTTP 400), narrow it down
+            if isinstance(ex, HttpError) and ex.resp.status == 400:
+                if len(reports) > 1:
+                    return [self._fetch_metrics_values([report])[0] for report in reports]
+
+                (filters, metrics) = reports[0]
+
+                if len(metrics) > 1:
+                    return [[
+                        self._fetch_metrics_values([(filters, [metric])])[0][0]
+                        for metric in metrics
+                    ]]
+
+            return [[error] * len(metrics) for _, metrics in reports]
+
+    def get_values(self, specs):
+        """
+        Packs metrics with the same filters into report requests (up to 10 metrics each)
+        and sends them in as few batchGet calls as possible (up to 5 report requests each).
+
+        :type specs list[dict]
+        :rtype: list[float|MycroftSourceError]
+        """
+        values = [None] * len(specs)
+        reports = self._pack_reports(specs, values)
+
+        for offset in range(0, len(reports), self.MAX_REPORT_REQUESTS):
+            chunk = reports[offset:offset + self.MAX_REPORT_REQUESTS]
+
+            # split the results back out per metric
+            for (_, metrics), metrics_values in zip(chunk, self._fetch_metrics_values(chunk)):
+                for (index, _), value in zip(metrics, metrics_values):
+                    values[index] = value
+
+        return values
+
+    def _get_report_values(self, report):
+        """
+        :type report dict
+        :rtype: list[float]|MycroftSourceError
+        """
+        try:
+            return self._get_values_from_report(report)
+        except (KeyError, IndexError) as ex:
+            self.logger.error('Failed to get the values from API response: %s', report)
+            return MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+    @staticmethod
+    def split_filters(filters, dimension):
+        """
+        Splits filters into the fan-out dimension value and the remaining filters, e.g.
+
+        "ga:eventCategory==foo;ga:country==PL" -> ("foo", "ga:country==PL")
+
+        :type filters str
+        :type dimension str
+        :raise: AssertionError
+        :rtype: tuple[str, str]
+        """
+        prefix = dimension + '=='
+        expressions = filters.split(';') if filters else []
+
+        matches = [expression for expression in expressions if expression.startswith(prefix)]
+
+        assert len(matches) == 1 and ',' not in matches[0], \
+            '"filters" need to have a single "%s==<value>" expression' % dimension
+
+        remaining = [expression for expression in expressions if not expression.startswith(prefix)]
+
+        return matches[0][len(prefix):], ';'.join(remaining)
+
+    def _fetch_dimension_report(self, metric, filters, dimension):
+        """
+        Fetches all pages of a report grouped by a given dimension
+
+        :type metric str
+        :type filters str
+        :type dimension str
+        :rtype: dict
+        """
+        values = dict()
+        page_token = None
+
+        while True:
+            report_request = self._get_report_request(
+                start_date=self.START_DATE, end_date=self.END_DATE,
+                metrics=[metric], filters=filters, dimension=dimension)
+
+            report_request['pageSize'] = self.PAGE_SIZE
+
+            if page_token:
+                report_request['pageToken'] = page_token
+
+            report = self._batch_get([report_request])['reports'][0]
+
+            # [{'metrics': [{'values': ['270634']}], 'dimensions': ['foo_bar']}]
+            for row in report['data'].get('rows', []):
+                values[row['dimensions'][0]] = float(row['metrics'][0]['values'][0])
+
+            page_token = report.get('nextPageToken')
+
+            if not page_token:
+                break
+
+        self.logger.info('Got %d rows of %s report grouped by %s (filters: %s)',
+                         len(values), metric, dimension, filters)
+
+        return values
+
+    def get_dimension_report(self, metric, filters, dimension):
+        """
+        Returns metric values keyed by dimension value.
+        The report is fetched once per collection run.
+
+        :type metric str
+        :type filters str
+        :type dimension str
+        :rtype: dict
+        """
+        key = (metric, filters, dimension)
+
+        with self._lock:
+            if key not in self._dimension_reports:
+                try:
+                    self._dimension_reports[key] = \
+                        self._fetch_dimension_report(metric, filters, dimension)
+                except API_ERRORS as ex:
+                    # do not ask for it again for every feature
+                    self._dimension_reports[key] = \
+                        MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+        report = self._dimension_reports[key]
+
+        if isinstance(report, Exception):
+            raise report
+
+        return report
+
+    def _get_value_from_dimension_report(self, metric, filters, dimension):
+        """
+        :type metric str
+        :type filters str
+        :type dimension str
+        :raise: MycroftSourceError
+        :rtype: float
+        """
+        dimension_value, filters = self.split_filters(filters, dimension)
+
+        self.logger.info('Metric: %s for %s==%s (filters: %s)',
+                         metric, dimension, dimension_value, filters)
+
+        try:
+            report = self.get_dimension_report(metric, filters, dimension)
+        except Exception as ex:
+            self.logger.error('get_dimension_report() failed', exc_info=True)
+            raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+        if dimension_value not in report:
+            raise MycroftSourceError('Failed to get metric value: no data for %s==%s' %
+                                     (dimension, dimension_value))
+
+        return report[dimension_value]
+
+    def close(self):
+        """
+        Drops reports fetched during the collection run
+        """
+        with self._lock:
+            self._dimension_reports.clear()
+
+    def get_value(self, **kwargs):
+        """
+        :raise: MycroftSourceError
+        :rtype: float
+        """
+        metric, filters = self._get_metric_and_filters(**kwargs)
+
+        if kwargs.get('dimension'):
+            return self._get_value_from_dimension_report(metric, filters, kwargs['dimension'])
 
         self.logger.info('Metric: %s with filters: %s', metric, filters)
 
         try:
             res = self._query(
                 # fetch events for the last 24h
-                start_date='1daysAgo', end_date='1daysAgo',
+                start_date=self.START_DATE, end_date=self.END_DATE,
                 # 20161016, group by day
-                dimension='ga:date',
+                dimension=self.DIMENSION,
                 # now provide a query
                 metric=metric,
                 filters=filters,
@@ -174,11 +529,7 @@ class GoogleAnalyticsSource(SourceBase):
             self.logger.debug('API response: %s', res)
 
             try:
-                report = res['reports'][0]
-
-                # [{'metrics': [{'values': ['270634']}], 'dimensions': ['20181213']}]
-                rows = report['data']['rows']
-                return float(rows[0]['metrics'][0]['values'][0])
+                return self._get_values_from_report(res['reports'][0])[0]
             except KeyError as ex:
                 self.logger.error('Failed to get the value from API response: %s', res)
                 raise ex
@@ -1,10 +1,30 @@
 """
 AWS Athena class
 """
+import asyncio
+import time
+
+from threading import BoundedSemaphore
+
+# boto3 is installed with PyAthena
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
 from pyathena import connect
+from pyathena.error import Error
+
+try:
+    from pyathena.formatter import DefaultParameterFormatter as ParameterFormatter
+except ImportError:
+    # PyAthena < 2.0
+    from pyathena.formatter import ParameterFormatter
+
+from mycroft_holmes.errors import MycroftSourceError
 
 from .base import DatabaseSourceBase
 
+# errors raised by boto3 Athena client calls
+API_ERRORS = (ClientError, BotoCoreError)
+
 
 class AthenaSource(DatabaseSourceBase):
     """
@@ -22,6 +42,7 @@ class AthenaSource(DatabaseSourceBase):
         secret_access_key: "${ATHENA_SECRET}"
         s3_staging_dir: "${ATHENA_S3_STAGING_DIR}"
         region: "us-east-1"
+        max_concurrent_queries: 10  # defaults to 5
     ```
 
     > `s3_staging_dir` is the S3 location to which your query output is written,
@@ -40,6 +61,31 @@ class AthenaSource(DatabaseSourceBase):
 
     Please note that only the first column from the first row in the results set will be taken.
 
+    `group_by` metric option is supported as well (see `common/mysql` source).
+
+    All Athena queries of a collection run (including `group_by` ones) are started up front
+    (up to `max_concurrent_queries` at a time) and their states are polled together.
+    Queries that are still running when the batch fails are stopped.
+
+    #### Results cache
+
+    Results of expensive queries can be kept between runs. Add `database` entry to
+    `cache` config section and set `cache_ttl` (in seconds) for metrics that should use it.
+    The number of bytes scanned and seconds saved is reported at the end of the run.
+
+    ```yaml
+    cache:
+      path: /var/cache/mike/cache.sqlite
+      database:
+        max_size: 1048576  # in bytes
+
+    metrics:
+      - name: foo/wikis
+        source: foo/athena
+        query: "SELECT count(*) FROM stats.wikis WHERE lang = %(wiki_lang)s"
+        cache_ttl: 86400  # in seconds
+    ```
+
     #### `features` config
 
     ```yaml
@@ -54,14 +100,34 @@ class AthenaSource(DatabaseSourceBase):
 
     NAME = 'aws/athena'
 
+    # each query gets its own cursor and boto3 clients are thread-safe
+    THREADSAFE_CLIENT = True
+
+    DRIVER_ERRORS = (Error,) + API_ERRORS
+
+    # all queries of a run are passed to get_values() at once
+    BATCH_SIZE = 1000
+
+    # how often states of running queries are checked (in seconds)
+    POLL_INTERVAL = 1
+
+    # batch_get_query_execution accepts up to 50 query execution IDs
+    MAX_POLLED_QUERIES = 50
+
+    # get_query_results returns up to 1000 rows at a time
+    MAX_RESULTS = 1000
+
     # pylint: disable=too-many-arguments
-    def __init__(self, access_key_id, secret_access_key, s3_staging_dir, region, client=None):
+    def __init__(self, access_key_id, secret_access_key, s3_staging_dir, region, client=None,
+                 *, max_concurrent_queries=5, athena_client=None):
         """
         :type access_key_id str
         :type secret_access_key str
         :type s3_staging_dir str
         :type region str
         :type client obj
+        :type max_concurrent_queries int
+        :type athena_client obj
         """
         super(AthenaSource, self).__init__()
 
@@ -73,6 +139,11 @@ class AthenaSource(DatabaseSourceBase):
         )
 
         self._client = client or None
+        self._athena_client = athena_client
+
+        # limits queries running at the same time (shared by all batches)
+        self._queries_semaphore = BoundedSemaphore(int(max_concurrent_queries))
+        self._formatter = ParameterFormatter()
 
     def _get_client(self):
         """
@@ -85,3 +156,286 @@ class AthenaSource(DatabaseSourceBase):
 
         # https://pypi.org/project/PyAthena/
         return connect(**self._connection_params)
+
+    @property
+    def athena_client(self):
+        """
+        Set up boto3 Athena client lazily
+
+        :rtype: botocore.client.Athena
+        """
+        with self._lock:
+            if not self._athena_client:
+                self._athena_client = boto3.client(
+                    'athena',
+                    aws_access_key_id=self._connection_params['aws_access_key_id'],
+                    aws_secret_access_key=self._connection_params['aws_secret_access_key'],
+                    region_name=self._connection_params['region_name'],
+                )
+
+        return self._athena_client
+
+    def get_scanned_bytes(self, cursor):
+        """
+        :type cursor pyathena.cursor.Cursor
+        :rtype: int
+        """
+        return cursor.data_scanned_in_bytes or 0
+
+    def _start_query(self, query, template):
+        """
+        Starts the query execution and returns its ID
+
+        :type query str
+        :type template dict|None
+        :rtype: str
+        """
+        query = self._formatter.format(query, template)
+        self.logger.info('SQL: %s', query)
+
+        res = self.athena_client.start_query_execution(
+            QueryString=query,
+            ResultConfiguration={'OutputLocation': self._connection_params['s3_staging_dir']}
+        )
+
+        return res['QueryExecutionId']
+
+    def _get_states(self, execution_ids):
+        """
+        Returns execution ID -> (state, state change reason, statistics) dictionary
+
+        :type execution_ids list[str]
+        :rtype: dict
+        """
+        states = dict()
+
+        for offset in range(0, len(execution_ids), self.MAX_POLLED_QUERIES):
+            res = self.athena_client.batch_get_query_execution(
+                QueryExecutionIds=execution_ids[offset:offset + self.MAX_POLLED_QUERIES])
+
+            for execution in res['QueryExecutions']:
+                states[execution['QueryExecutionId']] = (
+                    execution['Status']['State'],
+                    execution['Status'].get('StateChangeReason'),
+                    execution.get('Statistics', {})
+                )
+
+        return states
+
+    def _stop_query(self, execution_id):
+        """
+        Stops the query execution, so that it does not scan data no one is waiting for
+
+        :type execution_id str
+        """
+        self.logger.info('Stopping query %s', execution_id)
+
+        try:
+            self.athena_client.stop_query_execution(QueryExecutionId=execution_id)
+        except API_ERRORS as ex:
+            self.logger.warning('Failed to stop query %s: %s', execution_id, ex)
+
+    def _get_rows(self, execution_id, max_results):
+        """
+        Yields rows from the results set (columns names are skipped)
+
+        :type execution_id str
+        :type max_results int
+        :rtype: list[list[str]]
+        """
+        kwargs = dict(QueryExecutionId=execution_id, MaxResults=max_results)
+        header = True
+
+        while True:
+            res = self.athena_client.get_query_results(**kwargs)
+
+            for row in res['ResultSet']['Rows']:
+                # the first row holds columns names
+                if header:
+                    header = False
+                    continue
+
+                yield [column.get('VarCharValue') for column in row['Data']]
+
+            if not res.get('NextToken'):
+                return
+
+            kwargs['NextToken'] = res['NextToken']
+
+    def _get_result(self, execution_id, grouped=False):
+        """
+        Returns the first column of the first row from the results set or key -> value
+        dictionary made of all rows (when grouped is set)
+
+        :type execution_id str
+        :type grouped bool
+        :rtype: float|dict
+        """
+        if grouped:
+            return {
+                str(row[0]): float(row[1])
+                for row in self._get_rows(execution_id, self.MAX_RESULTS)
+            }
+
+        return float(next(self._get_rows(execution_id, 2))[0])
+
+    def _get_finished_value(self, execution_id, state, reason, grouped=False):
+        """
+        :type execution_id str
+        :type state str
+        :type reason str|None
+        :type grouped bool
+        :rtype: float|dict|MycroftSourceError
+        """
+        if state != 'SUCCEEDED':
+            return MycroftSourceError('Failed to get metric value: query %s %s (%s)' %
+                                      (execution_id, state, reason))
+
+        try:
+            return self._get_result(execution_id, grouped)
+        except API_ERRORS + (KeyError, IndexError, StopIteration, TypeError, ValueError) as ex:
+            return MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+    def _get_grouped_value_or_error(self, **kwargs):
+        """
+        :rtype: float|MycroftSourceError
+        """
+        try:
+            return self._get_grouped_value(**kwargs)
+        except MycroftSourceError as ex:
+            return ex
+
+    def _get_pending(self, specs, values):
+        """
+        Returns (spec index, spec) tuples for queries that need to be run. A "group_by" query
+        is run once for all features, its results cache key is used instead of the index.
+
+        :type specs list[dict]
+        :type values list
+        :rtype: list[tuple]
+        """
+        pending = []
+        grouped = set()
+
+        for index, spec in enumerate(specs):
+            if not spec.get('group_by'):
+                values[index] = self.get_cached_result(**spec)
+
+                if values[index] is None:
+                    pending.append((index, spec))
+                continue
+
+            cache_key = self.get_cache_key(**spec)
+
+            with self._lock:
+                if cache_key in self._grouped_results:
+                    continue
+
+                result = self.get_cached_result(**spec)
+
+                if result is not None:
+                    self._grouped_results[cache_key] = result
+                elif cache_key not in grouped:
+                    grouped.add(cache_key)
+                    pending.append((cache_key, spec))
+
+        return pending
+
+    def get_values(self, specs):
+        """
+        Starts all queries up front (respecting max_concurrent_queries limit),
+        polls their states together and gathers the results.
+
+        :type specs list[dict]
+        :rtype: list[float|MycroftSourceError]
+        """
+        for spec in specs:
+            assert isinstance(spec.get('query'), str), '"query" parameter needs to be provided'
+
+        values = [None] * len(specs)
+        pending = self._get_pending(specs, values)
+        running = dict()  # execution ID -> (spec index or "group_by" results cache key, spec)
+
+        self.logger.info('Running %d queries for %d metrics', len(pending), len(specs))
+
+        try:
+            while pending or running:
+                # start as many queries as the limit allows
+                # pylint: disable=consider-using-with
+                while pending and self._queries_semaphore.acquire(blocking=False):
+                    key, spec = pending.pop(0)
+
+                    try:
+                        running[self._start_query(spec['query'], spec.get('template'))] = \
+                            (key, spec)
+                    except API_ERRORS + (KeyError,) as ex:
+                        self._queries_semaphore.release()
+                        self._set_result(key, values, MycroftSourceError(
+                            'Failed to get metric value: %s' % repr(ex)))
+
+                time.sleep(self.POLL_INTERVAL)
+
+                if not running:
+                    # queries run by other batches use the limit up
+                    continue
+
+                for execution_id, (state, reason, stats) in self._get_states(list(running)).items():
+                    if state not in ('SUCCEEDED', 'FAILED', 'CANCELLED'):
+                        continue
+
+                    key, spec = running.pop(execution_id)
+                    self._queries_semaphore.release()
+
+                    result = self._get_finished_value(
+                        execution_id, state, reason, grouped=not isinstance(key, int))
+                    self._set_result(key, values, result)
+
+                    if not isinstance(result, Exception):
+                        self.store_result(
+                            result,
+                            seconds=stats.get('EngineExecutionTimeInMillis', 0) / 1000.,
+                            scanned_bytes=stats.get('DataScannedInBytes', 0),
+                            **spec
+                        )
+
+        except API_ERRORS + (KeyError,) as ex:
+            self.logger.error('get_values() failed', exc_info=True)
+            error = MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+            for key, _ in pending + list(running.values()):
+                self._set_result(key, values, error)
+
+        finally:
+            # do not leave queries no one is waiting for running
+            for execution_id in running:
+                self._stop_query(execution_id)
+                self._queries_semaphore.release()
+
+        return [
+            self._get_grouped_value_or_error(**spec) if spec.get('group_by') else values[index]
+            for index, spec in enumerate(specs)
+        ]
+
+    def _set_result(self, key, values, result):
+        """
+        Keeps the result of a query
+
+        :type key int|str spec index or results cache key of a "group_by" query
+        :type values list
+        :type result float|dict|MycroftSourceError
+        """
+        if isinstance(key, int):
+            values[key] = result
+        else:
+            with self._lock:
+                self._grouped_results[key] = result
+
+    async def get_values_async(self, specs):
+        """
+        Queries are polled in the loop's default executor
+
+        :type specs list[dict]
+        :rtype: list[float|MycroftSourceError]
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.get_values, specs)
@@ -1,13 +1,26 @@
 """
 Common code
 """
+import asyncio
+import json
 import logging
 import re
+import time
 
-from mycroft_holmes.errors import MycroftSourceError
+from contextlib import contextmanager
+from functools import partial
+from threading import RLock
+
+from aiohttp import ClientSession
+
+from mycroft_holmes.cache import get_cache
+from mycroft_holmes.errors import MycroftHolmesError, MycroftSourceError
 
 SOURCES_CACHE = dict()
 
+# metrics can be fetched concurrently by MetricsCollector worker threads
+SOURCES_CACHE_LOCK = RLock()
+
 
 class SourceBase:
     """
@@ -16,8 +29,16 @@ class SourceBase:
     """
     NAME = None
 
+    # metric spec entries that do not affect the value returned by a source
+    METRIC_SPEC_META = ('name', 'source', 'label', 'weight', 'cache_ttl')
+
+    # how many requests can be passed to get_values() at once (None - no batching)
+    BATCH_SIZE = None
+
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
+        self._async_client = None
+        self._async_client_owned = False
 
     def __repr__(self):
         """
@@ -79,9 +100,25 @@ class SourceBase:
         """
         source_name = metric.get_source_name()
 
-        if source_name in SOURCES_CACHE:
-            return SOURCES_CACHE.get(source_name)
+        with SOURCES_CACHE_LOCK:
+            if source_name in SOURCES_CACHE:
+                return SOURCES_CACHE.get(source_name)
+
+            source = cls._new_for_spec(source_name, metric, config)
 
+            # cache it
+            SOURCES_CACHE[source_name] = source
+
+        return source
+
+    @classmethod
+    def _new_for_spec(cls, source_name, metric, config):
+        """
+        :type source_name str
+        :type metric mycroft_holmes.metric.Metric
+        :type config mycroft_holmes.config.Config
+        :rtype: SourceBase
+        """
         # get an entry from "source" config file section that matches given metric "source"
         spec = config.get_sources().get(source_name)
 
@@ -112,18 +149,143 @@ class SourceBase:
                     source_name, source_kind, list(source_spec.keys()))
 
         source = SourceBase.new_from_name(source_kind, args=source_spec)
-
-        # cache it
-        SOURCES_CACHE[source_name] = source
+        source.configure(config)
 
         return source
 
+    def configure(self, config):
+        """
+        Called when the source is set up for a metric, can be used to read
+        the config file settings that are not source-specific (e.g. "cache" section)
+
+        :type config mycroft_holmes.config.Config
+        """
+
     def get_value(self, **kwargs):
         """
         :rtype: int|float
         """
         raise NotImplementedError('get_value needs to be implemented')
 
+    def get_request_key(self, **kwargs):
+        """
+        Returns a key identifying the fully resolved query that get_value() runs
+        for given metric parameters. Metrics with the same key get the same value,
+        so it needs to be fetched only once per collection run.
+
+        :rtype: tuple
+        """
+        args = {key: value for key, value in kwargs.items() if key not in self.METRIC_SPEC_META}
+        return (json.dumps(args, sort_keys=True, default=str),)
+
+    def get_values(self, specs):
+        """
+        Fetches values for a batch of metrics specs (up to BATCH_SIZE of them).
+
+        Returns the list of values in the same order, failed fetches are represented
+        by MycroftHolmesError instances. Sources that can ask for several values in a single
+        request should provide their own implementation.
+
+        :type specs list[dict]
+        :rtype: list[int|float|MycroftHolmesError]
+        """
+        values = []
+
+        for spec in specs:
+            try:
+                values.append(self.get_value(**spec))
+            except MycroftHolmesError as ex:
+                values.append(ex)
+
+        return values
+
+    def get_batch_key(self, **kwargs):
+        """
+        Returns a key of a group of requests that can be asked for together,
+        e.g. metrics with the same filters. Requests are sorted by it before they are
+        split into batches, so that each batch holds as few groups as possible.
+
+        :rtype: str|None
+        """
+        # pylint: disable=no-self-use,unused-argument
+        return None
+
+    def get_batches(self, specs):
+        """
+        Splits metrics specs into batches passed to get_values() and returns
+        the list of specs indices of each batch.
+
+        Specs are sorted by their batch key first, so that requests that can be asked for
+        together are next to each other.
+
+        :type specs list[dict]
+        :rtype: list[list[int]]
+        """
+        indices = sorted(
+            range(len(specs)), key=lambda index: str(self.get_batch_key(**specs[index])))
+
+        return [
+            indices[offset:offset + self.BATCH_SIZE]
+            for offset in range(0, len(indices), self.BATCH_SIZE)
+        ]
+
+    async def get_values_async(self, specs):
+        """
+        Asynchronous counterpart of get_values()
+
+        :type specs list[dict]
+        :rtype: list[int|float|MycroftHolmesError]
+        """
+        values = []
+
+        for spec in specs:
+            try:
+                values.append(await self.get_value_async(**spec))
+            except MycroftHolmesError as ex:
+                values.append(ex)
+
+        return values
+
+    async def get_value_async(self, **kwargs):
+        """
+        Asynchronous counterpart of get_value().
+
+        Sources that do not provide their own implementation
+        have get_value() run in the event loop's default executor.
+
+        :rtype: int|float
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, partial(self.get_value, **kwargs))
+
+    @property
+    def async_client(self):
+        """
+        Set up aiohttp client session lazily (it needs to be created within a running event loop)
+
+        :rtype: aiohttp.ClientSession
+        """
+        if self._async_client is None:
+            self._async_client = ClientSession()
+            self._async_client_owned = True
+
+        return self._async_client
+
+    def close(self):
+        """
+        Called by MetricsCollector when the collection run is completed
+        """
+
+    async def close_async(self):
+        """
+        Closes aiohttp client session set up by async_client property
+        """
+        if self._async_client_owned:
+            await self._async_client.close()
+
+            self._async_client = None
+            self._async_client_owned = False
+
     def get_name(self):
         """
         :rtype: str
@@ -167,10 +329,33 @@ class DatabaseSourceBase(SourceBase):
     An abstract class for database-related sources
 
     Used by "aws/athena" and "common/mysql" sources.
+
+    When "group_by" metric option names a template variable, the query is expected to return
+    (key, value) rows. It is run once per collection run and each feature gets the value
+    from the row which key matches its template variable.
     """
+    # can a single client be used by concurrent worker threads?
+    THREADSAFE_CLIENT = False
+
+    # errors raised by the database driver when a query fails
+    DRIVER_ERRORS = ()
+
     def __init__(self):
         super(DatabaseSourceBase, self).__init__()
         self._client = None
+        self._lock = RLock()
+
+        # persistent cache of queries results (see configure method)
+        self._results_cache = None
+
+        # results of "group_by" queries run during the current collection run
+        self._grouped_results = dict()
+
+    def configure(self, config):
+        """
+        :type config mycroft_holmes.config.Config
+        """
+        self._results_cache = get_cache(config, 'database')
 
     def _get_client(self):
         """
@@ -185,11 +370,129 @@ class DatabaseSourceBase(SourceBase):
 
         :rtype: mysql.connector.connection.MySQLConnection
         """
-        if not self._client:
-            self._client = self._get_client()
+        with self._lock:
+            if not self._client:
+                self._client = self._get_client()
 
         return self._client
 
+    @staticmethod
+    def get_query_params(query, template):
+        """
+        Returns template variables that are bound in a given query, e.g. %(user_group)s
+
+        :type query str
+        :type template dict|None
+        :rtype: dict
+        """
+        names = re.findall(r'%\((\w+)\)', query)
+
+        return {
+            name: value for name, value in (template or {}).items() if name in names
+        }
+
+    def get_request_key(self, **kwargs):
+        """
+        :rtype: tuple
+        """
+        query = kwargs.get('query')
+        assert isinstance(query, str), '"query" parameter needs to be provided'
+
+        params = self.get_query_params(query, kwargs.get('template'))
+        key = query, tuple(sorted((name, str(value)) for name, value in params.items()))
+
+        if kwargs.get('group_by'):
+            key += (self._get_group_key(**kwargs),)
+
+        return key
+
+    @staticmethod
+    def _get_group_key(**kwargs):
+        """
+        Returns the value of template variable named by "group_by" metric option
+
+        :rtype: str
+        """
+        group_by = kwargs.get('group_by')
+        template = kwargs.get('template') or {}
+
+        assert group_by in template, '"%s" template variable needs to be provided' % group_by
+        return str(template[group_by])
+
+    @staticmethod
+    def normalize_query(query):
+        """
+        Collapses whitespaces and removes the trailing semicolon
+
+        :type query str
+        :rtype: str
+        """
+        return re.sub(r'\s+', ' ', query).strip().rstrip(';').strip()
+
+    def get_cache_key(self, **kwargs):
+        """
+        Returns the results cache key - source name, normalized SQL and bound template variables
+
+        :rtype: str
+        """
+        query = kwargs.get('query')
+        params = self.get_query_params(query, kwargs.get('template'))
+
+        key = [
+            kwargs.get('source'),
+            self.normalize_query(query),
+            sorted((name, str(value)) for name, value in params.items())
+        ]
+
+        if kwargs.get('group_by'):
+            key.append(kwargs['group_by'])
+
+        return json.dumps(key)
+
+    def get_cached_result(self, **kwargs):
+        """
+        Returns the query result kept in the cache if the metric has "cache_ttl" set
+        and the result is not older than that
+
+        :rtype: float|None
+        """
+        cache_ttl = kwargs.get('cache_ttl')
+
+        if self._results_cache is None or not cache_ttl:
+            return None
+
+        entry = self._results_cache.get(self.get_cache_key(**kwargs))
+
+        if entry is None or entry['timestamp'] < time.time() - int(cache_ttl):
+            return None
+
+        self.logger.info('Using cached result of "%s" (%d s old)',
+                         kwargs.get('query'), time.time() - entry['timestamp'])
+
+        self._results_cache.record(
+            hit=True, seconds_saved=entry['seconds'], bytes_saved=entry['bytes'])
+
+        return entry['value']
+
+    def store_result(self, value, seconds, scanned_bytes, **kwargs):
+        """
+        Keeps the query result in the cache if the metric has "cache_ttl" set
+
+        :type value float
+        :type seconds float
+        :type scanned_bytes int
+        """
+        if self._results_cache is None or not kwargs.get('cache_ttl'):
+            return
+
+        self._results_cache.record(hit=False)
+        self._results_cache.set(self.get_cache_key(**kwargs), {
+            'value': value,
+            'timestamp': time.time(),
+            'seconds': seconds,
+            'bytes': scanned_bytes,
+        })
+
     def get_value(self, **kwargs):
         """
         :raise: MycroftSourceError
@@ -200,14 +503,137 @@ class DatabaseSourceBase(SourceBase):
 
         template = kwargs.get('template')
 
+        if kwargs.get('group_by'):
+            return self._get_grouped_value(**kwargs)
+
         try:
-            cursor = self.client.cursor()
+            value = self.get_cached_result(**kwargs)
+
+            if value is not None:
+                return value
 
             self.logger.info('SQL: %s [%s]', query, template)
-            cursor.execute(query, template)
+            start = time.time()
+
+            if self.THREADSAFE_CLIENT:
+                value, scanned_bytes = self._execute(query, template)
+            else:
+                # do not share the connection between worker threads
+                with self._lock:
+                    value, scanned_bytes = self._execute(query, template)
 
-            value = float(cursor.fetchone()[0])
+            self.store_result(value, time.time() - start, scanned_bytes, **kwargs)
             return value
 
         except Exception as ex:
             raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+    def get_grouped_result(self, **kwargs):
+        """
+        Returns key -> value dictionary with rows returned by "group_by" query.
+        The query is run once per collection run.
+
+        :raise: MycroftSourceError
+        :rtype: dict
+        """
+        cache_key = self.get_cache_key(**kwargs)
+
+        with self._lock:
+            if cache_key not in self._grouped_results:
+                try:
+                    self._grouped_results[cache_key] = self._fetch_grouped_result(**kwargs)
+                except self.DRIVER_ERRORS + (IndexError, TypeError, ValueError) as ex:
+                    # do not run it again for every feature
+                    self._grouped_results[cache_key] = \
+                        MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+        result = self._grouped_results[cache_key]
+
+        if isinstance(result, MycroftSourceError):
+            raise result
+
+        return result
+
+    def _fetch_grouped_result(self, **kwargs):
+        """
+        :rtype: dict
+        """
+        result = self.get_cached_result(**kwargs)
+
+        if result is not None:
+            return result
+
+        query = kwargs.get('query')
+        template = kwargs.get('template')
+
+        self.logger.info('SQL: %s [%s] (grouped by %s)', query, template, kwargs.get('group_by'))
+        start = time.time()
+
+        result, scanned_bytes = self._execute(query, template, grouped=True)
+        self.logger.info('Got %d rows', len(result))
+
+        self.store_result(result, time.time() - start, scanned_bytes, **kwargs)
+        return result
+
+    def _get_grouped_value(self, **kwargs):
+        """
+        :raise: MycroftSourceError
+        :rtype: float
+        """
+        key = self._get_group_key(**kwargs)
+        result = self.get_grouped_result(**kwargs)
+
+        if key not in result:
+            raise MycroftSourceError('Failed to get metric value: no row for "%s" key' % key)
+
+        return result[key]
+
+    def close(self):
+        """
+        Drops results of "group_by" queries run during the collection run
+        """
+        with self._lock:
+            self._grouped_results.clear()
+
+    @contextmanager
+    def checkout(self):
+        """
+        Yields the database connection to run a query on (the client by default)
+
+        :rtype: object
+        """
+        yield self.client
+
+    def _execute(self, query, template, grouped=False):
+        """
+        Returns the query result and the number of bytes scanned by it.
+
+        The result is either the first column of the first row or key -> value
+        dictionary made of all rows (when grouped is set).
+
+        :type query str
+        :type template dict|None
+        :type grouped bool
+        :rtype: tuple[float|dict, int]
+        """
+        with self.checkout() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query, template)
+
+            if grouped:
+                result = {str(row[0]): float(row[1]) for row in cursor.fetchall()}
+            else:
+                result = float(cursor.fetchone()[0])
+
+            return result, self.get_scanned_bytes(cursor)
+
+    def get_scanned_bytes(self, cursor):
+        """
+        Returns the number of bytes scanned by the last query run using a given cursor
+        (0 when it's not known)
+
+        :type cursor object
+        :rtype: int
+        """
+        # pylint: disable=no-self-use,unused-argument
+        return 0
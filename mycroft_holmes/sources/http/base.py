@@ -1,10 +1,43 @@
 """
 A base HTTP-bases source
 """
+import asyncio
+import json
+
 from requests import session
 
+from mycroft_holmes.cache import get_cache
+from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.utils import format_query
 from ..base import SourceBase
+from .cache import ResponsesCache
+
+# responses and documents parsed from them are kept for the duration of collection run
+# (up to 64 MB of responses bodies by default, see HttpSourceBase.configure method)
+RESPONSES_CACHE_MAX_SIZE = 64 * 1024 * 1024
+RESPONSES_CACHE = ResponsesCache(max_size=RESPONSES_CACHE_MAX_SIZE)
+
+
+# pylint: disable=too-few-public-methods
+class HttpResponse:
+    """
+    Wraps the response fetched asynchronously to provide requests.Response-like interface
+    """
+    def __init__(self, status_code, text, headers=None):
+        """
+        :type status_code int
+        :type text str
+        :type headers dict|None
+        """
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def json(self):
+        """
+        :rtype: dict
+        """
+        return json.loads(self.text)
 
 
 class HttpSourceBase(SourceBase):
@@ -12,26 +45,256 @@ class HttpSourceBase(SourceBase):
     A generic trait for all HTTP-based sources
     """
     # pylint: disable=unused-argument
-    def __init__(self, client, **kwargs):
+    def __init__(self, client, async_client=None, **kwargs):
         """
         :type client object
+        :type async_client object
         :type kwargs object
         """
         super().__init__()
         self._client = client or session()
+        self._async_client = async_client
+
+        # persistent cache of values taken from pages (see configure method)
+        self._conditional_cache = None
+
+        # url -> (ETag, Last-Modified) of responses fetched during this run
+        self._validators = dict()
+
+    def configure(self, config):
+        """
+        The size of the responses cache can be set in "cache" section of the config file:
+
+        ```yaml
+        cache:
+          responses:
+            max_size: 134217728  # in bytes
+        ```
+
+        :type config mycroft_holmes.config.Config
+        """
+        self._conditional_cache = get_cache(config, 'http')
+
+        responses_config = (config.get_raw().get('cache') or {}).get('responses') or {}
+        RESPONSES_CACHE.max_size = responses_config.get('max_size', RESPONSES_CACHE_MAX_SIZE)
+
+    def _store_validators(self, url, resp):
+        """
+        :type url str
+        :type resp requests.Response|HttpResponse
+        """
+        headers = getattr(resp, 'headers', None) or {}
+
+        if headers.get('ETag') or headers.get('Last-Modified'):
+            self._validators[url] = (headers.get('ETag'), headers.get('Last-Modified'))
 
     def make_request(self, url):
         """
+        Responses are cached for the duration of collection run
+
         :type url
         :rtype: requests.Response
         """
-        resp = self._client.get(url)
-        resp.raise_for_status()
+        def fetch():
+            """
+            :rtype: tuple[requests.Response, int]
+            """
+            resp = self._client.get(url)
+            resp.raise_for_status()
 
-        self.logger.info('GET <%s> - HTTP %d (%.2f kB)',
-                         url, resp.status_code, 1. * len(resp.text) / 1024)
+            self.logger.info('GET <%s> - HTTP %d (%.2f kB)',
+                             url, resp.status_code, 1. * len(resp.text) / 1024)
 
-        return resp
+            self._store_validators(url, resp)
+            return resp, len(resp.text)
+
+        return RESPONSES_CACHE.get_or_create((self, 'response', url), fetch)
+
+    async def make_request_async(self, url):
+        """
+        Responses are cached for the duration of collection run
+
+        :type url
+        :rtype: HttpResponse
+        """
+        async def fetch():
+            """
+            :rtype: tuple[HttpResponse, int]
+            """
+            async with self.async_client.get(url) as resp:
+                resp.raise_for_status()
+                text = await resp.text()
+
+            self.logger.info('GET <%s> - HTTP %d (%.2f kB)',
+                             url, resp.status, 1. * len(text) / 1024)
+
+            resp = HttpResponse(status_code=resp.status, text=text, headers=resp.headers)
+
+            self._store_validators(url, resp)
+            return resp, len(text)
+
+        return await RESPONSES_CACHE.get_or_create_async((self, 'response', url), fetch)
+
+    def get_document(self, url):
+        """
+        Fetches and parses the response. The parsed document is cached for the duration
+        of collection run, so N metrics taken from the same page cost one download and one parse.
+
+        :type url str
+        :rtype: object
+        """
+        def parse():
+            """
+            :rtype: tuple[object, int]
+            """
+            resp = self.make_request(url)
+            return self.parse_response(resp), len(resp.text)
+
+        return RESPONSES_CACHE.get_or_create((self, 'document', url), parse)
+
+    async def get_document_async(self, url):
+        """
+        Asynchronous counterpart of get_document()
+
+        :type url str
+        :rtype: object
+        """
+        async def parse():
+            """
+            :rtype: tuple[object, int]
+            """
+            resp = await self.make_request_async(url)
+            return self.parse_response(resp), len(resp.text)
+
+        return await RESPONSES_CACHE.get_or_create_async((self, 'document', url), parse)
+
+    @staticmethod
+    def get_conditional_headers(entry):
+        """
+        :type entry dict
+        :rtype: dict
+        """
+        headers = dict()
+
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def is_not_modified(self, url, entry):
+        """
+        Makes a conditional request using validators stored in the persistent cache entry.
+
+        The result is kept for the duration of collection run. When the page has changed
+        its response is kept as well, so it will not be downloaded again.
+
+        :type url str
+        :type entry dict
+        :rtype: bool
+        """
+        def revalidate():
+            """
+            :rtype: tuple[bool, int]
+            """
+            resp = self._client.get(url, headers=self.get_conditional_headers(entry))
+
+            if resp.status_code == 304:
+                self.logger.info('GET <%s> - HTTP 304 (not modified)', url)
+                return True, 0
+
+            resp.raise_for_status()
+
+            self.logger.info('GET <%s> - HTTP %d (%.2f kB)',
+                             url, resp.status_code, 1. * len(resp.text) / 1024)
+
+            self._store_validators(url, resp)
+            RESPONSES_CACHE.set((self, 'response', url), resp, len(resp.text))
+
+            return False, 0
+
+        return RESPONSES_CACHE.get_or_create((self, 'not_modified', url), revalidate)
+
+    async def is_not_modified_async(self, url, entry):
+        """
+        Asynchronous counterpart of is_not_modified()
+
+        :type url str
+        :type entry dict
+        :rtype: bool
+        """
+        async def revalidate():
+            """
+            :rtype: tuple[bool, int]
+            """
+            async with self.async_client.get(
+                    url, headers=self.get_conditional_headers(entry)) as resp:
+                if resp.status == 304:
+                    self.logger.info('GET <%s> - HTTP 304 (not modified)', url)
+                    return True, 0
+
+                resp.raise_for_status()
+                text = await resp.text()
+
+            self.logger.info('GET <%s> - HTTP %d (%.2f kB)',
+                             url, resp.status, 1. * len(text) / 1024)
+
+            resp = HttpResponse(status_code=resp.status, text=text, headers=resp.headers)
+
+            self._store_validators(url, resp)
+            RESPONSES_CACHE.set((self, 'response', url), resp, len(text))
+
+            return False, 0
+
+        return await RESPONSES_CACHE.get_or_create_async((self, 'not_modified', url), revalidate)
+
+    def _get_cached_entry(self, url, expression):
+        """
+        Returns the persistent cache entry for a given URL
+        if it holds the value for a given expression
+
+        :type url str
+        :type expression str|None
+        :rtype: dict|None
+        """
+        if self._conditional_cache is None:
+            return None
+
+        entry = self._conditional_cache.get(url)
+
+        if entry is None or str(expression) not in entry['values']:
+            return None
+
+        return entry
+
+    def _store_value(self, url, expression, value):
+        """
+        Keeps the value taken from a given URL in the persistent cache
+
+        :type url str
+        :type expression str|None
+        :type value float
+        """
+        if self._conditional_cache is None:
+            return
+
+        self._conditional_cache.record(hit=False)
+
+        # the response can not be validated on the next run
+        if url not in self._validators:
+            return
+
+        etag, last_modified = self._validators[url]
+        entry = self._conditional_cache.get(url)
+
+        # the page has changed, values taken from its previous version are no longer valid
+        if entry is None or (entry['etag'], entry['last_modified']) != (etag, last_modified):
+            entry = {'etag': etag, 'last_modified': last_modified, 'values': {}}
+
+        entry['values'][str(expression)] = value
+        self._conditional_cache.set(url, entry)
 
     @staticmethod
     def get_url(**kwargs):
@@ -42,8 +305,117 @@ class HttpSourceBase(SourceBase):
         url = kwargs.get('url')
         return format_query(url, kwargs.get('template')) if url else None
 
+    def _get_url_for_value(self, **kwargs):
+        """
+        Validates metric parameters and returns the URL to fetch
+
+        :raise: AssertionError
+        :rtype: str
+        """
+        url = self.get_url(**kwargs)
+        assert isinstance(url, str), '"url" parameter needs to be provided'
+
+        self.validate_args(**kwargs)
+
+        return url
+
+    def get_request_key(self, **kwargs):
+        """
+        :rtype: tuple
+        """
+        return self._get_url_for_value(**kwargs), self.get_expression(**kwargs)
+
     def get_value(self, **kwargs):
         """
-        :rtype: int|float
+        :raise: MycroftSourceError
+        :rtype: float
+        """
+        url = self._get_url_for_value(**kwargs)
+        self.logger.info('Fetching <%s>', url)
+
+        try:
+            expression = self.get_expression(**kwargs)
+            entry = self._get_cached_entry(url, expression)
+
+            # the page has not changed since the last run, reuse the value taken from it then
+            if entry is not None and self.is_not_modified(url, entry):
+                self._conditional_cache.record(hit=True)
+                return entry['values'][str(expression)]
+
+            document = self.get_document(url)
+            value = self.get_value_from_document(document, **kwargs)
+
+            self._store_value(url, expression, value)
+            return value
+
+        except Exception as ex:
+            raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+    async def get_value_async(self, **kwargs):
+        """
+        :raise: MycroftSourceError
+        :rtype: float
+        """
+        url = self._get_url_for_value(**kwargs)
+        self.logger.info('Fetching <%s>', url)
+
+        # the persistent cache is backed by SQLite, keep its blocking calls off the event loop
+        loop = asyncio.get_event_loop()
+
+        try:
+            expression = self.get_expression(**kwargs)
+            entry = await loop.run_in_executor(None, self._get_cached_entry, url, expression)
+
+            # the page has not changed since the last run, reuse the value taken from it then
+            if entry is not None and await self.is_not_modified_async(url, entry):
+                self._conditional_cache.record(hit=True)
+                return entry['values'][str(expression)]
+
+            document = await self.get_document_async(url)
+            value = self.get_value_from_document(document, **kwargs)
+
+            await loop.run_in_executor(None, self._store_value, url, expression, value)
+            return value
+
+        except Exception as ex:
+            raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+    def close(self):
+        """
+        Drops responses cached by this source during the collection run
+        """
+        RESPONSES_CACHE.clear(owner=self)
+        self._validators.clear()
+
+    def validate_args(self, **kwargs):
+        """
+        Validates source-specific metric parameters
+
+        :raise: AssertionError
+        """
+
+    def get_expression(self, **kwargs):
+        """
+        Returns the expression used to take the value from the parsed response, e.g. xpath
+
+        :rtype: str
+        """
+        raise NotImplementedError('get_expression needs to be implemented')
+
+    def parse_response(self, resp):
+        """
+        Parses the HTTP response, e.g. HTML into lxml tree
+
+        :type resp requests.Response|HttpResponse
+        :rtype: object
+        """
+        return resp
+
+    def get_value_from_document(self, document, **kwargs):
+        """
+        Takes the metric value from the parsed response
+
+        :type document object
+        :rtype: float
         """
-        raise NotImplementedError('get_value needs to be implemented')
+        raise NotImplementedError('get_value_from_document needs to be implemented')
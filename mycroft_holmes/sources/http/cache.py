@@ -0,0 +1,168 @@
+"""
+Run-scoped cache of HTTP responses and documents parsed from them
+"""
+import asyncio
+import logging
+
+from collections import OrderedDict
+from threading import Lock, RLock
+
+
+# pylint: disable=too-many-instance-attributes
+class ResponsesCache:
+    """
+    LRU cache with a memory cap. The size of each entry is provided when it is stored
+    (the length of the response body is used as an estimate).
+
+    Concurrent requests for the same missing key (from worker threads or coroutines)
+    wait for the first one to fetch it instead of fetching it again.
+    """
+    def __init__(self, max_size):
+        """
+        :type max_size int
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.max_size = max_size
+
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._size = 0
+        self._lock = RLock()
+
+        # keys that are being fetched at the moment
+        self._pending = dict()
+        self._pending_async = dict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """
+        :rtype: int
+        """
+        return len(self._entries)
+
+    def get_size(self):
+        """
+        :rtype: int
+        """
+        return self._size
+
+    def get(self, key):
+        """
+        :type key tuple
+        :rtype: object|None
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+            # mark as recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return self._entries[key][0]
+
+    def set(self, key, value, size):
+        """
+        :type key tuple
+        :type value object
+        :type size int
+        """
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+
+            # this one will not fit at all
+            if size > self.max_size:
+                return
+
+            self._entries[key] = (value, size)
+            self._size += size
+
+            # evict the least recently used entries
+            while self._size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def get_or_create(self, key, factory):
+        """
+        Returns a cached value or stores the one returned by factory.
+
+        :type key tuple
+        :type factory callable returning (value, size) tuple
+        :rtype: object
+        """
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._pending.setdefault(key, Lock())
+
+        with key_lock:
+            # it may have been fetched while we were waiting for the lock
+            value = self.get(key)
+
+            if value is None:
+                self.misses += 1
+
+                value, size = factory()
+                self.set(key, value, size)
+
+        with self._lock:
+            self._pending.pop(key, None)
+
+        return value
+
+    async def get_or_create_async(self, key, factory):
+        """
+        Asynchronous counterpart of get_or_create()
+
+        :type key tuple
+        :type factory callable returning awaitable (value, size) tuple
+        :rtype: object
+        """
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        # wait for the coroutine that is already fetching it
+        if key in self._pending_async:
+            value, _ = await asyncio.shield(self._pending_async[key])
+            return value
+
+        self.misses += 1
+        future = asyncio.ensure_future(factory())
+        self._pending_async[key] = future
+
+        try:
+            value, size = await future
+            self.set(key, value, size)
+        finally:
+            self._pending_async.pop(key, None)
+
+        return value
+
+    def clear(self, owner=None):
+        """
+        Removes all entries and resets the stats. When the owner is given, only its entries
+        (the ones with keys starting with it) are removed.
+
+        :type owner object|None
+        """
+        with self._lock:
+            if owner is not None:
+                for key in [key for key in self._entries if key[0] is owner]:
+                    self._size -= self._entries.pop(key)[1]
+                return
+
+            if self.hits or self.misses:
+                self.logger.info('Cache stats: %d hits, %d misses', self.hits, self.misses)
+
+            self._entries.clear()
+            self._size = 0
+
+            self.hits = 0
+            self.misses = 0
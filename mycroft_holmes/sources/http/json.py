@@ -53,51 +53,58 @@ class HttpJsonSource(HttpSourceBase):
         """
         super().__init__(client=client, **kwargs)
 
-    def get_value(self, **kwargs):
+    def validate_args(self, **kwargs):
         """
-        :raise: MycroftSourceError
-        :rtype: float
+        :raise: AssertionError
         """
-        url = self.get_url(**kwargs)
         jq = kwargs.get('jq')
-
-        assert isinstance(url, str), '"url" parameter needs to be provided'
         assert isinstance(jq, str), '"jq" parameter needs to be provided'
 
-        self.logger.info('Fetching <%s>', url)
-
-        try:
-            resp = self.make_request(url)
+    def get_expression(self, **kwargs):
+        """
+        :rtype: str
+        """
+        # allow jq pattern to be customized with template variables
+        return format_query(kwargs.get('jq'), kwargs.get('template'))
 
-            # allow jq pattern to be customized with template variables
-            jq = format_query(jq, kwargs.get('template'))
+    def parse_response(self, resp):
+        """
+        :type resp requests.Response
+        :rtype: dict
+        """
+        return resp.json()
 
-            # parse with jq
-            # https://stedolan.github.io/jq/manual/#Basicfilters
-            self.logger.info('Parsing JSON and querying it with "%s" jq pattern', jq)
+    def get_value_from_document(self, document, **kwargs):
+        """
+        :type document dict
+        :raise: MycroftSourceError
+        :rtype: float
+        """
+        jq = self.get_expression(**kwargs)
 
-            try:
-                match = pyjq.first(jq, resp.json())
+        # parse with jq
+        # https://stedolan.github.io/jq/manual/#Basicfilters
+        self.logger.info('Parsing JSON and querying it with "%s" jq pattern', jq)
 
-            except ValueError as ex:
-                # jq: error: test/0 is not defined at <top-level>, line 1:
-                self.logger.error(str(ex))
-                raise MycroftSourceError(str(ex))
+        try:
+            match = pyjq.first(jq, document)
 
-            if match is None:
-                raise MycroftSourceError('jq pattern returned no matches')
+        except ValueError as ex:
+            # jq: error: test/0 is not defined at <top-level>, line 1:
+            self.logger.error(str(ex))
+            raise MycroftSourceError(str(ex))
 
-            # we only support returning a single value
-            assert not isinstance(match, list), \
-                'Multiple values where found, narrow your jq pattern'
+        if match is None:
+            raise MycroftSourceError('jq pattern returned no matches')
 
-            # remove spaces: '12 345' -> 12345
-            match = str(match).replace(' ', '')
+        # we only support returning a single value
+        assert not isinstance(match, list), \
+            'Multiple values where found, narrow your jq pattern'
 
-            return float(match)
+        # remove spaces: '12 345' -> 12345
+        match = str(match).replace(' ', '')
 
-        except Exception as ex:
-            raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+        return float(match)
 
     def get_more_link(self, **kwargs):
         """
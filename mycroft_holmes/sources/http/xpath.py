@@ -60,40 +60,47 @@ class HttpXPathSource(HttpSourceBase):
         """
         super().__init__(client=client, **kwargs)
 
-    def get_value(self, **kwargs):
+    def validate_args(self, **kwargs):
         """
-        :raise: MycroftSourceError
-        :rtype: float
+        :raise: AssertionError
         """
-        url = self.get_url(**kwargs)
         xpath = kwargs.get('xpath')
-
-        assert isinstance(url, str), '"url" parameter needs to be provided'
         assert isinstance(xpath, str), '"xpath" parameter needs to be provided'
 
-        self.logger.info('Fetching <%s>', url)
-
-        try:
-            resp = self.make_request(url)
+    def get_expression(self, **kwargs):
+        """
+        :rtype: str
+        """
+        return kwargs.get('xpath')
 
-            # parse with lxml
-            # https://lxml.de/lxmlhtml.html#parsing-html
-            self.logger.info('Parsing HTML and querying it with "%s" xpath', xpath)
+    def parse_response(self, resp):
+        """
+        :type resp requests.Response
+        :rtype: lxml.html.HtmlElement
+        """
+        # parse with lxml
+        # https://lxml.de/lxmlhtml.html#parsing-html
+        return document_fromstring(resp.text)
 
-            node = document_fromstring(resp.text)
-            matches = node.xpath(xpath)
+    def get_value_from_document(self, document, **kwargs):
+        """
+        :type document lxml.html.HtmlElement
+        :raise: MycroftSourceError
+        :rtype: float
+        """
+        xpath = self.get_expression(**kwargs)
 
-            if not matches:
-                raise MycroftSourceError('xpath query returned no matches')
+        self.logger.info('Parsing HTML and querying it with "%s" xpath', xpath)
+        matches = document.xpath(xpath)
 
-            # "123,5" - do our best to parse such value
-            text = str(matches[0].text).strip()
-            text = text.replace(",", ".")
+        if not matches:
+            raise MycroftSourceError('xpath query returned no matches')
 
-            return float(text)
+        # "123,5" - do our best to parse such value
+        text = str(matches[0].text).strip()
+        text = text.replace(",", ".")
 
-        except Exception as ex:
-            raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+        return float(text)
 
     def get_more_link(self, **kwargs):
         """
@@ -1,9 +1,16 @@
 """
 JiraSource class
 """
+import re
+import time
+
+from base64 import b64encode
+from math import ceil
 from urllib.parse import quote
+
 from jira.client import JIRA
 
+from mycroft_holmes.cache import get_cache
 from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.utils import format_query
 
@@ -49,16 +56,39 @@ class JiraSource(SourceBase):
             metrics:
               -  name: jira/p3-tickets
     ```
+
+    #### Incremental counts
+
+    When `jira` entry is added to `cache` config section, the last count of each JQL query
+    is kept between runs. The next run asks Jira for a number of matching tickets updated
+    since then (`<query> AND updated >= -<minutes>m`) and runs the full count only
+    when there are any. `ttl` is the max age of a count - once it is reached the full count
+    is run anyway (tickets that stopped matching the query or were removed are not caught by
+    the probe).
+
+    ```yaml
+    cache:
+      path: /var/cache/mike/cache.sqlite
+      jira:
+        ttl: 21600  # in seconds
+    ```
     """
 
     NAME = 'common/jira'
 
-    def __init__(self, server, user, password, client=None):
+    # Jira search API can not count several queries at once, counts of a batch are run
+    # one after another (over a single session), so that --workers and --concurrency
+    # bound requests in flight. Small batches spread counts over collector workers.
+    BATCH_SIZE = 5
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, server, user, password, client=None, async_client=None):
         """
         :type server str
         :type user str
         :type password str
         :type client obj
+        :type async_client obj
         """
         super(JiraSource, self).__init__()
 
@@ -66,6 +96,16 @@ class JiraSource(SourceBase):
         self._basic_auth = (user, password)
 
         self._client = client or None
+        self._async_client = async_client
+
+        # persistent cache of JQL counts (see configure method)
+        self._counts_cache = None
+
+    def configure(self, config):
+        """
+        :type config mycroft_holmes.config.Config
+        """
+        self._counts_cache = get_cache(config, 'jira')
 
     @property
     def client(self):
@@ -83,6 +123,13 @@ class JiraSource(SourceBase):
 
         return self._client
 
+    def _get_auth_headers(self):
+        """
+        :rtype: dict
+        """
+        credentials = '{}:{}'.format(*self._basic_auth).encode('utf-8')
+        return {'Authorization': 'Basic ' + b64encode(credentials).decode('ascii')}
+
     @staticmethod
     def _get_jql(**kwargs):
         """
@@ -94,20 +141,147 @@ class JiraSource(SourceBase):
         jql = format_query(query, kwargs.get('template'))
         return jql
 
+    def get_request_key(self, **kwargs):
+        """
+        :rtype: tuple
+        """
+        return (self._get_jql(**kwargs),)
+
+    def count(self, jql):
+        """
+        Returns the number of tickets matching given JQL query.
+
+        Only the total is requested (maxResults=0), tickets themselves are not fetched.
+
+        :type jql str
+        :rtype: int
+        """
+        self.logger.info('JQL query: "%s"', jql)
+
+        # https://developer.atlassian.com/cloud/jira/platform/rest/v2/#api-rest-api-2-search-get
+        # pylint: disable=protected-access
+        res = self.client._get_json('search', params={'jql': jql, 'maxResults': 0, 'fields': 'id'})
+        return int(res['total'])
+
+    async def count_async(self, jql):
+        """
+        Asynchronous counterpart of count()
+
+        :type jql str
+        :rtype: int
+        """
+        self.logger.info('JQL query: "%s"', jql)
+
+        async with self.async_client.get(
+                '{server}/rest/api/2/search'.format(server=self._server),
+                params={'jql': jql, 'maxResults': 0, 'fields': 'id'},
+                headers=self._get_auth_headers()) as resp:
+            resp.raise_for_status()
+            res = await resp.json()
+
+        return int(res['total'])
+
+    @staticmethod
+    def get_probe_jql(jql, since):
+        """
+        Returns JQL query matching tickets updated since a given timestamp.
+
+        Relative date is used, so that the Jira user's timezone does not matter.
+
+        :type jql str
+        :type since float
+        :rtype: str
+        """
+        # ORDER BY clause needs to be at the very end of the query
+        jql = re.sub(r'\s+ORDER\s+BY\s+.*$', '', jql, flags=re.IGNORECASE | re.DOTALL)
+
+        # round up and add a minute of margin for clocks skew
+        minutes = int(ceil((time.time() - since) / 60)) + 1
+
+        return '({jql}) AND updated >= -{minutes}m'.format(jql=jql, minutes=minutes)
+
+    def _get_cached_count(self, jql):
+        """
+        :type jql str
+        :rtype: dict|None
+        """
+        return self._counts_cache.get(jql) if self._counts_cache is not None else None
+
+    def _store_count(self, jql, value, timestamp):
+        """
+        :type jql str
+        :type value int
+        :type timestamp float
+        """
+        if self._counts_cache is None:
+            return
+
+        self._counts_cache.record(hit=False)
+        self._counts_cache.set(jql, {'count': value, 'timestamp': timestamp})
+
+    def get_count(self, jql):
+        """
+        Returns the number of tickets matching given JQL query. The full count is skipped when
+        no matching tickets were updated since the last one (see "Incremental counts").
+
+        :type jql str
+        :rtype: int
+        """
+        entry = self._get_cached_count(jql)
+
+        if entry is not None and self.count(self.get_probe_jql(jql, entry['timestamp'])) == 0:
+            self._counts_cache.record(hit=True)
+            return entry['count']
+
+        timestamp = time.time()
+        value = self.count(jql)
+
+        self._store_count(jql, value, timestamp)
+        return value
+
+    async def get_count_async(self, jql):
+        """
+        Asynchronous counterpart of get_count()
+
+        :type jql str
+        :rtype: int
+        """
+        entry = self._get_cached_count(jql)
+
+        if entry is not None and \
+                await self.count_async(self.get_probe_jql(jql, entry['timestamp'])) == 0:
+            self._counts_cache.record(hit=True)
+            return entry['count']
+
+        timestamp = time.time()
+        value = await self.count_async(jql)
+
+        self._store_count(jql, value, timestamp)
+        return value
+
     def get_value(self, **kwargs):
         """
         :raise: MycroftSourceError
         :rtype: int
         """
         jql = self._get_jql(**kwargs)
-        self.logger.info('JQL query: "%s"', jql)
 
         try:
-            tickets = self.client.search_issues(jql_str=jql)
+            return self.get_count(jql)
         except Exception as ex:
             raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
 
-        return len(tickets)
+    async def get_value_async(self, **kwargs):
+        """
+        :raise: MycroftSourceError
+        :rtype: int
+        """
+        jql = self._get_jql(**kwargs)
+
+        try:
+            return await self.get_count_async(jql)
+        except Exception as ex:
+            raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
 
     def get_more_link(self, **kwargs):
         """
@@ -1,7 +1,16 @@
 """
 LogstashSource class
 """
+import asyncio
+import json
+
+from collections import OrderedDict
+from time import time
+from urllib.parse import urlparse
+
+from aiohttp import ClientError
 from elasticsearch_query import ElasticsearchQuery
+from requests import RequestException, session
 
 from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.utils import format_query
@@ -25,6 +34,7 @@ class LogstashSource(SourceBase):
         host: ${ELASTIC_HOST}
         index: logstash-access-log  # will query this index (e.g. logstash-access-log)
         period: 3600  # in seconds, query entries from the last hour (defaults to 86400 s)
+        batch_size: 50  # counts sent in a single multi-search request (defaults to 20)
     ```
 
     #### `metrics` config
@@ -47,16 +57,39 @@ class LogstashSource(SourceBase):
             metrics:
               -  name: logstash/get-requests-access-log
     ```
+
+    #### Fan-out by a field
+
+    When features differ only in a single template variable (e.g. `url`), name it in `field`
+    metric option. Counts for all features are then taken from a single search with
+    `filters` aggregation (one bucket per feature) instead of running a count query for
+    each of them. Such aggregation counts as a single search towards `batch_size`.
+
+    ```yaml
+        metrics:
+          - name: logstash/get-requests-access-log
+            source: foo/logstash
+            query: "request: 'GET' AND url: '{url}'"
+            field: url
+    ```
     """
 
     NAME = 'common/logstash'
 
-    def __init__(self, host, index, period=86400, client=None):
+    # counts sent in a single multi-search request by default (see "batch_size" option)
+    BATCH_SIZE = 20
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, host, index, period=86400, client=None, *,
+                 batch_size=BATCH_SIZE, async_client=None, http_client=None):
         """
         :type host str
         :type index str
         :type period int
         :type client obj
+        :type batch_size int
+        :type async_client obj
+        :type http_client obj
         """
         super(LogstashSource, self).__init__()
 
@@ -64,6 +97,11 @@ class LogstashSource(SourceBase):
         self._index = index
         self._period = period
         self._client = client or None
+        self._async_client = async_client
+        self._http_client = http_client
+
+        # counts of all metrics of this source are sent in _msearch requests of this size
+        self.batch_size = int(batch_size)
 
     @property
     def client(self):
@@ -80,15 +118,43 @@ class LogstashSource(SourceBase):
 
         return self._client
 
-    def get_value(self, **kwargs):
+    @property
+    def http_client(self):
         """
-        :raise: MycroftSourceError
-        :rtype: int
+        Set up HTTP session used for multi-search requests lazily
+
+        :rtype: requests.Session
+        """
+        if not self._http_client:
+            self._http_client = session()
+
+        return self._http_client
+
+    @staticmethod
+    def _get_query(**kwargs):
+        """
+        :rtype: str
         """
         query = kwargs.get('query')
         assert isinstance(query, str), '"query" parameter needs to be provided'
 
-        query = format_query(query, kwargs.get('template'))
+        return format_query(query, kwargs.get('template'))
+
+    def get_request_key(self, **kwargs):
+        """
+        :rtype: tuple
+        """
+        if kwargs.get('field'):
+            self._get_field_value(**kwargs)
+
+        return (self._get_query(**kwargs),)
+
+    def get_value(self, **kwargs):
+        """
+        :raise: MycroftSourceError
+        :rtype: int
+        """
+        query = self._get_query(**kwargs)
         self.logger.info('Query: "%s"', query)
 
         try:
@@ -97,3 +163,330 @@ class LogstashSource(SourceBase):
             raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
 
         return cnt
+
+    async def get_value_async(self, **kwargs):
+        """
+        :raise: MycroftSourceError
+        :rtype: int
+        """
+        query = self._get_query(**kwargs)
+        self.logger.info('Query: "%s"', query)
+
+        try:
+            # https://www.elastic.co/guide/en/elasticsearch/reference/6.8/search-count.html
+            async with self.async_client.post(
+                    self._get_es_url('{}/_count'.format(self._get_indices())),
+                    json=self._get_count_body(query)) as resp:
+                resp.raise_for_status()
+                res = await resp.json()
+
+        except Exception as ex:
+            raise MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+        return res['count']
+
+    @staticmethod
+    def _get_field_value(**kwargs):
+        """
+        Returns the value of template variable named by "field" metric option
+
+        :rtype: str
+        """
+        field = kwargs.get('field')
+        template = kwargs.get('template') or {}
+
+        assert field in template, '"%s" template variable needs to be provided' % field
+        return str(template[field])
+
+    def get_batch_key(self, **kwargs):
+        """
+        Metrics with the same query template that differ only by "field" value
+        are counted using a single aggregation
+
+        :rtype: str|None
+        """
+        field = kwargs.get('field')
+
+        if not field:
+            return None
+
+        # keep "{field}" placeholder in the query
+        template = dict(kwargs.get('template') or {})
+        template[field] = '{%s}' % field
+
+        return format_query(kwargs.get('query'), template)
+
+    def get_batches(self, specs):
+        """
+        Splits metrics specs into multi-search requests of up to "batch_size" searches.
+
+        All metrics with the same fan-out query template are counted by a single aggregation,
+        so they are never split across requests (whatever their number is).
+
+        :type specs list[dict]
+        :rtype: list[list[int]]
+        """
+        # search key -> list of spec indices (each count query is a search on its own)
+        searches = OrderedDict()
+
+        for index, spec in enumerate(specs):
+            batch_key = self.get_batch_key(**spec)
+            searches.setdefault(
+                ('fan_out', batch_key) if batch_key is not None else ('count', index), []
+            ).append(index)
+
+        searches = list(searches.values())
+
+        return [
+            [index for indices in searches[offset:offset + self.batch_size] for index in indices]
+            for offset in range(0, len(searches), self.batch_size)
+        ]
+
+    def _get_searches(self, specs):
+        """
+        Returns the list of (search body, list of (spec index, bucket key)) tuples.
+        Bucket key is None for count queries.
+
+        :type specs list[dict]
+        :rtype: list[tuple]
+        """
+        searches = []
+
+        # batch key -> list of (spec index, field value, query) tuples
+        fan_outs = OrderedDict()
+
+        for index, spec in enumerate(specs):
+            query = self._get_query(**spec)
+
+            if spec.get('field'):
+                fan_outs.setdefault(self.get_batch_key(**spec), []).append(
+                    (index, self._get_field_value(**spec), query))
+            else:
+                searches.append((self._get_count_body(query), [(index, None)]))
+
+        for buckets in fan_outs.values():
+            searches.append((
+                self._get_fan_out_body(OrderedDict(
+                    (bucket_key, query) for _, bucket_key, query in buckets)),
+                [(index, bucket_key) for index, bucket_key, _ in buckets]
+            ))
+
+        return searches
+
+    def _get_values_from_responses(self, count, searches, res):
+        """
+        Splits multi-search responses back out per metric
+
+        :type count int
+        :type searches list[tuple]
+        :type res dict
+        :rtype: list[int|MycroftSourceError]
+        """
+        responses = res.get('responses') if isinstance(res, dict) else None
+
+        # a partial or malformed response
+        if not isinstance(responses, list) or len(responses) != len(searches):
+            self.logger.error('Malformed multi-search response: %s', res)
+            return [MycroftSourceError(
+                'Failed to get metric value: malformed multi-search response')] * count
+
+        values = [None] * count
+
+        for (_, buckets), response in zip(searches, responses):
+            for index, bucket_key in buckets:
+                values[index] = self._get_total(response, bucket_key)
+
+        return values
+
+    def get_values(self, specs):
+        """
+        Sends counts for all given metrics in a single multi-search request
+
+        :type specs list[dict]
+        :rtype: list[int|MycroftSourceError]
+        """
+        searches = self._get_searches(specs)
+        self.logger.info('Multi-search for %d queries (%d searches)', len(specs), len(searches))
+
+        try:
+            # https://www.elastic.co/guide/en/elasticsearch/reference/6.8/search-multi-search.html
+            resp = self.http_client.post(
+                self._get_es_url('_msearch'),
+                data=self._get_msearch_body([body for body, _ in searches]),
+                headers={'Content-Type': 'application/x-ndjson'})
+            resp.raise_for_status()
+
+            res = resp.json()
+        except (RequestException, ValueError) as ex:
+            return [MycroftSourceError('Failed to get metric value: %s' % repr(ex))] * len(specs)
+
+        return self._get_values_from_responses(len(specs), searches, res)
+
+    async def get_values_async(self, specs):
+        """
+        Asynchronous counterpart of get_values()
+
+        :type specs list[dict]
+        :rtype: list[int|MycroftSourceError]
+        """
+        searches = self._get_searches(specs)
+        self.logger.info('Multi-search for %d queries (%d searches)', len(specs), len(searches))
+
+        try:
+            async with self.async_client.post(
+                    self._get_es_url('_msearch'),
+                    data=self._get_msearch_body([body for body, _ in searches]),
+                    headers={'Content-Type': 'application/x-ndjson'}) as resp:
+                resp.raise_for_status()
+                res = await resp.json()
+
+        except (ClientError, asyncio.TimeoutError, ValueError) as ex:
+            return [MycroftSourceError('Failed to get metric value: %s' % repr(ex))] * len(specs)
+
+        return self._get_values_from_responses(len(specs), searches, res)
+
+    def _get_msearch_body(self, bodies):
+        """
+        Returns newline-delimited JSON with a header and a body of
+        each search (no hits are returned, only their number and aggregations)
+
+        :type bodies list[dict]
+        :rtype: str
+        """
+        header = {'index': self._get_indices(), 'ignore_unavailable': True}
+        lines = []
+
+        for body in bodies:
+            body = dict(body, size=0, track_total_hits=True)
+
+            lines.append(json.dumps(header))
+            lines.append(json.dumps(body))
+
+        # the body needs to be terminated by a newline
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _get_total(response, bucket_key=None):
+        """
+        Returns the number of hits (or documents in a given bucket of fan-out aggregation)
+        from a single multi-search response
+
+        :type response dict
+        :type bucket_key str|None
+        :rtype: int|MycroftSourceError
+        """
+        if not isinstance(response, dict):
+            return MycroftSourceError('Failed to get metric value: %s' % repr(response))
+
+        if 'error' in response:
+            return MycroftSourceError('Failed to get metric value: %s' % repr(response['error']))
+
+        try:
+            if bucket_key is not None:
+                return response['aggregations']['fan_out']['buckets'][bucket_key]['doc_count']
+
+            total = response['hits']['total']
+
+            # elasticsearch 7.x returns {"value": 123, "relation": "eq"}
+            return total['value'] if isinstance(total, dict) else total
+
+        except (KeyError, TypeError) as ex:
+            return MycroftSourceError('Failed to get metric value: %s' % repr(ex))
+
+    def _get_es_url(self, path):
+        """
+        Returns elasticsearch API URL for a given path (port defaults to 9200)
+
+        :type path str
+        :rtype: str
+        """
+        host = self._server if '://' in self._server else 'http://' + self._server
+        url = urlparse(host)
+
+        return '{scheme}://{netloc}/{path}'.format(
+            scheme=url.scheme,
+            netloc=url.netloc if url.port else url.netloc + ':9200',
+            path=path
+        )
+
+    def _get_indices(self):
+        """
+        Returns today's and yesterday's indices names (just like ElasticsearchQuery does)
+
+        :rtype: str
+        """
+        now = int(time())
+
+        return ','.join([
+            ElasticsearchQuery.format_index(
+                prefix=self._index, timestamp=now - ElasticsearchQuery.DAY),
+            ElasticsearchQuery.format_index(prefix=self._index, timestamp=now),
+        ])
+
+    def _get_timestamp_range(self):
+        """
+        Returns the filter limiting entries to the source's period
+        (just like ElasticsearchQuery does)
+
+        :rtype: dict
+        """
+        now = int(time())
+
+        return {
+            "range": {
+                "@timestamp": {
+                    "gte": ElasticsearchQuery.format_timestamp(now - self._period),
+                    "lte": ElasticsearchQuery.format_timestamp(
+                        now - ElasticsearchQuery.SHORT_DELAY),
+                }
+            }
+        }
+
+    def _get_count_body(self, query):
+        """
+        Returns the body of count query limited to the source's period
+
+        :type query str
+        :rtype: dict
+        """
+        return {
+            "query": {
+                "bool": {
+                    "must": [
+                        {
+                            "query_string": {
+                                "query": query,
+                            }
+                        },
+                        self._get_timestamp_range()
+                    ]
+                }
+            }
+        }
+
+    def _get_fan_out_body(self, queries):
+        """
+        Returns the body of search with filters aggregation, one bucket for each query
+
+        :type queries OrderedDict
+        :rtype: dict
+        """
+        return {
+            "query": {
+                "bool": {
+                    "must": [
+                        self._get_timestamp_range()
+                    ]
+                }
+            },
+            "aggs": {
+                "fan_out": {
+                    "filters": {
+                        "filters": {
+                            bucket_key: {"query_string": {"query": query}}
+                            for bucket_key, query in queries.items()
+                        }
+                    }
+                }
+            }
+        }
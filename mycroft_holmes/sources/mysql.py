@@ -1,10 +1,48 @@
 """
 Mysql class
 """
-from mysql import connector
+import logging
+import time
+
+from contextlib import contextmanager
+from itertools import count
+from threading import RLock
+
+from mysql.connector.errors import Error, PoolError
+from mysql.connector.pooling import MySQLConnectionPool
 
 from .base import DatabaseSourceBase
 
+# connection params -> MySQLConnectionPool (shared by sources with the same params)
+POOLS = dict()
+POOLS_LOCK = RLock()
+
+# pool names need to be unique, even when pools are set up again after close_pools()
+POOLS_IDS = count()
+
+
+def close_pools():
+    """
+    Closes connections kept by all pools, called once at the end of the collection run
+    """
+    logger = logging.getLogger('MysqlSource')
+
+    with POOLS_LOCK:
+        for pool in POOLS.values():
+            logger.info('Closing connections kept by %s pool', pool.pool_name)
+
+            # check out all idle connections and disconnect them
+            for _ in range(pool.pool_size):
+                try:
+                    pool.get_connection().disconnect()
+                except PoolError:
+                    # no more idle connections
+                    break
+                except Error as ex:
+                    logger.warning('Closing connection failed: %s', ex)
+
+        POOLS.clear()
+
 
 class MysqlSource(DatabaseSourceBase):
     """
@@ -20,8 +58,12 @@ class MysqlSource(DatabaseSourceBase):
         database: "app_database_name"
         user: "${DATABASE_USER}"
         password: "${DATABASE_PASSWORD}"
+        pool_size: 5  # connections in the pool (defaults to 5)
+        pool_timeout: 30  # how long to wait for a free connection (in seconds, defaults to 30)
     ```
 
+    Sources with the same host, database and credentials share the pool of connections.
+
     #### `metrics` config
 
     ```yaml
@@ -35,6 +77,9 @@ class MysqlSource(DatabaseSourceBase):
 
     Please note that only the first column from the first row in the results set will be taken.
 
+    Results of heavy queries can be kept between runs by setting `cache_ttl` for a metric
+    (see "Results cache" section of `aws/athena` source).
+
     #### `features` config
 
     ```yaml
@@ -45,18 +90,46 @@ class MysqlSource(DatabaseSourceBase):
             metrics:
               -  name: users/count
     ```
+
+    #### Fan-out with `GROUP BY`
+
+    When features differ only in a value bound in the query, write the query once with
+    `GROUP BY` so that it returns (key, value) rows and name the template variable
+    in `group_by` metric option. The query will be run once per collection run
+    and each feature will get the value from the row matching its template variable.
+
+    ```yaml
+        metrics:
+          - name: users/count
+            source: foo/mysql
+            query: "SELECT user_group, count(*) FROM users GROUP BY user_group"
+            group_by: user_group
+    ```
+
+    Features with no matching row will not get the metric value.
     """
 
     NAME = 'common/mysql'
 
+    # each query checks out its own connection from the pool
+    THREADSAFE_CLIENT = True
+
+    DRIVER_ERRORS = (Error,)
+
+    # how often to check for a free connection when the pool is exhausted (in seconds)
+    POOL_RETRY_INTERVAL = 0.1
+
     # pylint: disable=too-many-arguments
-    def __init__(self, host, database, user, password, client=None):
+    def __init__(self, host, database, user, password, client=None, *,
+                 pool_size=5, pool_timeout=30):
         """
         :type host str
         :type database str
         :type user str
         :type password str
         :type client obj
+        :type pool_size int
+        :type pool_timeout int
         """
         super(MysqlSource, self).__init__()
 
@@ -67,16 +140,72 @@ class MysqlSource(DatabaseSourceBase):
             password=password,
         )
 
+        self._pool_size = int(pool_size)
+        self._pool_timeout = float(pool_timeout)
+
         self._client = client or None
 
+    def _get_pool_key(self):
+        """
+        :rtype: tuple
+        """
+        return tuple(sorted(self._connection_params.items())) + (self._pool_size,)
+
     def _get_client(self):
         """
-        Connect to MySQL lazilly
+        Returns the pool of MySQL connections (set up lazily)
 
-        :rtype: mysql.connector.connection.MySQLConnection
+        :rtype: mysql.connector.pooling.MySQLConnectionPool
+        """
+        with POOLS_LOCK:
+            key = self._get_pool_key()
+
+            if key not in POOLS:
+                self.logger.info('Setting up a pool of %d connections to MySQL running at "%s"...',
+                                 self._pool_size, self._connection_params['host'])
+
+                # https://dev.mysql.com/doc/connector-python/en/connector-python-connection-pooling.html
+                POOLS[key] = MySQLConnectionPool(
+                    pool_name='mike_pool_%d' % next(POOLS_IDS),
+                    pool_size=self._pool_size,
+                    **self._connection_params
+                )
+
+            return POOLS[key]
+
+    @contextmanager
+    def checkout(self):
+        """
+        Yields a connection from the pool and returns it there when the query is done
+
+        :raise: PoolError
+        :rtype: mysql.connector.pooling.PooledMySQLConnection
+        """
+        deadline = time.time() + self._pool_timeout
+
+        while True:
+            try:
+                connection = self.client.get_connection()
+                break
+            except PoolError:
+                # all connections are in use
+                if time.time() > deadline:
+                    raise
+
+                time.sleep(self.POOL_RETRY_INTERVAL)
+
+        try:
+            yield connection
+        finally:
+            # puts it back in the pool
+            connection.close()
+
+    def close(self):
+        """
+        Drops the reference to the pool, connections are closed by close_pools()
+        at the end of the run as the pool is shared by sources with the same params
         """
-        self.logger.info('Connecting to MySQL running at "%s"...',
-                         self._connection_params['host'])
+        super(MysqlSource, self).close()
 
-        # https://dev.mysql.com/doc/connector-python
-        return connector.connect(**self._connection_params)
+        if isinstance(self._client, MySQLConnectionPool):
+            self._client = None
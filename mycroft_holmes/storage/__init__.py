@@ -0,0 +1,6 @@
+"""
+Handles metrics storage
+"""
+from .base import MetricsStorage
+from .mysql import MySqlMetricsStorage
+from .sqlite import SqliteMetricsStorage
@@ -0,0 +1,513 @@
+"""
+Common code of metrics storage engines
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+from mycroft_holmes.errors import MycroftMetricsStorageError
+from .history import HistoryStore
+from .spool import MetricsSpool
+
+
+# pylint: disable=too-many-public-methods,too-many-instance-attributes
+class MetricsStorage:
+    """
+    Base class for metrics storage engines.
+
+    Creating an instance of this class returns the engine set in the "engine" entry
+    of the storage config section (see ENGINE class constant of subclasses imported
+    in __init__.py file).
+    """
+    ENGINE = None
+
+    # host -> ConnectionPool (see engines that connect to a database server)
+    CONNECTION_POOLS = dict()
+
+    DEFAULT_BATCH_SIZE = 500
+
+    # rows removed by a single DELETE query when compacting the storage
+    DEFAULT_COMPACT_BATCH_SIZE = 10000
+
+    # values aggregated per day that can be read from the metrics history
+    HISTORY_AGGREGATES = ('min', 'max', 'last', 'avg')
+
+    # pylint: disable=unused-argument
+    def __new__(cls, config, use_slave=True):
+        """
+        Picks the storage engine
+
+        :type config mycroft_holmes.config.Config
+        :type use_slave bool
+        :raise: MycroftMetricsStorageError
+        """
+        storage_class = cls
+
+        if cls is MetricsStorage:
+            engine = config.get_raw()['storage'].get('engine')
+            engines = MetricsStorage.engines()
+
+            if engine not in engines:
+                raise MycroftMetricsStorageError(
+                    'Unknown storage engine "%s" (available engines: %s)' % (
+                        engine, sorted(engines.keys())))
+
+            storage_class = engines[engine]
+
+        return super().__new__(storage_class)
+
+    def __init__(self, config, use_slave=True):
+        """
+        :type config mycroft_holmes.config.Config
+        :type use_slave bool
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._storage = None
+        self.data = dict()
+
+        # read the config
+        self.config = config.get_raw()['storage']
+
+        # how many rows are sent in a single INSERT query
+        self.batch_size = int(self.config.get('batch_size', self.DEFAULT_BATCH_SIZE))
+
+        # keep raw rows in features_metrics_compact table (see migrate_to_compact_schema)
+        self.compact_schema = bool(self.config.get('compact_schema', False))
+
+        # keep metrics history in memory-mapped files as well (see HistoryStore)
+        history_path = self.config.get('history_path')
+        self.history = HistoryStore(history_path) if history_path else None
+
+        # keep metrics in a local file when they can not be stored (see MetricsSpool)
+        spool_path = self.config.get('spool_path')
+        self.spool = MetricsSpool(spool_path) if spool_path else None
+
+    @staticmethod
+    def engines():
+        """
+        Returns engine name -> storage class dictionary
+
+        :rtype: dict
+        """
+        return {
+            _class.ENGINE: _class
+            for _class in MetricsStorage.__subclasses__()
+            if _class.ENGINE
+        }
+
+    @staticmethod
+    def get_pools_stats():
+        """
+        Returns host -> metrics of the pool of connections to it
+
+        :rtype: dict
+        """
+        return {
+            host: pool.get_stats()
+            for host, pool in sorted(MetricsStorage.CONNECTION_POOLS.items())
+        }
+
+    @property
+    def storage(self):
+        """
+        Lazy-connect to a storage and return a connection
+
+        :rtype: object
+        """
+        raise NotImplementedError('storage needs to be implemented')
+
+    def close(self):
+        """
+        Releases the connection to a storage (a no-op by default). Call it when the storage
+        instance is no longer needed, the next query connects again.
+        """
+
+    @staticmethod
+    def cast_value(value):
+        """
+        :type value decimal.Decimal|float
+        :rtype: int|float
+        """
+        value = float(value)
+        return int(value) if value.is_integer() else value
+
+    def get(self, feature_id, feature_metric):
+        """
+        :type feature_id str
+        :type feature_metric str
+        :raise: MycroftMetricsStorageError
+        :rtype: int|float|None
+        """
+        raise NotImplementedError('get needs to be implemented')
+
+    def get_many(self, pairs):
+        """
+        Returns the latest values for given (feature ID, metric) pairs using a single query.
+        Pairs with no value stored are not included in the returned dictionary.
+
+        :type pairs list[tuple[str, str]]
+        :raise: MycroftMetricsStorageError
+        :rtype: dict
+        """
+        raise NotImplementedError('get_many needs to be implemented')
+
+    def get_all_latest(self):
+        """
+        Returns the latest values of all metrics of all features using a single query
+
+        :raise: MycroftMetricsStorageError
+        :rtype: dict
+        """
+        raise NotImplementedError('get_all_latest needs to be implemented')
+
+    def push(self, feature_id, feature_metrics):
+        """
+        :type feature_id str
+        :type feature_metrics dict
+        """
+        self.logger.info('Pushing metrics for "%s": %s', feature_id, feature_metrics)
+
+        self.data[feature_id] = feature_metrics
+
+    def get_rows(self, timestamp):
+        """
+        Returns (feature, metric, value, timestamp) rows for metrics collected via push()
+
+        :type timestamp str|datetime.datetime
+        :rtype: list[tuple]
+        """
+        rows = []
+
+        for feature_id, feature_metrics in self.data.items():
+            for (metric, value) in feature_metrics.items():
+                self.logger.debug("Storing %s ...", (feature_id, metric, value))
+                rows.append((feature_id, metric, value, timestamp))
+
+        return rows
+
+    def get_current_timestamp(self):
+        """
+        Returns the current timestamp as given by the storage
+
+        :raise: MycroftMetricsStorageError
+        :rtype: str|datetime.datetime
+        """
+        raise NotImplementedError('get_current_timestamp needs to be implemented')
+
+    def is_stored(self, feature_id, metric, timestamp):
+        """
+        Checks if a value of a given metric is stored with a given timestamp
+
+        :type feature_id str
+        :type metric str
+        :type timestamp str
+        :raise: MycroftMetricsStorageError
+        :rtype: bool
+        """
+        raise NotImplementedError('is_stored needs to be implemented')
+
+    def write_rows(self, rows):
+        """
+        Stores (feature, metric, value, timestamp) rows in a single transaction
+
+        :type rows list[tuple]
+        :raise: MycroftMetricsStorageError
+        """
+        raise NotImplementedError('write_rows needs to be implemented')
+
+    def commit(self, timestamp=None):
+        """
+        Store metrics collected via push()
+
+        When "spool_path" is set in the storage config, metrics that can not be stored
+        are appended to the spool file instead. They are stored on the next run
+        (or by replay_spool script).
+
+        :type timestamp str
+        :raise: MycroftMetricsStorageError
+        """
+        try:
+            if self.spool is not None and not self.spool.is_empty():
+                try:
+                    self.replay_spool()
+                except MycroftMetricsStorageError as ex:
+                    self.logger.error('Failed to replay %s: %s', self.spool, ex)
+
+            if timestamp is None:
+                timestamp = self.get_current_timestamp()
+
+            self.write_rows(self.get_rows(timestamp))
+
+        except MycroftMetricsStorageError as ex:
+            if self.spool is None:
+                raise
+
+            # use the local time when the storage could not be asked for it
+            rows = self.get_rows(timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self.spool.append(rows)
+
+            self.logger.error('Metrics have been spooled in %s: %s', self.spool, ex)
+
+        finally:
+            self.data = dict()
+
+    def replay_spool(self):
+        """
+        Stores rows kept in the spool file, one collection run at a time, and clears the spool.
+
+        Runs that are already stored (i.e. the storage has a value of their first row
+        with their timestamp) are skipped, so it's safe to replay the same spool again.
+
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        if self.spool is None:
+            raise MycroftMetricsStorageError(
+                '"spool_path" needs to be specified in "storage" config section')
+
+        stored = 0
+
+        for timestamp, rows in self.spool.read().items():
+            (feature_id, metric, _, _) = rows[0]
+
+            if self.is_stored(feature_id, metric, timestamp):
+                self.logger.info('Run from %s has already been stored, skipping', timestamp)
+                continue
+
+            self.write_rows(rows)
+            stored += len(rows)
+
+        self.spool.clear()
+
+        self.logger.info('Replayed %d rows from %s', stored, self.spool)
+        return stored
+
+    def get_the_latest_timestamp(self):
+        """
+        Get the timestamp of the latest entry in metrics storage
+
+        :rtype: str|None
+        """
+        raise NotImplementedError('get_the_latest_timestamp needs to be implemented')
+
+    def store_history(self, rows):
+        """
+        Appends committed (feature, metric, value, timestamp) rows to the history store
+
+        :type rows list[tuple]
+        """
+        if self.history is None:
+            return
+
+        try:
+            self.history.append(rows)
+        except OSError as ex:
+            # values are already stored in the database
+            self.logger.error('Failed to update history store (run rebuild_history_store): %s',
+                              ex, exc_info=True)
+
+    def get_feature_metrics_history(self, feature__id, aggregate='max'):
+        """
+        Yields the historical values of all metrics for a given feature (one per day).
+        They are read from the history store when it's configured.
+
+        :type feature__id str
+        :type aggregate str one of min, max, last, avg
+        :rtype: list[dict]
+        """
+        assert aggregate in self.HISTORY_AGGREGATES, \
+            'aggregate needs to be one of %s' % (self.HISTORY_AGGREGATES,)
+
+        if self.history is not None:
+            return self.history.get_feature_metrics_history(feature__id, aggregate)
+
+        return self.get_daily_metrics_history(feature__id, aggregate)
+
+    def get_daily_metrics_history(self, feature__id, aggregate='max'):
+        """
+        Yields the historical values of all metrics for a given feature (one per day)
+        read from the database.
+
+        :type feature__id str
+        :type aggregate str one of min, max, last, avg
+        :rtype: list[dict]
+        """
+        raise NotImplementedError('get_daily_metrics_history needs to be implemented')
+
+    def get_raw_rows(self):
+        """
+        Yields all raw (feature, metric, value, timestamp) rows ordered by their entry ID
+
+        :raise: MycroftMetricsStorageError
+        :rtype: list[tuple]
+        """
+        raise NotImplementedError('get_raw_rows needs to be implemented')
+
+    def rebuild_history_store(self, batch_size=None):
+        """
+        (Re)builds the history store from the raw rows kept in the database
+
+        :type batch_size int|None
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        if self.history is None:
+            raise MycroftMetricsStorageError(
+                '"history_path" needs to be specified in "storage" config section')
+
+        batch_size = batch_size or self.DEFAULT_COMPACT_BATCH_SIZE
+        rows = []
+        stored = 0
+
+        self.logger.info('Rebuilding %s', self.history)
+        self.history.clear()
+
+        for row in self.get_raw_rows():
+            rows.append(row)
+
+            if len(rows) == batch_size:
+                self.history.append(rows)
+                stored += len(rows)
+                rows = []
+
+        self.history.append(rows)
+        return stored + len(rows)
+
+    def backfill_daily_metrics(self):
+        """
+        (Re)builds features_metrics_daily rollup table from the raw rows, one feature at a time.
+        It's safe to run it more than once - aggregates are replaced, not added up.
+
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        raise NotImplementedError('backfill_daily_metrics needs to be implemented')
+
+    def migrate_to_compact_schema(self, batch_size=None):
+        """
+        Copies raw rows to the compact schema tables
+
+        :type batch_size int|None
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        raise MycroftMetricsStorageError(
+            'Compact schema is not supported by "%s" storage engine' % self.ENGINE)
+
+    def get_retention_policy(self):
+        """
+        Returns the retention policy configured in "retention" entry of the storage section
+        (None when it's not set). Periods are given in days.
+
+        ```yaml
+        storage:
+          retention:
+            raw: 30  # keep raw rows for 30 days
+            daily: 730  # per-day aggregates for 2 years (per-month ones after that)
+            batch_size: 10000  # this is optional, rows removed by a single query
+        ```
+
+        :raise: AssertionError
+        :rtype: dict|None
+        """
+        retention = self.config.get('retention')
+
+        if not retention:
+            return None
+
+        policy = {
+            'raw': retention.get('raw'),
+            'daily': retention.get('daily'),
+            'batch_size': int(retention.get('batch_size', self.DEFAULT_COMPACT_BATCH_SIZE)),
+        }
+
+        # the history of the current day is taken from raw rows
+        assert policy['raw'] is None or int(policy['raw']) >= 1, \
+            'raw rows need to be kept for at least one day'
+
+        assert policy['daily'] is None or int(policy['daily']) >= 1, \
+            'daily rows need to be kept for at least one day'
+
+        # raw rows are removed when their days are covered by daily rows
+        assert policy['raw'] is None or policy['daily'] is None or \
+            int(policy['raw']) <= int(policy['daily']), \
+            'raw rows can not be kept longer than daily ones'
+
+        return policy
+
+    def compact(self, today=None):
+        """
+        Applies the retention policy: removes raw rows and merges per-day aggregates
+        into per-month ones when they get old enough.
+
+        Work is done in small batches (and transactions), so it does not lock tables for long
+        and can be interrupted and run again.
+
+        :type today datetime.date|None
+        :raise: MycroftMetricsStorageError
+        :rtype: dict
+        """
+        policy = self.get_retention_policy()
+        today = today or date.today()
+        stats = {'raw_removed': 0, 'features_downsampled': 0}
+
+        if policy is None:
+            self.logger.info('Retention policy is not configured')
+            return stats
+
+        if policy['raw'] is not None:
+            before = today - timedelta(days=int(policy['raw']))
+
+            # do not lose the history that has not been rolled up yet
+            uncovered = self.count_uncovered_days(before)
+
+            if uncovered:
+                raise MycroftMetricsStorageError(
+                    'Raw rows older than %s are not covered by features_metrics_daily rows '
+                    '(%d days of metrics), run backfill_daily_metrics first' % (before, uncovered))
+
+            stats['raw_removed'] = self.remove_raw_metrics(
+                before=before, batch_size=policy['batch_size'])
+
+        if policy['daily'] is not None:
+            # keep the whole month that is partially covered by the period
+            before = today - timedelta(days=int(policy['daily']))
+            stats['features_downsampled'] = self.downsample_daily_metrics(
+                before=before.replace(day=1))
+
+        self.logger.info('Storage compacted: %s', stats)
+        return stats
+
+    def count_uncovered_days(self, before):
+        """
+        Returns the number of (feature, metric, day) groups of raw rows older than a given date
+        that have no features_metrics_daily row (neither per-day nor per-month one)
+
+        :type before datetime.date
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        raise NotImplementedError('count_uncovered_days needs to be implemented')
+
+    def remove_raw_metrics(self, before, batch_size):
+        """
+        Removes raw rows older than a given date, batch_size rows at a time.
+        Their values are kept in features_metrics_daily table.
+
+        :type before datetime.date
+        :type batch_size int
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        raise NotImplementedError('remove_raw_metrics needs to be implemented')
+
+    def downsample_daily_metrics(self, before):
+        """
+        Merges features_metrics_daily rows older than a given date into per-month rows
+        (stored with the first day of the month), one feature at a time.
+
+        :type before datetime.date the first day of a month
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        raise NotImplementedError('downsample_daily_metrics needs to be implemented')
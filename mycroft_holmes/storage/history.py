@@ -0,0 +1,227 @@
+"""
+Memory-mapped columnar store of metrics history
+"""
+import calendar
+import logging
+import os
+
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+try:
+    import numpy as np
+except ImportError:
+    # install "history" extras to use the history store
+    np = None
+
+from mycroft_holmes.errors import MycroftMetricsStorageError
+
+
+class HistoryStore:
+    """
+    Keeps (timestamp, value) records of each metric in a binary file
+    (<path>/<feature>/<metric>.bin) sorted by timestamp.
+
+    Files are read using memory mapping, so time ranges of long histories are sliced
+    with no copying and per-day aggregates are calculated with NumPy, with no SQL queries.
+
+    ```yaml
+    storage:
+      engine: mysql
+      # ...
+      history_path: /var/lib/mike/history
+    ```
+    """
+    EXTENSION = '.bin'
+
+    SECONDS_PER_DAY = 86400
+
+    def __init__(self, path):
+        """
+        :type path str
+        :raise: MycroftMetricsStorageError
+        """
+        if np is None:
+            raise MycroftMetricsStorageError('numpy needs to be installed to use history store')
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.path = path
+        self.dtype = np.dtype([('timestamp', '<i8'), ('value', '<f8')])
+
+    def __repr__(self):
+        """
+        :rtype: str
+        """
+        return '<{} {}>'.format(self.__class__.__name__, self.path)
+
+    def get_file_path(self, feature_id, metric=None):
+        """
+        Returns the path to the feature directory or to the metric file
+
+        :type feature_id str
+        :type metric str|None
+        :rtype: str
+        """
+        directory = os.path.join(self.path, quote(feature_id, safe=''))
+
+        if metric is None:
+            return directory
+
+        return os.path.join(directory, quote(metric, safe='') + self.EXTENSION)
+
+    @staticmethod
+    def to_epoch(timestamp):
+        """
+        Converts the storage timestamp to seconds
+
+        :type timestamp str|datetime
+        :rtype: int
+        """
+        timestamp = datetime.strptime(str(timestamp)[:19], '%Y-%m-%d %H:%M:%S')
+        return calendar.timegm(timestamp.timetuple())
+
+    def append(self, rows):
+        """
+        Stores (feature, metric, value, timestamp) rows
+
+        :type rows list[tuple]
+        """
+        records = OrderedDict()
+
+        for (feature_id, metric, value, timestamp) in rows:
+            # keep the same precision as MySQL storage does, i.e. DECIMAL(20, 2)
+            records.setdefault((feature_id, metric), []).append(
+                (self.to_epoch(timestamp), round(float(value), 2)))
+
+        for (feature_id, metric), metric_records in records.items():
+            self._append_records(
+                feature_id, metric, np.sort(np.array(metric_records, dtype=self.dtype)))
+
+        self.logger.info('Stored %d rows in %s', len(rows), self)
+
+    def _append_records(self, feature_id, metric, records):
+        """
+        :type feature_id str
+        :type metric str
+        :type records numpy.ndarray
+        """
+        path = self.get_file_path(feature_id, metric)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        stored = self.get_metric_history(feature_id, metric)
+
+        # an older value has been committed - keep records sorted by timestamp
+        if len(stored) and records['timestamp'][0] < stored['timestamp'][-1]:
+            merged = np.concatenate([stored, records])
+            merged = merged[np.argsort(merged['timestamp'], kind='stable')]
+
+            merged.tofile(path + '.tmp')
+            os.replace(path + '.tmp', path)
+            return
+
+        with open(path, 'ab') as handle:
+            handle.write(records.tobytes())
+
+    def get_metrics(self, feature_id):
+        """
+        Returns names of metrics stored for a given feature
+
+        :type feature_id str
+        :rtype: list[str]
+        """
+        directory = self.get_file_path(feature_id)
+
+        if not os.path.isdir(directory):
+            return []
+
+        return sorted(
+            unquote(name[:-len(self.EXTENSION)])
+            for name in os.listdir(directory)
+            if name.endswith(self.EXTENSION)
+        )
+
+    def get_metric_history(self, feature_id, metric, since=None, until=None):
+        """
+        Returns a memory-mapped array of (timestamp, value) records of a given metric,
+        optionally sliced to [since, until) range (no copy is made).
+
+        :type feature_id str
+        :type metric str
+        :type since str|None
+        :type until str|None
+        :rtype: numpy.ndarray
+        """
+        path = self.get_file_path(feature_id, metric)
+        size = os.path.getsize(path) // self.dtype.itemsize if os.path.exists(path) else 0
+
+        if size == 0:
+            return np.empty(0, dtype=self.dtype)
+
+        records = np.memmap(path, dtype=self.dtype, mode='r', shape=(size,))
+
+        start = np.searchsorted(records['timestamp'], self.to_epoch(since)) if since else 0
+        end = np.searchsorted(records['timestamp'], self.to_epoch(until)) if until else size
+
+        return records[start:end]
+
+    def get_feature_metrics_history(self, feature_id, aggregate='max'):
+        """
+        Yields per-day aggregates of all metrics for a given feature
+        (ordered by date and metric name).
+
+        :type feature_id str
+        :type aggregate str one of min, max, last, avg
+        :rtype: list[dict]
+        """
+        rows = []
+
+        for metric in self.get_metrics(feature_id):
+            records = self.get_metric_history(feature_id, metric)
+
+            if len(records) == 0:
+                continue
+
+            values = records['value']
+            days = records['timestamp'] // self.SECONDS_PER_DAY
+
+            # indices of the first and the last record of each day
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1))
+            ends = np.append(starts[1:], len(values))
+
+            if aggregate == 'min':
+                aggregated = np.minimum.reduceat(values, starts)
+            elif aggregate == 'max':
+                aggregated = np.maximum.reduceat(values, starts)
+            elif aggregate == 'last':
+                aggregated = values[ends - 1]
+            else:
+                aggregated = np.add.reduceat(values, starts) / (ends - starts)
+
+            dates = days[starts].astype('datetime64[D]').astype(str)
+            rows += zip(dates.tolist(), [metric] * len(dates), aggregated.tolist())
+
+        for (date, metric, value) in sorted(rows):
+            yield {
+                'date': date,
+                'metric': metric,
+                'value': value,
+            }
+
+    def clear(self):
+        """
+        Removes all metrics files
+        """
+        if not os.path.isdir(self.path):
+            return
+
+        for directory in os.listdir(self.path):
+            directory = os.path.join(self.path, directory)
+
+            if not os.path.isdir(directory):
+                continue
+
+            for name in os.listdir(directory):
+                if name.endswith(self.EXTENSION):
+                    os.remove(os.path.join(directory, name))
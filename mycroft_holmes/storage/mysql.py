@@ -0,0 +1,775 @@
+"""
+MySQL metrics storage engine
+"""
+import logging
+from functools import partial
+
+from mysql import connector
+from mysql.connector.errors import Error as MySqlError
+
+from mycroft_holmes.errors import MycroftMetricsStorageError
+from .base import MetricsStorage
+from .pool import ConnectionPool
+
+
+# pylint: disable=too-many-public-methods
+class MySqlMetricsStorage(MetricsStorage):
+    """
+    MySQL storage
+    """
+    ENGINE = 'mysql'
+
+    # (host, dimension table) -> name -> ID (used by the compact schema)
+    DIMENSIONS_CACHE = dict()
+
+    # features_metrics_daily rows are built from (feature, metric, value, timestamp) ones
+    DAILY_COLUMNS = '(feature, metric, date, min_value, max_value, last_value, ' \
+        'last_timestamp, sum_value, samples)'
+    DAILY_PLACEHOLDERS = '(%s, %s, DATE(%s), %s, %s, %s, %s, %s, 1)'
+
+    # raw rows of the compact schema refer to features and metrics dimension tables
+    COMPACT_TABLE = 'features_metrics_compact'
+    COMPACT_ROWS = 'features_metrics_compact ' \
+        'JOIN features USING (feature_id) JOIN metrics USING (metric_id)'
+
+    def __init__(self, config, use_slave=True):
+        """
+        Connect to storage database.
+        Use slave by default (use "host_slave" config entry if provided)
+
+        :type config mycroft_holmes.config.Config
+        :type use_slave bool
+        """
+        super().__init__(config, use_slave)
+
+        # pick a host
+        if use_slave and 'host_slave' in self.config:
+            self.config['host'] = self.config['host_slave']
+
+    @property
+    def raw_table(self):
+        """
+        Returns the name of the table with raw rows
+
+        :rtype: str
+        """
+        return self.COMPACT_TABLE if self.compact_schema else 'features_metrics'
+
+    @property
+    def raw_rows(self):
+        """
+        Returns the table expression that provides raw (feature, metric, value, timestamp) rows
+
+        :rtype: str
+        """
+        return self.COMPACT_ROWS if self.compact_schema else 'features_metrics'
+
+    @property
+    def storage(self):
+        """
+        Lazy-connect to a storage and return a handler, i.e. MySQL connection
+        checked out from the pool of connections to the host (see close method)
+
+        :raise: MycroftMetricsStorageError
+        :rtype: mysql.connector.connection.MySQLConnection
+        """
+        if self._storage is None:
+            self._storage = self.get_pool().acquire()
+
+        return self._storage
+
+    def get_pool(self):
+        """
+        Returns the pool of connections to the storage host (it's shared by storage instances)
+
+        :rtype: ConnectionPool
+        """
+        storage_host = self.config['host']
+
+        if storage_host not in self.CONNECTION_POOLS:
+            self.CONNECTION_POOLS.setdefault(storage_host, ConnectionPool(
+                connect=partial(self.connect, dict(self.config)),
+                check=self.check_connection,
+                size=self.config.get('pool_size'),
+                timeout=self.config.get('pool_timeout'),
+                health_check_interval=self.config.get('pool_health_check_interval'),
+            ))
+
+        return self.CONNECTION_POOLS[storage_host]
+
+    @classmethod
+    def connect(cls, config):
+        """
+        :type config dict
+        :rtype: mysql.connector.connection.MySQLConnection
+        """
+        logging.getLogger(cls.__name__).info(
+            'Connecting to MySQL running at "%s"...', config['host'])
+
+        # https://dev.mysql.com/doc/connector-python
+        return connector.connect(
+            host=config['host'],
+            database=config['database'],
+            user=config['user'],
+            password=config['password'],
+        )
+
+    @staticmethod
+    def check_connection(connection):
+        """
+        :type connection mysql.connector.connection.MySQLConnection
+        :raise: MySqlError
+        """
+        # https://dev.mysql.com/doc/connector-python/en/connector-python-api-mysqlconnection-ping.html
+        connection.ping()
+
+    def close(self):
+        """
+        Returns the connection to the pool
+        """
+        connection, self._storage = self._storage, None
+
+        if connection is None:
+            return
+
+        discard = False
+
+        try:
+            # roll back a transaction left by a failed query
+            if getattr(connection, 'in_transaction', False):
+                connection.rollback()
+        except MySqlError as ex:
+            self.logger.warning('Discarding the connection: %s', ex)
+            discard = True
+
+        self.get_pool().release(connection, discard=discard)
+
+    def __del__(self):
+        """
+        Returns the connection to the pool when the storage instance is no longer used
+        """
+        if getattr(self, '_storage', None) is not None:
+            self.close()
+
+    def get(self, feature_id, feature_metric):
+        """
+        :type feature_id str
+        :type feature_metric str
+        :rtype: int|float|None
+        """
+        # SELECT value FROM features_metrics_latest
+        # WHERE feature = 'ckeditor' and metric = 'score';
+        self.logger.info('Reading metric for "%s": %s', feature_id, feature_metric)
+
+        try:
+            cursor = self.storage.cursor()
+
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ value FROM features_metrics_latest '
+                'WHERE feature = %s and metric = %s',
+                (feature_id, feature_metric)
+            )
+
+            # self.logger.debug('SQL: %s', cursor.statement)
+
+            row = cursor.fetchone()
+
+            return self.cast_value(row[0]) if row else None
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def get_many(self, pairs):
+        """
+        Returns the latest values for given (feature ID, metric) pairs using a single query.
+        Pairs with no value stored are not included in the returned dictionary.
+
+        :type pairs list[tuple[str, str]]
+        :rtype: dict
+        """
+        pairs = list(pairs)
+
+        if not pairs:
+            return dict()
+
+        self.logger.info('Reading %d metrics', len(pairs))
+
+        return self._get_latest_values(
+            'WHERE (feature, metric) IN ({})'.format(', '.join(['(%s, %s)'] * len(pairs))),
+            [param for pair in pairs for param in pair]
+        )
+
+    def get_all_latest(self):
+        """
+        Returns the latest values of all metrics of all features using a single query
+
+        :rtype: dict
+        """
+        self.logger.info('Reading all metrics')
+
+        return self._get_latest_values()
+
+    def _get_latest_values(self, where='', params=None):
+        """
+        Returns (feature ID, metric) -> value dictionary
+
+        :type where str
+        :type params list|None
+        :rtype: dict
+        """
+        try:
+            cursor = self.storage.cursor()
+
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ feature, metric, value '
+                'FROM features_metrics_latest {}'.format(where).strip(),
+                params
+            )
+
+            return {
+                (feature_id, metric): self.cast_value(value)
+                for (feature_id, metric, value) in cursor
+            }
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def get_current_timestamp(self):
+        """
+        :raise: MycroftMetricsStorageError
+        :rtype: datetime.datetime
+        """
+        try:
+            cursor = self.storage.cursor()
+            cursor.execute('SELECT /* mycroft_holmes */ NOW()')
+            timestamp = cursor.fetchone()[0]
+
+            # end the implicit transaction started by the query above
+            self.storage.commit()
+
+            return timestamp
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def is_stored(self, feature_id, metric, timestamp):
+        """
+        :type feature_id str
+        :type metric str
+        :type timestamp str
+        :raise: MycroftMetricsStorageError
+        :rtype: bool
+        """
+        try:
+            cursor = self.storage.cursor()
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ 1 FROM {} '
+                'WHERE feature = %s AND metric = %s AND timestamp = %s LIMIT 1'.format(
+                    self.raw_rows),
+                (feature_id, metric, timestamp)
+            )
+
+            stored = cursor.fetchone() is not None
+            self.storage.commit()
+
+            return stored
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def write_rows(self, rows):
+        """
+        Stores (feature, metric, value, timestamp) rows in a single transaction
+
+        :type rows list[tuple]
+        :raise: MycroftMetricsStorageError
+        """
+        try:
+            cursor = self.storage.cursor()
+
+            # new dimensions are committed before rows referring to them are inserted
+            compact_rows = self._encode_rows(rows) if self.compact_schema else None
+
+            self.storage.start_transaction()
+            self.logger.info('Storing %d rows in batches of %d', len(rows), self.batch_size)
+
+            if self.compact_schema:
+                self._insert_rows(
+                    cursor, self.COMPACT_TABLE, compact_rows,
+                    columns='(feature_id, metric_id, value, timestamp)')
+            else:
+                self._insert_rows(cursor, 'features_metrics', rows)
+
+            # keep the latest value of each metric (older values do not overwrite newer ones)
+            self._insert_rows(
+                cursor, 'features_metrics_latest', rows,
+                'ON DUPLICATE KEY UPDATE '
+                'value = IF(VALUES(timestamp) >= timestamp, VALUES(value), value), '
+                'timestamp = GREATEST(timestamp, VALUES(timestamp))'
+            )
+
+            # update per-day aggregates of each metric (see get_feature_metrics_history)
+            self._insert_rows(
+                cursor, 'features_metrics_daily',
+                [
+                    (feature_id, metric, timestamp, value, value, value, timestamp, value)
+                    for (feature_id, metric, value, timestamp) in rows
+                ],
+                'ON DUPLICATE KEY UPDATE '
+                'min_value = LEAST(min_value, VALUES(min_value)), '
+                'max_value = GREATEST(max_value, VALUES(max_value)), '
+                'last_value = IF(VALUES(last_timestamp) >= last_timestamp, '
+                'VALUES(last_value), last_value), '
+                'last_timestamp = GREATEST(last_timestamp, VALUES(last_timestamp)), '
+                'sum_value = sum_value + VALUES(sum_value), '
+                'samples = samples + VALUES(samples)',
+                columns=self.DAILY_COLUMNS,
+                placeholders=self.DAILY_PLACEHOLDERS
+            )
+
+            self.storage.commit()
+
+            self.store_history(rows)
+            self.logger.info('Data has been stored')
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+
+            # do not let the next commit store a half-written run
+            self._rollback()
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def _rollback(self):
+        """
+        Rolls back the current transaction (the connection is discarded when it fails)
+        """
+        try:
+            self.storage.rollback()
+        except MySqlError as ex:
+            self.logger.warning('Rollback failed: %s', ex)
+
+            connection, self._storage = self._storage, None
+            self.get_pool().release(connection, discard=True)
+
+    def _encode_rows(self, rows):
+        """
+        Replaces features and metrics names in (feature, metric, value, timestamp) rows
+        with their IDs taken from dimension tables
+
+        :type rows list[tuple]
+        :rtype: list[tuple]
+        """
+        features = self.get_dimension_ids('features', set(row[0] for row in rows))
+        metrics = self.get_dimension_ids('metrics', set(row[1] for row in rows))
+
+        return [
+            (features[feature_id], metrics[metric], value, timestamp)
+            for (feature_id, metric, value, timestamp) in rows
+        ]
+
+    def get_dimension_ids(self, table, names):
+        """
+        Returns name -> ID dictionary for given features or metrics names.
+
+        IDs are cached in memory, names that are not there yet are added to the dimension table.
+        New names are committed in their own transaction before their IDs are cached.
+
+        :type table str features or metrics
+        :type names set[str]
+        :raise: MySqlError|MycroftMetricsStorageError
+        :rtype: dict
+        """
+        assert table in ('features', 'metrics'), 'Unknown dimension table: %s' % table
+
+        # features.feature and metrics.metric
+        column = table[:-1]
+        cache = self.DIMENSIONS_CACHE.setdefault((self.config['host'], table), dict())
+        ids = {name: cache[name] for name in names if name in cache}
+
+        cursor = self.storage.cursor()
+
+        def select(missing):
+            """
+            :type missing list[str]
+            """
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ {column}, {column}_id FROM {table} '
+                'WHERE {column} IN ({values})'.format(
+                    column=column, table=table, values=', '.join(['%s'] * len(missing))),
+                missing
+            )
+
+            ids.update(cursor.fetchall())
+
+        missing = sorted(set(names) - set(ids.keys()))
+
+        if not missing:
+            return ids
+
+        select(missing)
+        missing = sorted(set(names) - set(ids.keys()))
+
+        if missing:
+            self.logger.info('Adding %s to %s table', missing, table)
+
+            cursor.execute(
+                'INSERT IGNORE INTO /* mycroft_holmes */ {table} ({column}) VALUES {values}'.format(
+                    column=column, table=table, values=', '.join(['(%s)'] * len(missing))),
+                missing
+            )
+
+            select(missing)
+
+        # IDs of names that were not committed must not be cached
+        self.storage.commit()
+        cache.update(ids)
+
+        missing = sorted(set(names) - set(ids.keys()))
+
+        if missing:
+            raise MycroftMetricsStorageError(
+                'Storage error occured: %s not found in %s table' % (missing, table))
+
+        return {name: ids[name] for name in names}
+
+    def migrate_to_compact_schema(self, batch_size=None):
+        """
+        Copies raw rows from features_metrics table to features_metrics_compact one
+        in batches (keeping their entry IDs). It resumes from the last row copied,
+        so run it once again right before setting "compact_schema" in the config.
+
+        :type batch_size int|None
+        :rtype: int
+        """
+        batch_size = batch_size or self.DEFAULT_COMPACT_BATCH_SIZE
+        cursor = self.storage.cursor()
+        copied = 0
+
+        try:
+            # fill dimension tables
+            for table, column in [('features', 'feature'), ('metrics', 'metric')]:
+                cursor.execute(
+                    'INSERT IGNORE INTO /* mycroft_holmes */ {table} ({column}) '
+                    'SELECT DISTINCT {column} FROM features_metrics'.format(
+                        table=table, column=column)
+                )
+
+            self.storage.commit()
+
+            while True:
+                self.storage.start_transaction()
+
+                cursor.execute(
+                    'SELECT /* mycroft_holmes */ COALESCE(MAX(entry_id), 0) '
+                    'FROM {}'.format(self.COMPACT_TABLE))
+                last_entry_id = cursor.fetchone()[0]
+
+                cursor.execute(
+                    'INSERT INTO /* mycroft_holmes */ {table} '
+                    '(entry_id, feature_id, metric_id, value, timestamp) '
+                    'SELECT entry_id, feature_id, metric_id, value, timestamp '
+                    'FROM features_metrics JOIN features USING (feature) '
+                    'JOIN metrics USING (metric) '
+                    'WHERE entry_id > %s ORDER BY entry_id LIMIT %s'.format(
+                        table=self.COMPACT_TABLE),
+                    (last_entry_id, batch_size)
+                )
+
+                batch_copied = cursor.rowcount
+                self.storage.commit()
+
+                copied += batch_copied
+                self.logger.info('Copied %d rows (%d so far)', batch_copied, copied)
+
+                if batch_copied < batch_size:
+                    return copied
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    # pylint: disable=too-many-arguments
+    def _insert_rows(self, cursor, table, rows, on_duplicate_key='', *,
+                     columns='(feature, metric, value, timestamp)',
+                     placeholders='(%s, %s, %s, %s)'):
+        """
+        Inserts rows (by default (feature, metric, value, timestamp) ones)
+        using multi-row INSERT queries
+
+        :type cursor mysql.connector.cursor.MySQLCursor
+        :type table str
+        :type rows list[tuple]
+        :type on_duplicate_key str
+        :type columns str
+        :type placeholders str
+        """
+        for offset in range(0, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+
+            cursor.execute(
+                'INSERT INTO /* mycroft_holmes */ {table} {columns} '
+                'VALUES {values} {on_duplicate_key}'.format(
+                    table=table,
+                    columns=columns,
+                    values=', '.join([placeholders] * len(batch)),
+                    on_duplicate_key=on_duplicate_key
+                ).strip(),
+                [param for row in batch for param in row]
+            )
+
+    def get_the_latest_timestamp(self):
+        """
+        Get the timestamp of the latest entry in metrics storage
+
+        :rtype: str|None
+        """
+        try:
+            cursor = self.storage.cursor()
+            cursor.execute(
+                "SELECT /* mycroft_holmes */ MAX(timestamp) FROM features_metrics_latest")
+
+            value = cursor.fetchone()[0]
+
+            # cast datetime.datetime to string
+            return str(value) if value else None
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            return None
+
+    def get_daily_metrics_history(self, feature__id, aggregate='max'):
+        """
+        Yields the historical values of all metrics for a given feature (one per day).
+
+        Past days are read from features_metrics_daily rollup table,
+        raw rows are aggregated only for the current day.
+
+        :type feature__id str
+        :type aggregate str one of min, max, last, avg
+        :rtype: list[dict]
+        """
+        cursor = self.storage.cursor()
+
+        cursor.execute(
+            "SELECT /* mycroft_holmes */ date, metric, "
+            "min_value, max_value, last_value, sum_value / samples "
+            "FROM features_metrics_daily "
+            "WHERE feature = %(feature)s AND date < CURDATE() "
+            "UNION ALL "
+            "SELECT DATE(timestamp) AS date, metric, MIN(value), MAX(value), "
+            "SUBSTRING_INDEX(GROUP_CONCAT(value ORDER BY timestamp DESC, entry_id DESC), ',', 1), "
+            "AVG(value) "
+            "FROM {raw_rows} "
+            "WHERE feature = %(feature)s AND timestamp >= CURDATE() GROUP BY date, metric "
+            "ORDER BY date, metric".format(raw_rows=self.raw_rows),
+            {
+                'feature': feature__id
+            }
+        )
+
+        column = 2 + self.HISTORY_AGGREGATES.index(aggregate)
+
+        for row in iter(cursor):
+            yield {
+                'date': str(row[0]),
+                'metric': row[1],
+                'value': float(row[column]),
+            }
+
+    def get_raw_rows(self):
+        """
+        Yields all raw (feature, metric, value, timestamp) rows ordered by their entry ID
+
+        :raise: MycroftMetricsStorageError
+        :rtype: list[tuple]
+        """
+        try:
+            cursor = self.storage.cursor()
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ feature, metric, value, timestamp '
+                'FROM {} ORDER BY entry_id'.format(self.raw_rows)
+            )
+
+            for row in cursor:
+                yield tuple(row)
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def backfill_daily_metrics(self):
+        """
+        (Re)builds features_metrics_daily rollup table from the raw rows, one feature at a time.
+        It's safe to run it more than once - aggregates are replaced, not added up.
+
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        try:
+            cursor = self.storage.cursor()
+
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ DISTINCT feature FROM {}'.format(self.raw_rows))
+            features = [row[0] for row in cursor.fetchall()]
+
+            # end the implicit transaction started by the query above
+            self.storage.commit()
+
+            self.logger.info('Backfilling daily metrics for %d features', len(features))
+
+            for feature_id in features:
+                self.storage.start_transaction()
+
+                cursor.execute(
+                    'INSERT INTO /* mycroft_holmes */ features_metrics_daily {columns} '
+                    'SELECT feature, metric, DATE(timestamp) AS date, MIN(value), MAX(value), '
+                    'SUBSTRING_INDEX('
+                    "GROUP_CONCAT(value ORDER BY timestamp DESC, entry_id DESC), ',', 1), "
+                    'MAX(timestamp), SUM(value), COUNT(*) '
+                    'FROM {raw_rows} WHERE feature = %s GROUP BY feature, metric, date '
+                    'ON DUPLICATE KEY UPDATE '
+                    'min_value = VALUES(min_value), max_value = VALUES(max_value), '
+                    'last_value = VALUES(last_value), last_timestamp = VALUES(last_timestamp), '
+                    'sum_value = VALUES(sum_value), samples = VALUES(samples)'.format(
+                        columns=self.DAILY_COLUMNS, raw_rows=self.raw_rows),
+                    (feature_id,)
+                )
+
+                self.storage.commit()
+                self.logger.info('Daily metrics for "%s" stored', feature_id)
+
+            return len(features)
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def count_uncovered_days(self, before):
+        """
+        Returns the number of (feature, metric, day) groups of raw rows older than a given date
+        that have no features_metrics_daily row (neither per-day nor per-month one)
+
+        :type before datetime.date
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        try:
+            cursor = self.storage.cursor()
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ COUNT(*) FROM ('
+                'SELECT DISTINCT feature, metric, DATE(timestamp) AS date FROM {rows} '
+                'WHERE timestamp < %s) AS raw WHERE NOT EXISTS ('
+                'SELECT 1 FROM features_metrics_daily AS daily '
+                'WHERE daily.feature = raw.feature AND daily.metric = raw.metric AND daily.date IN '
+                '(raw.date, raw.date - INTERVAL DAYOFMONTH(raw.date) - 1 DAY))'.format(
+                    rows=self.raw_rows),
+                (str(before),)
+            )
+
+            return int(cursor.fetchone()[0])
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def remove_raw_metrics(self, before, batch_size):
+        """
+        Removes raw rows older than a given date, batch_size rows at a time.
+        Their values are kept in features_metrics_daily table.
+
+        :type before datetime.date
+        :type batch_size int
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        try:
+            self.logger.info('Removing raw rows older than %s', before)
+
+            cursor = self.storage.cursor()
+            removed = 0
+
+            while True:
+                self.storage.start_transaction()
+
+                cursor.execute(
+                    'DELETE /* mycroft_holmes */ FROM {} '
+                    'WHERE timestamp < %s ORDER BY entry_id LIMIT %s'.format(self.raw_table),
+                    (str(before), batch_size)
+                )
+
+                batch_removed = cursor.rowcount
+                self.storage.commit()
+
+                removed += batch_removed
+                self.logger.info('Removed %d raw rows (%d so far)', batch_removed, removed)
+
+                if batch_removed < batch_size:
+                    return removed
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def downsample_daily_metrics(self, before):
+        """
+        Merges features_metrics_daily rows older than a given date into per-month rows
+        (stored with the first day of the month), one feature at a time.
+
+        :type before datetime.date the first day of a month
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        try:
+            self.logger.info('Downsampling daily rows older than %s', before)
+
+            cursor = self.storage.cursor()
+
+            cursor.execute(
+                'SELECT /* mycroft_holmes */ DISTINCT feature FROM features_metrics_daily '
+                'WHERE date < %s AND DAYOFMONTH(date) > 1',
+                (str(before),)
+            )
+            features = [row[0] for row in cursor.fetchall()]
+
+            # end the implicit transaction started by the query above
+            self.storage.commit()
+
+            for feature_id in features:
+                self.storage.start_transaction()
+
+                # aggregates of the first day of the month are replaced by ones for the whole month
+                cursor.execute(
+                    'INSERT INTO /* mycroft_holmes */ features_metrics_daily {columns} '
+                    'SELECT feature, metric, '
+                    'DATE_SUB(date, INTERVAL DAYOFMONTH(date) - 1 DAY) AS month, '
+                    'MIN(min_value), MAX(max_value), SUBSTRING_INDEX('
+                    "GROUP_CONCAT(last_value ORDER BY last_timestamp DESC, date DESC), ',', 1), "
+                    'MAX(last_timestamp), SUM(sum_value), SUM(samples) '
+                    'FROM features_metrics_daily WHERE feature = %s AND date < %s '
+                    'GROUP BY feature, metric, month '
+                    'ON DUPLICATE KEY UPDATE '
+                    'min_value = VALUES(min_value), max_value = VALUES(max_value), '
+                    'last_value = VALUES(last_value), last_timestamp = VALUES(last_timestamp), '
+                    'sum_value = VALUES(sum_value), samples = VALUES(samples)'.format(
+                        columns=self.DAILY_COLUMNS),
+                    (feature_id, str(before))
+                )
+
+                cursor.execute(
+                    'DELETE /* mycroft_holmes */ FROM features_metrics_daily '
+                    'WHERE feature = %s AND date < %s AND DAYOFMONTH(date) > 1',
+                    (feature_id, str(before))
+                )
+
+                self.storage.commit()
+                self.logger.info('Daily metrics for "%s" downsampled', feature_id)
+
+            return len(features)
+
+        except MySqlError as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
@@ -0,0 +1,186 @@
+"""
+Pool of database connections shared by storage instances
+"""
+import logging
+import threading
+import time
+
+from mycroft_holmes.errors import MycroftMetricsStorageError
+
+
+# pylint: disable=too-many-instance-attributes
+class ConnectionPool:
+    """
+    Keeps up to "size" connections to a single database host.
+
+    Connections are checked out by storage instances and returned when they are closed.
+    Instead of pinging the server every time a connection is used, its health is checked
+    only when it has been idle for longer than "health_check_interval" seconds.
+
+    ```yaml
+    storage:
+      engine: mysql
+      # ...
+      pool_size: 5  # connections per host
+      pool_timeout: 10  # seconds to wait for a free connection
+      pool_health_check_interval: 30  # seconds a connection can be idle before it's checked
+    ```
+    """
+    DEFAULT_SIZE = 5
+    DEFAULT_TIMEOUT = 10
+    DEFAULT_HEALTH_CHECK_INTERVAL = 30
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, connect, check, size=None, timeout=None, health_check_interval=None):
+        """
+        :type connect callable returns a new connection
+        :type check callable raises an exception when a given connection is not usable
+        :type size int|None
+        :type timeout float|None
+        :type health_check_interval float|None
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.connect = connect
+        self.check = check
+
+        self.size = max(1, int(size or self.DEFAULT_SIZE))
+        self.timeout = float(timeout or self.DEFAULT_TIMEOUT)
+        self.health_check_interval = float(
+            health_check_interval if health_check_interval is not None
+            else self.DEFAULT_HEALTH_CHECK_INTERVAL)
+
+        self._condition = threading.Condition()
+        self._idle = []  # list of (connection, time it was returned to the pool)
+        self._connections = 0
+
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.,
+            'timeouts': 0,
+            'health_checks': 0,
+            'reconnects': 0,
+        }
+
+    def __repr__(self):
+        """
+        :rtype: str
+        """
+        return '<{} {}/{} connections>'.format(
+            self.__class__.__name__, self._connections, self.size)
+
+    def acquire(self):
+        """
+        Checks out a connection, waits up to "timeout" seconds when all of them are in use
+
+        :raise: MycroftMetricsStorageError
+        :rtype: object
+        """
+        with self._condition:
+            if not self._idle and self._connections >= self.size:
+                self.stats['waits'] += 1
+                started = time.time()
+
+                if not self._condition.wait_for(
+                        lambda: self._idle or self._connections < self.size, self.timeout):
+                    self.stats['timeouts'] += 1
+                    raise MycroftMetricsStorageError(
+                        'Storage error occured: no free connection in %s' % repr(self))
+
+                self.stats['wait_time'] += time.time() - started
+
+            self.stats['checkouts'] += 1
+
+            if self._idle:
+                # take the most recently used connection, idle ones will be checked less often
+                connection, idle_since = self._idle.pop()
+            else:
+                connection, idle_since = None, None
+                self._connections += 1
+
+        try:
+            if connection is None:
+                return self.connect()
+
+            if time.time() - idle_since >= self.health_check_interval:
+                return self._check_connection(connection)
+
+            return connection
+
+        except Exception:
+            self._discard()
+            raise
+
+    def _check_connection(self, connection):
+        """
+        Returns a given connection or a new one when it's not usable any more
+
+        :type connection object
+        :rtype: object
+        """
+        # stats are updated by concurrent threads, the connection is checked outside the lock
+        with self._condition:
+            self.stats['health_checks'] += 1
+
+        try:
+            self.check(connection)
+            return connection
+        except Exception as ex:  # pylint: disable=broad-except
+            self.logger.warning('Reconnecting (%s): %s', self, ex)
+
+            with self._condition:
+                self.stats['reconnects'] += 1
+
+        self._close(connection)
+        return self.connect()
+
+    def release(self, connection, discard=False):
+        """
+        Returns a connection to the pool, broken ones should be discarded
+
+        :type connection object
+        :type discard bool
+        """
+        if discard:
+            self._close(connection)
+            self._discard()
+            return
+
+        with self._condition:
+            self._idle.append((connection, time.time()))
+            self._condition.notify()
+
+    def _discard(self):
+        """
+        Frees the slot of a connection that has been closed
+        """
+        with self._condition:
+            self._connections -= 1
+            self._condition.notify()
+
+    def _close(self, connection):
+        """
+        :type connection object
+        """
+        try:
+            connection.close()
+        except Exception as ex:  # pylint: disable=broad-except
+            self.logger.warning('Closing connection failed: %s', ex)
+
+    def get_stats(self):
+        """
+        Returns the pool metrics
+
+        :rtype: dict
+        """
+        with self._condition:
+            stats = dict(self.stats)
+            stats.update({
+                'size': self.size,
+                'connections': self._connections,
+                'idle': len(self._idle),
+                'in_use': self._connections - len(self._idle),
+            })
+
+        return stats
@@ -0,0 +1,106 @@
+"""
+Append-only local spool of metrics that could not be stored in the database
+"""
+import json
+import logging
+import os
+
+from collections import OrderedDict
+
+
+class MetricsSpool:
+    """
+    Keeps (feature, metric, value, timestamp) rows in a local file (one JSON record per line)
+    when the database can not be reached. Spooled rows are bulk-loaded on the next
+    collection run (or by replay_spool script).
+
+    ```yaml
+    storage:
+      engine: mysql
+      # ...
+      spool_path: /var/lib/mike/metrics.spool
+    ```
+    """
+    def __init__(self, path):
+        """
+        :type path str
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path = path
+
+    def __repr__(self):
+        """
+        :rtype: str
+        """
+        return '<{} {}>'.format(self.__class__.__name__, self.path)
+
+    def __len__(self):
+        """
+        :rtype: int
+        """
+        return sum(len(rows) for rows in self.read().values())
+
+    def is_empty(self):
+        """
+        :rtype: bool
+        """
+        return not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+
+    def append(self, rows):
+        """
+        Appends (feature, metric, value, timestamp) rows to the spool file
+
+        :type rows list[tuple]
+        """
+        directory = os.path.dirname(self.path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            for (feature_id, metric, value, timestamp) in rows:
+                handle.write(json.dumps({
+                    'feature': feature_id,
+                    'metric': metric,
+                    'value': float(value),
+                    'timestamp': str(timestamp),
+                }) + '\n')
+
+            # the spool is used when things go wrong, make sure rows are on the disk
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        self.logger.info('Spooled %d rows in %s', len(rows), self)
+
+    def read(self):
+        """
+        Returns timestamp -> list of (feature, metric, value, timestamp) rows dictionary
+        (ordered as the runs were spooled)
+
+        :rtype: OrderedDict
+        """
+        runs = OrderedDict()
+
+        if self.is_empty():
+            return runs
+
+        with open(self.path, encoding='utf-8') as handle:
+            for (line_no, line) in enumerate(handle, start=1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # e.g. the process was killed while writing the last record
+                    self.logger.warning('Skipping broken record #%d in %s', line_no, self)
+                    continue
+
+                runs.setdefault(record['timestamp'], []).append((
+                    record['feature'], record['metric'], record['value'], record['timestamp']))
+
+        return runs
+
+    def clear(self):
+        """
+        Removes the spool file
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
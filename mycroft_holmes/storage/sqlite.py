@@ -0,0 +1,498 @@
+"""
+SQLite metrics storage engine
+"""
+import sqlite3
+
+from mycroft_holmes.errors import MycroftMetricsStorageError
+from .base import MetricsStorage
+
+
+class SqliteMetricsStorage(MetricsStorage):
+    """
+    SQLite storage, for small deployments and local benchmarks that do not need a MySQL server.
+
+    The database file is created with all the tables when it's not there yet.
+    It uses write-ahead log, so the dashboard can read metrics while collect_metrics writes them.
+
+    ```yaml
+    storage:
+      engine: sqlite
+      path: /var/lib/mike/metrics.sqlite
+    ```
+    """
+    ENGINE = 'sqlite'
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS features_metrics (
+          entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+          feature TEXT NOT NULL,
+          metric TEXT NOT NULL,
+          value REAL NOT NULL,
+          timestamp TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS feature_metric_timestamp_idx
+          ON features_metrics (feature, metric, timestamp);
+
+        CREATE TABLE IF NOT EXISTS features_metrics_latest (
+          feature TEXT NOT NULL,
+          metric TEXT NOT NULL,
+          value REAL NOT NULL,
+          timestamp TEXT NOT NULL,
+          PRIMARY KEY (feature, metric)
+        );
+
+        CREATE TABLE IF NOT EXISTS features_metrics_daily (
+          feature TEXT NOT NULL,
+          metric TEXT NOT NULL,
+          date TEXT NOT NULL,
+          min_value REAL NOT NULL,
+          max_value REAL NOT NULL,
+          last_value REAL NOT NULL,
+          last_timestamp TEXT NOT NULL,
+          sum_value REAL NOT NULL,
+          samples INTEGER NOT NULL,
+          PRIMARY KEY (feature, metric, date)
+        );
+    '''
+
+    # the last value of each day (or month) is taken from the most recent row
+    LAST_RAW_VALUE = '(SELECT value FROM features_metrics AS last ' \
+        'WHERE last.feature = raw.feature AND last.metric = raw.metric ' \
+        "AND last.timestamp >= date(raw.timestamp) " \
+        "AND last.timestamp < date(raw.timestamp, '+1 day') " \
+        'ORDER BY last.timestamp DESC, last.entry_id DESC LIMIT 1)'
+
+    LAST_DAILY_VALUE = '(SELECT last_value FROM features_metrics_daily AS last ' \
+        'WHERE last.feature = daily.feature AND last.metric = daily.metric ' \
+        "AND date(last.date, 'start of month') = date(daily.date, 'start of month') " \
+        'ORDER BY last.last_timestamp DESC, last.date DESC LIMIT 1)'
+
+    REPLACE_DAILY = 'ON CONFLICT (feature, metric, date) DO UPDATE SET ' \
+        'min_value = excluded.min_value, max_value = excluded.max_value, ' \
+        'last_value = excluded.last_value, last_timestamp = excluded.last_timestamp, ' \
+        'sum_value = excluded.sum_value, samples = excluded.samples'
+
+    def __init__(self, config, use_slave=True):
+        """
+        :type config mycroft_holmes.config.Config
+        :type use_slave bool
+        """
+        super().__init__(config, use_slave)
+
+        assert self.config.get('path'), '"path" needs to be specified in "storage" config section'
+        assert not self.compact_schema, 'Compact schema is not supported by "sqlite" engine'
+
+    @property
+    def storage(self):
+        """
+        Lazy-connect to SQLite database file and set up the schema
+
+        :rtype: sqlite3.Connection
+        """
+        if self._storage is None:
+            self.logger.info('Using SQLite database at "%s"...', self.config['path'])
+
+            self._storage = sqlite3.connect(self.config['path'], timeout=30)
+
+            # readers do not block the writer (and vice versa)
+            # https://www.sqlite.org/wal.html
+            self._storage.execute('PRAGMA journal_mode=WAL')
+            self._storage.execute('PRAGMA synchronous=NORMAL')
+
+            self._storage.executescript(self.SCHEMA)
+
+        return self._storage
+
+    def close(self):
+        """
+        Closes the SQLite database file (the next query opens it again)
+        """
+        connection, self._storage = self._storage, None
+
+        if connection is not None:
+            connection.close()
+
+    def get(self, feature_id, feature_metric):
+        """
+        :type feature_id str
+        :type feature_metric str
+        :raise: MycroftMetricsStorageError
+        :rtype: int|float|None
+        """
+        self.logger.info('Reading metric for "%s": %s', feature_id, feature_metric)
+
+        try:
+            row = self.storage.execute(
+                'SELECT /* mycroft_holmes */ value FROM features_metrics_latest '
+                'WHERE feature = ? and metric = ?',
+                (feature_id, feature_metric)
+            ).fetchone()
+
+            return self.cast_value(row[0]) if row else None
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def get_many(self, pairs):
+        """
+        :type pairs list[tuple[str, str]]
+        :raise: MycroftMetricsStorageError
+        :rtype: dict
+        """
+        pairs = list(pairs)
+
+        if not pairs:
+            return dict()
+
+        self.logger.info('Reading %d metrics', len(pairs))
+
+        return self._get_latest_values(
+            'WHERE (feature, metric) IN (VALUES {})'.format(', '.join(['(?, ?)'] * len(pairs))),
+            [param for pair in pairs for param in pair]
+        )
+
+    def get_all_latest(self):
+        """
+        :raise: MycroftMetricsStorageError
+        :rtype: dict
+        """
+        self.logger.info('Reading all metrics')
+
+        return self._get_latest_values()
+
+    def _get_latest_values(self, where='', params=None):
+        """
+        Returns (feature ID, metric) -> value dictionary
+
+        :type where str
+        :type params list|None
+        :rtype: dict
+        """
+        try:
+            cursor = self.storage.execute(
+                'SELECT /* mycroft_holmes */ feature, metric, value '
+                'FROM features_metrics_latest {}'.format(where).strip(),
+                params or []
+            )
+
+            return {
+                (feature_id, metric): self.cast_value(value)
+                for (feature_id, metric, value) in cursor
+            }
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def get_current_timestamp(self):
+        """
+        :raise: MycroftMetricsStorageError
+        :rtype: str
+        """
+        try:
+            return self.storage.execute(
+                "SELECT /* mycroft_holmes */ datetime('now', 'localtime')").fetchone()[0]
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def is_stored(self, feature_id, metric, timestamp):
+        """
+        :type feature_id str
+        :type metric str
+        :type timestamp str
+        :raise: MycroftMetricsStorageError
+        :rtype: bool
+        """
+        try:
+            return self.storage.execute(
+                'SELECT /* mycroft_holmes */ 1 FROM features_metrics '
+                'WHERE feature = ? AND metric = ? AND timestamp = ? LIMIT 1',
+                (feature_id, metric, str(timestamp))
+            ).fetchone() is not None
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def write_rows(self, rows):
+        """
+        Stores (feature, metric, value, timestamp) rows in a single transaction
+
+        :type rows list[tuple]
+        :raise: MycroftMetricsStorageError
+        """
+        try:
+            # keep the same precision as MySQL storage does, i.e. DECIMAL(20, 2)
+            rows = [
+                (feature_id, metric, round(value, 2), str(timestamp))
+                for (feature_id, metric, value, timestamp) in rows
+            ]
+
+            self.logger.info('Storing %d rows', len(rows))
+
+            with self.storage:
+                self.storage.executemany(
+                    'INSERT INTO features_metrics (feature, metric, value, timestamp) '
+                    'VALUES (?, ?, ?, ?)',
+                    rows
+                )
+
+                # keep the latest value of each metric (older values do not overwrite newer ones)
+                self.storage.executemany(
+                    'INSERT INTO features_metrics_latest (feature, metric, value, timestamp) '
+                    'VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (feature, metric) DO UPDATE SET '
+                    'value = CASE WHEN excluded.timestamp >= timestamp '
+                    'THEN excluded.value ELSE value END, '
+                    'timestamp = MAX(timestamp, excluded.timestamp)',
+                    rows
+                )
+
+                # update per-day aggregates of each metric (see get_feature_metrics_history)
+                self.storage.executemany(
+                    'INSERT INTO features_metrics_daily (feature, metric, date, min_value, '
+                    'max_value, last_value, last_timestamp, sum_value, samples) '
+                    'VALUES (?, ?, date(?), ?, ?, ?, ?, ?, 1) '
+                    'ON CONFLICT (feature, metric, date) DO UPDATE SET '
+                    'min_value = MIN(min_value, excluded.min_value), '
+                    'max_value = MAX(max_value, excluded.max_value), '
+                    'last_value = CASE WHEN excluded.last_timestamp >= last_timestamp '
+                    'THEN excluded.last_value ELSE last_value END, '
+                    'last_timestamp = MAX(last_timestamp, excluded.last_timestamp), '
+                    'sum_value = sum_value + excluded.sum_value, '
+                    'samples = samples + excluded.samples',
+                    [
+                        (feature_id, metric, timestamp, value, value, value, timestamp, value)
+                        for (feature_id, metric, value, timestamp) in rows
+                    ]
+                )
+
+            self.store_history(rows)
+            self.logger.info('Data has been stored')
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def get_the_latest_timestamp(self):
+        """
+        Get the timestamp of the latest entry in metrics storage
+
+        :rtype: str|None
+        """
+        try:
+            value = self.storage.execute(
+                "SELECT /* mycroft_holmes */ MAX(timestamp) FROM features_metrics_latest"
+            ).fetchone()[0]
+
+            return str(value) if value else None
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            return None
+
+    def get_daily_metrics_history(self, feature__id, aggregate='max'):
+        """
+        Yields the historical values of all metrics for a given feature (one per day).
+
+        Past days are read from features_metrics_daily rollup table,
+        raw rows are aggregated only for the current day.
+
+        :type feature__id str
+        :type aggregate str one of min, max, last, avg
+        :rtype: list[dict]
+        """
+        cursor = self.storage.execute(
+            "SELECT /* mycroft_holmes */ date, metric, "
+            "min_value, max_value, last_value, sum_value / samples "
+            "FROM features_metrics_daily "
+            "WHERE feature = :feature AND date < date('now', 'localtime') "
+            "UNION ALL "
+            "SELECT date(timestamp) AS date, metric, MIN(value), MAX(value), "
+            "{last_value}, AVG(value) "
+            "FROM features_metrics AS raw "
+            "WHERE feature = :feature AND timestamp >= date('now', 'localtime') "
+            "GROUP BY date, metric "
+            "ORDER BY date, metric".format(last_value=self.LAST_RAW_VALUE),
+            {
+                'feature': feature__id
+            }
+        )
+
+        column = 2 + self.HISTORY_AGGREGATES.index(aggregate)
+
+        for row in iter(cursor):
+            yield {
+                'date': str(row[0]),
+                'metric': row[1],
+                'value': float(row[column]),
+            }
+
+    def get_raw_rows(self):
+        """
+        Yields all raw (feature, metric, value, timestamp) rows ordered by their entry ID
+
+        :raise: MycroftMetricsStorageError
+        :rtype: list[tuple]
+        """
+        try:
+            cursor = self.storage.execute(
+                'SELECT /* mycroft_holmes */ feature, metric, value, timestamp '
+                'FROM features_metrics ORDER BY entry_id'
+            )
+
+            for row in cursor:
+                yield tuple(row)
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def backfill_daily_metrics(self):
+        """
+        (Re)builds features_metrics_daily rollup table from the raw rows, one feature at a time.
+        It's safe to run it more than once - aggregates are replaced, not added up.
+
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        try:
+            features = [
+                row[0] for row in self.storage.execute(
+                    'SELECT /* mycroft_holmes */ DISTINCT feature FROM features_metrics')
+            ]
+
+            self.logger.info('Backfilling daily metrics for %d features', len(features))
+
+            for feature_id in features:
+                with self.storage:
+                    self.storage.execute(
+                        'INSERT INTO features_metrics_daily (feature, metric, date, min_value, '
+                        'max_value, last_value, last_timestamp, sum_value, samples) '
+                        'SELECT feature, metric, date(timestamp) AS date, MIN(value), MAX(value), '
+                        '{last_value}, MAX(timestamp), SUM(value), COUNT(*) '
+                        'FROM features_metrics AS raw WHERE feature = ? '
+                        'GROUP BY feature, metric, date {replace}'.format(
+                            last_value=self.LAST_RAW_VALUE, replace=self.REPLACE_DAILY),
+                        (feature_id,)
+                    )
+
+                self.logger.info('Daily metrics for "%s" stored', feature_id)
+
+            return len(features)
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def count_uncovered_days(self, before):
+        """
+        Returns the number of (feature, metric, day) groups of raw rows older than a given date
+        that have no features_metrics_daily row (neither per-day nor per-month one)
+
+        :type before datetime.date
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        try:
+            return self.storage.execute(
+                'SELECT /* mycroft_holmes */ COUNT(*) FROM ('
+                'SELECT DISTINCT feature, metric, date(timestamp) AS date FROM features_metrics '
+                'WHERE timestamp < ?) AS raw WHERE NOT EXISTS ('
+                'SELECT 1 FROM features_metrics_daily AS daily '
+                'WHERE daily.feature = raw.feature AND daily.metric = raw.metric AND daily.date IN '
+                "(raw.date, date(raw.date, 'start of month')))",
+                (str(before),)
+            ).fetchone()[0]
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def remove_raw_metrics(self, before, batch_size):
+        """
+        Removes raw rows older than a given date, batch_size rows at a time.
+        Their values are kept in features_metrics_daily table.
+
+        :type before datetime.date
+        :type batch_size int
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        self.logger.info('Removing raw rows older than %s', before)
+
+        removed = 0
+
+        try:
+            while True:
+                with self.storage:
+                    batch_removed = self.storage.execute(
+                        'DELETE FROM features_metrics WHERE entry_id IN ('
+                        'SELECT entry_id FROM features_metrics WHERE timestamp < ? '
+                        'ORDER BY entry_id LIMIT ?)',
+                        (str(before), batch_size)
+                    ).rowcount
+
+                removed += batch_removed
+                self.logger.info('Removed %d raw rows (%d so far)', batch_removed, removed)
+
+                if batch_removed < batch_size:
+                    return removed
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
+
+    def downsample_daily_metrics(self, before):
+        """
+        Merges features_metrics_daily rows older than a given date into per-month rows
+        (stored with the first day of the month), one feature at a time.
+
+        :type before datetime.date the first day of a month
+        :raise: MycroftMetricsStorageError
+        :rtype: int
+        """
+        self.logger.info('Downsampling daily rows older than %s', before)
+
+        try:
+            features = [
+                row[0] for row in self.storage.execute(
+                    'SELECT /* mycroft_holmes */ DISTINCT feature FROM features_metrics_daily '
+                    "WHERE date < ? AND strftime('%d', date) != '01'",
+                    (str(before),)
+                )
+            ]
+
+            for feature_id in features:
+                with self.storage:
+                    # aggregates of the first day of the month are replaced
+                    # by ones for the whole month
+                    self.storage.execute(
+                        'INSERT INTO features_metrics_daily (feature, metric, date, min_value, '
+                        'max_value, last_value, last_timestamp, sum_value, samples) '
+                        "SELECT feature, metric, date(date, 'start of month') AS month, "
+                        'MIN(min_value), MAX(max_value), {last_value}, '
+                        'MAX(last_timestamp), SUM(sum_value), SUM(samples) '
+                        'FROM features_metrics_daily AS daily WHERE feature = ? AND date < ? '
+                        'GROUP BY feature, metric, month {replace}'.format(
+                            last_value=self.LAST_DAILY_VALUE, replace=self.REPLACE_DAILY),
+                        (feature_id, str(before))
+                    )
+
+                    self.storage.execute(
+                        'DELETE FROM features_metrics_daily '
+                        "WHERE feature = ? AND date < ? AND strftime('%d', date) != '01'",
+                        (feature_id, str(before))
+                    )
+
+                self.logger.info('Daily metrics for "%s" downsampled', feature_id)
+
+            return len(features)
+
+        except sqlite3.Error as ex:
+            self.logger.error('Storage error occured: %s', ex)
+            raise MycroftMetricsStorageError('Storage error occured: %s' % repr(ex))
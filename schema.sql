@@ -13,3 +13,64 @@ CREATE TABLE `features_metrics` (
 -- https://dev.mysql.com/doc/refman/8.0/en/fixed-point-types.html
 -- 20 is the precision and 2 is the scale
 ALTER TABLE `features_metrics` CHANGE `value` `value` DECIMAL(20, 2) NOT NULL;
+
+-- The latest value of each metric (maintained by MetricsStorage.commit)
+CREATE TABLE `features_metrics_latest` (
+  `feature` varchar(32) NOT NULL,
+  `metric` varchar(32) NOT NULL,
+  `value` DECIMAL(20, 2) NOT NULL,
+  `timestamp` datetime NOT NULL,
+  PRIMARY KEY (`feature`, `metric`)
+) CHARSET=utf8;
+
+-- Backfill it from the existing history
+INSERT INTO `features_metrics_latest` (feature, metric, value, timestamp)
+  SELECT history.feature, history.metric, history.value, history.timestamp
+  FROM `features_metrics` AS history
+  JOIN (
+    SELECT feature, metric, MAX(timestamp) AS timestamp
+    FROM `features_metrics` GROUP BY feature, metric
+  ) AS latest USING (feature, metric, timestamp)
+ON DUPLICATE KEY UPDATE value = VALUES(value), timestamp = VALUES(timestamp);
+
+-- Per-day aggregates of each metric (maintained by MetricsStorage.commit)
+-- Run backfill_daily_metrics to build it from the existing history
+CREATE TABLE `features_metrics_daily` (
+  `feature` varchar(32) NOT NULL,
+  `metric` varchar(32) NOT NULL,
+  `date` date NOT NULL,
+  `min_value` DECIMAL(20, 2) NOT NULL,
+  `max_value` DECIMAL(20, 2) NOT NULL,
+  `last_value` DECIMAL(20, 2) NOT NULL,
+  `last_timestamp` datetime NOT NULL,
+  `sum_value` DECIMAL(30, 2) NOT NULL,
+  `samples` int(9) NOT NULL,
+  PRIMARY KEY (`feature`, `metric`, `date`)
+) CHARSET=utf8;
+
+-- Compact schema (set "compact_schema: true" in the storage config section to use it)
+-- Features and metrics names are stored once and raw rows refer to them by IDs
+-- Run migrate_compact_schema to copy the existing history
+CREATE TABLE `features` (
+  `feature_id` smallint(5) unsigned NOT NULL AUTO_INCREMENT,
+  `feature` varchar(32) NOT NULL,
+  PRIMARY KEY (`feature_id`),
+  UNIQUE KEY `feature_idx` (`feature`)
+) CHARSET=utf8;
+
+CREATE TABLE `metrics` (
+  `metric_id` smallint(5) unsigned NOT NULL AUTO_INCREMENT,
+  `metric` varchar(32) NOT NULL,
+  PRIMARY KEY (`metric_id`),
+  UNIQUE KEY `metric_idx` (`metric`)
+) CHARSET=utf8;
+
+CREATE TABLE `features_metrics_compact` (
+  `entry_id` int(9) NOT NULL AUTO_INCREMENT,
+  `feature_id` smallint(5) unsigned NOT NULL,
+  `metric_id` smallint(5) unsigned NOT NULL,
+  `value` DECIMAL(20, 2) NOT NULL,
+  `timestamp` datetime NOT NULL,
+  PRIMARY KEY (`entry_id`),
+  KEY `feature_metric_timestamp_idx` (`feature_id`,`metric_id`,`timestamp`)
+) CHARSET=utf8;
@@ -18,9 +18,15 @@ setup(
             'coverage==4.5.2',
             'pylint>=1.9.2, <=2.3.0',  # 2.x branch is for Python 3
             'pytest==4.1.0',
-        ]
+            'numpy>=1.16.0, <2.0.0',
+        ],
+        # memory-mapped history store (see "history_path" in storage config section)
+        'history': [
+            'numpy>=1.16.0, <2.0.0',  # elasticsearch client does not support numpy 2.x
+        ],
     },
     install_requires=[
+        'aiohttp==3.5.4',
         'elasticsearch-query==2.4.0',
         'google-api-python-client==1.7.7',
         'mysql-connector-python==8.0.13',
@@ -39,6 +45,11 @@ setup(
     entry_points={
         'console_scripts': [
             'collect_metrics=mycroft_holmes.bin.collect_metrics:main',
+            'backfill_daily_metrics=mycroft_holmes.bin.backfill_daily_metrics:main',
+            'compact_metrics=mycroft_holmes.bin.compact_metrics:main',
+            'migrate_compact_schema=mycroft_holmes.bin.migrate_compact_schema:main',
+            'rebuild_history_store=mycroft_holmes.bin.rebuild_history_store:main',
+            'replay_spool=mycroft_holmes.bin.replay_spool:main',
             'generate_source_docs=mycroft_holmes.bin.generate_source_docs:main',
         ],
     }
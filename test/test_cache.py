@@ -0,0 +1,79 @@
+"""
+Set of unit test for PersistentCache class
+"""
+import time
+
+from pytest import raises
+
+from mycroft_holmes.cache import PersistentCache, get_cache
+from mycroft_holmes.config import Config
+from mycroft_holmes.errors import MycroftHolmesError
+
+
+class ConfigWithCache(Config):
+    # pylint: disable=super-init-not-called
+    def __init__(self, cache_config):
+        self.data = {'cache': cache_config}
+
+
+def test_get_and_set(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='test')
+
+    assert cache.get('foo') is None
+
+    cache.set('foo', {'etag': '"123"', 'values': {'//p': 42.5}})
+    assert cache.get('foo') == {'etag': '"123"', 'values': {'//p': 42.5}}
+
+    # namespaces are separated
+    other = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='other')
+    assert other.get('foo') is None
+
+
+def test_ttl(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='test', ttl=60)
+    cache.set('foo', 1)
+    assert cache.get('foo') == 1
+
+    # make the entry an hour old
+    cache.connection.execute('UPDATE cache SET updated_at = ?', (time.time() - 3600,))
+    assert cache.get('foo') is None, 'Expired entry should not be returned'
+
+
+def test_size_limit(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='test', max_size=10)
+
+    cache.set('foo', 'abc')  # '"abc"' - 5 bytes
+    cache.set('bar', 'def')
+    cache.set('test', 'ghi')  # the least recently updated entry needs to be removed
+
+    assert cache.get('foo') is None
+    assert cache.get('bar') == 'def'
+    assert cache.get('test') == 'ghi'
+
+
+def test_stats(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='test')
+    assert cache.get_stats() == {'hits': 0, 'misses': 0}
+
+    cache.record(hit=True, seconds_saved=2.5)
+    cache.record(hit=True, seconds_saved=1)
+    cache.record(hit=False)
+
+    assert cache.get_stats() == {'hits': 2, 'misses': 1, 'seconds_saved': 3.5}
+
+
+def test_get_cache(tmpdir):
+    assert get_cache(ConfigWithCache(None), 'http') is None, 'Cache is not configured'
+    assert get_cache(ConfigWithCache({'path': '/tmp/foo'}), 'http') is None, 'Not enabled for http'
+
+    with raises(MycroftHolmesError):
+        get_cache(ConfigWithCache({'test_no_path': {}}), 'test_no_path')
+
+    cache = get_cache(ConfigWithCache({
+        'path': str(tmpdir.join('cache.sqlite')),
+        'test_namespace': {'ttl': 3600, 'max_size': 1024}
+    }), 'test_namespace')
+
+    assert isinstance(cache, PersistentCache)
+    assert cache.ttl == 3600
+    assert cache.max_size == 1024
@@ -1,9 +1,13 @@
 """
 Set of unit test for collect_metrics script
 """
+import asyncio
 
 from mycroft_holmes.bin.collect_metrics import get_metrics_for_feature
+from mycroft_holmes.collector import MetricsCollector
 from mycroft_holmes.config import Config
+from mycroft_holmes.errors import MycroftSourceError
+from mycroft_holmes.sources import JiraSource
 
 from . import get_fixtures_directory
 
@@ -19,3 +23,137 @@ def test_calculate_metrics_and_score():
     assert metrics['score'] == 108
     assert metrics['usage/foo'] == 1
     assert metrics['usage/bar'] == 1
+
+
+def test_collect_metrics_using_workers():
+    config = Config(config_file=get_fixtures_directory() + '/const.yaml')
+
+    values = MetricsCollector(config=config, workers=4).fetch_values()
+
+    assert values == {
+        ('Foo Bar', 'usage/foo'): 1,
+        ('Foo Bar', 'usage/bar'): 1,
+    }
+
+    # the score is calculated exactly the same way
+    metrics = get_metrics_for_feature('Foo Bar', config, values=values)
+
+    assert metrics == get_metrics_for_feature('Foo Bar', config)
+    assert metrics['score'] == 108
+
+
+def test_collect_metrics_async():
+    config = Config(config_file=get_fixtures_directory() + '/const.yaml')
+
+    loop = asyncio.new_event_loop()
+    values = loop.run_until_complete(MetricsCollector(config=config).fetch_values_async())
+    loop.close()
+
+    assert values == {
+        ('Foo Bar', 'usage/foo'): 1,
+        ('Foo Bar', 'usage/bar'): 1,
+    }
+
+    assert get_metrics_for_feature('Foo Bar', config, values=values)['score'] == 108
+
+
+def test_failed_fetches_are_skipped():
+    config = Config(config_file=get_fixtures_directory() + '/const.yaml')
+
+    values = {
+        ('Foo Bar', 'usage/foo'): MycroftSourceError('Mocked exception thrown'),
+        ('Foo Bar', 'usage/bar'): 1,
+    }
+
+    metrics = get_metrics_for_feature('Foo Bar', config, values=values)
+
+    assert len(metrics) == 2
+    assert 'usage/foo' not in metrics
+    assert metrics['score'] == 66
+
+    # missing values are treated as failed fetches
+    metrics = get_metrics_for_feature('Foo Bar', config, values={('Foo Bar', 'usage/bar'): 1})
+
+    assert 'usage/foo' not in metrics
+    assert metrics['score'] == 66
+
+
+class JiraMockedClient:
+    """
+    Mocked Jira client class that keeps track of JQL queries it was asked to run
+    """
+    def __init__(self):
+        self.queries = []
+
+    def _get_json(self, path, params):
+        jql = params['jql']
+        self.queries.append(jql)
+        return {'total': 2 if "'FOO'" in jql else 1}
+
+
+def test_requests_coalescing():
+    config = Config(config_file=get_fixtures_directory() + '/coalescing.yaml')
+    collector = MetricsCollector(config=config, workers=2)
+
+    requests = collector.get_requests()
+    print(requests)
+
+    # "Foo" and "Bar" features resolve to the same JQL for jira/bugs
+    assert len(requests) == 3
+
+    source = list(requests.keys())[0][0]
+    assert isinstance(source, JiraSource)
+    assert list(requests.keys())[0][1] == ("project = 'FOO' AND type = 'Bug'",)
+
+    source._client = JiraMockedClient()
+    values = collector.fetch_values()
+
+    assert sorted(source.client.queries) == [
+        "project = 'BAZ' AND type = 'Bug'",
+        "project = 'FOO' AND type = 'Bug'",
+        "project = 'FOO' AND type = 'Task'",
+    ], 'Each distinct query is run only once'
+
+    assert values == {
+        ('Foo', 'jira/bugs'): 2,
+        ('Foo', 'jira/tasks'): 2,
+        ('Bar', 'jira/bugs'): 2,
+        ('Baz', 'jira/bugs'): 1,
+    }
+
+
+def test_requests_batching():
+    config = Config(config_file=get_fixtures_directory() + '/coalescing.yaml')
+    collector = MetricsCollector(config=config)
+
+    requests = collector.get_requests()
+    batches = collector.get_batches(requests)
+    print(batches)
+
+    # all three Jira requests are run in a single batch
+    assert len(batches) == 1
+    assert isinstance(batches[0][0], JiraSource)
+    assert batches[0][1] == list(requests.keys())
+
+    source = batches[0][0]
+    source.BATCH_SIZE = 2
+
+    try:
+        assert [len(request_keys) for _, request_keys in collector.get_batches(requests)] == [2, 1]
+    finally:
+        del source.BATCH_SIZE
+
+
+def test_short_batch_results():
+    config = Config(config_file=get_fixtures_directory() + '/coalescing.yaml')
+    collector = MetricsCollector(config=config)
+
+    requests = collector.get_requests()
+    source = list(requests.keys())[0][0]
+
+    # the source returns fewer values than it was asked for
+    source.get_values = lambda specs: [1] * (len(specs) - 1)
+    values = collector.fetch_values()
+
+    assert len(values) == 4
+    assert all(isinstance(value, MycroftSourceError) for value in values.values())
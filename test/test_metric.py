@@ -4,10 +4,11 @@ Set of unit test for Metric class
 import pytest
 
 from mycroft_holmes.config import Config
-from mycroft_holmes.errors import MycroftSourceError, MycroftMetricError
+from mycroft_holmes.errors import MycroftSourceError, MycroftMetricError, MycroftMetricsStorageError
 from mycroft_holmes.metric import Metric
 from mycroft_holmes.sources import JiraSource
 from mycroft_holmes.sources.base import SourceBase
+from mycroft_holmes.storage import MySqlMetricsStorage
 
 from . import get_fixtures_directory
 
@@ -187,3 +188,21 @@ def test_empty_metric_and_label():
     assert metric.get_formatted_value() is None
     assert metric.get_label_with_value() is None
     assert metric.get_more_link() is None
+
+
+def test_value_storage_is_closed(monkeypatch):
+    config = get_config()
+    closed = []
+
+    def failing_get(storage, **kwargs):
+        raise MycroftMetricsStorageError('Storage error occured: database is gone')
+
+    monkeypatch.setattr(MySqlMetricsStorage, 'get', failing_get)
+    monkeypatch.setattr(MySqlMetricsStorage, 'close', lambda storage: closed.append(storage))
+
+    metric = Metric(spec={'name': 'foo/var'}, feature_name='foo', config=config)
+
+    with pytest.raises(MycroftMetricsStorageError):
+        _ = metric.value
+
+    assert len(closed) == 1, 'The connection should be returned to the pool'
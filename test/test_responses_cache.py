@@ -0,0 +1,64 @@
+"""
+Set of unit test for ResponsesCache class
+"""
+from mycroft_holmes.sources.http.cache import ResponsesCache
+
+
+def test_lru_eviction():
+    cache = ResponsesCache(max_size=10)
+
+    cache.set('foo', 'foo value', size=4)
+    cache.set('bar', 'bar value', size=4)
+
+    assert cache.get('foo') == 'foo value'  # "foo" is now the most recently used
+    assert len(cache) == 2
+    assert cache.get_size() == 8
+
+    # "bar" needs to be evicted to fit the new entry
+    cache.set('test', 'test value', size=5)
+
+    assert cache.get('bar') is None
+    assert cache.get('foo') == 'foo value'
+    assert cache.get('test') == 'test value'
+    assert cache.get_size() == 9
+
+    # entries bigger than the cap are not stored at all
+    cache.set('big', 'big value', size=11)
+    assert cache.get('big') is None
+    assert len(cache) == 2
+
+
+def test_get_or_create():
+    cache = ResponsesCache(max_size=100)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return 'value', 5
+
+    assert cache.get_or_create('foo', factory) == 'value'
+    assert cache.get_or_create('foo', factory) == 'value'
+    assert len(calls) == 1, 'Factory should be called only once'
+
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.hits == 0
+
+
+def test_clear_owner():
+    cache = ResponsesCache(max_size=100)
+    foo, bar = object(), object()
+
+    cache.set((foo, 'response', 'http://foo'), 'foo value', size=4)
+    cache.set((bar, 'response', 'http://foo'), 'bar value', size=5)
+
+    # entries of other owners are kept
+    cache.clear(owner=foo)
+
+    assert cache.get((foo, 'response', 'http://foo')) is None
+    assert cache.get((bar, 'response', 'http://foo')) == 'bar value'
+    assert cache.get_size() == 5
@@ -1,6 +1,11 @@
 """
 Set of unit test for GoogleAnalyticsSource class
 """
+import threading
+
+import httplib2
+
+from googleapiclient.errors import HttpError
 from pytest import raises
 
 from mycroft_holmes.errors import MycroftSourceError
@@ -49,6 +54,91 @@ class MockedClient:
         raise Exception('reports() method should not be called')  # TODO
 
 
+class FailingMockedClient:
+    """
+    Mocked Google API client class that fails with HTTP 500 error
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def reports(self):
+        self.calls += 1
+        raise HttpError(httplib2.Response({'status': 500}), b'Backend error')
+
+
+class BatchMockedClient:
+    """
+    Mocked Google API client class that keeps track of batchGet calls.
+    Each metric value is the length of its expression.
+    """
+    def __init__(self):
+        self.bodies = []
+
+    def reports(self):
+        return self
+
+    def batchGet(self, body):
+        self.bodies.append(body)
+        self.last_body = body
+        return self
+
+    def execute(self):
+        reports = []
+
+        for report_request in self.last_body['reportRequests']:
+            # metrics with "empty" filters have no data
+            if report_request['filtersExpression'] == 'empty':
+                reports.append({'data': {}})
+                continue
+
+            values = [str(len(metric['expression'])) for metric in report_request['metrics']]
+            reports.append({
+                'data': {
+                    'rows': [{'metrics': [{'values': values}], 'dimensions': ['20181213']}]
+                }
+            })
+
+        return {'reports': reports}
+
+
+class InvalidMetricMockedClient(BatchMockedClient):
+    """
+    Mocked Google API client class that rejects batchGet calls asking for "ga:bad" metric
+    """
+    def execute(self):
+        for report_request in self.last_body['reportRequests']:
+            if {'expression': 'ga:bad'} in report_request['metrics']:
+                raise HttpError(httplib2.Response({'status': 400}), b'Unknown metric(s): ga:bad')
+
+        return super().execute()
+
+
+class DimensionMockedClient(BatchMockedClient):
+    """
+    Mocked Google API client class returning a report grouped by a dimension
+    in pages of two rows
+    """
+    ROWS = [('foo', '1'), ('bar', '22'), ('baz', '333')]
+
+    def execute(self):
+        report_request = self.last_body['reportRequests'][0]
+        offset = int(report_request.get('pageToken', 0))
+
+        report = {
+            'data': {
+                'rows': [
+                    {'metrics': [{'values': [value]}], 'dimensions': [dimension_value]}
+                    for dimension_value, value in self.ROWS[offset:offset + 2]
+                ]
+            }
+        }
+
+        if offset + 2 < len(self.ROWS):
+            report['nextPageToken'] = str(offset + 2)
+
+        return {'reports': [report]}
+
+
 def get_source_with_mocked_client(mocked_client, credentials='{}'):
     """
     :type mocked_client MockedClient|None
@@ -103,6 +193,133 @@ def test_mocked_source():
         {'dimension': 'ga:date', 'end_date': '1daysAgo', 'filters': 'bar:123', 'metric': 'foo', 'start_date': '1daysAgo'}
 
 
+def test_get_values():
+    source = get_source_with_mocked_client(BatchMockedClient())
+
+    # 12 metrics with the same filters, 6 metrics with 6 different filters
+    specs = [{'metric': 'ga:foo%s' % ('o' * index), 'filters': 'foo'} for index in range(12)] + \
+        [{'metric': 'ga:bar', 'filters': 'ga:category==bar%d' % index} for index in range(6)]
+
+    values = source.get_values(specs)
+
+    assert values == [float(len(spec['metric'])) for spec in specs]
+
+    # 8 report requests (10 + 2 metrics, 6 x 1 metric) sent in two batchGet calls
+    bodies = source.client.bodies
+    assert len(bodies) == 2
+    assert [len(report['metrics']) for report in bodies[0]['reportRequests']] == [10, 2, 1, 1, 1]
+    assert [len(report['metrics']) for report in bodies[1]['reportRequests']] == [1, 1, 1]
+
+    report_request = bodies[0]['reportRequests'][0]
+    assert report_request['viewId'] == '123'
+    assert report_request['filtersExpression'] == 'foo'
+    assert report_request['dateRanges'] == [{'startDate': '1daysAgo', 'endDate': '1daysAgo'}]
+    assert report_request['dimensions'] == [{'name': 'ga:date'}]
+
+
+def test_get_values_errors():
+    source = get_source_with_mocked_client(BatchMockedClient())
+
+    values = source.get_values([
+        {'metric': 'ga:foo', 'filters': 'empty'},
+        {'metric': 'ga:bar', 'filters': 'bar'},
+    ])
+
+    assert isinstance(values[0], MycroftSourceError), 'Report with no data'
+    assert values[1] == 6
+
+    # the entire call fails
+    source = get_source_with_mocked_client(FailingMockedClient())
+    values = source.get_values([{'metric': 'ga:foo'}, {'metric': 'ga:bar'}])
+
+    assert len(values) == 2
+    assert isinstance(values[0], MycroftSourceError)
+    assert isinstance(values[1], MycroftSourceError)
+    assert source.client.calls == 1, 'Server errors are not retried'
+
+
+def test_get_values_invalid_metric():
+    source = get_source_with_mocked_client(InvalidMetricMockedClient())
+
+    # 3 report requests with 12 metrics in a single batchGet call
+    specs = [{'metric': 'ga:foo%s' % ('o' * index), 'filters': 'foo'} for index in range(11)] + \
+        [{'metric': 'ga:bad', 'filters': 'bar'}]
+    specs[3] = {'metric': 'ga:bad', 'filters': 'foo'}
+
+    values = source.get_values(specs)
+
+    # only the invalid metric fails
+    assert isinstance(values[3], MycroftSourceError)
+    assert isinstance(values[11], MycroftSourceError)
+
+    assert [value for index, value in enumerate(values) if index not in (3, 11)] == \
+        [float(len(spec['metric'])) for index, spec in enumerate(specs) if index not in (3, 11)]
+
+    # the batch, each of 3 report requests and then each of 10 metrics of the invalid one
+    assert len(source.client.bodies) == 1 + 3 + 10
+
+
+def test_split_filters():
+    assert GoogleAnalyticsSource.split_filters('ga:eventCategory==foo', 'ga:eventCategory') == \
+        ('foo', '')
+    assert GoogleAnalyticsSource.split_filters(
+        'ga:country==PL;ga:eventCategory==foo_bar', 'ga:eventCategory') == ('foo_bar', 'ga:country==PL')
+
+    with raises(AssertionError):
+        GoogleAnalyticsSource.split_filters('ga:country==PL', 'ga:eventCategory')
+
+    with raises(AssertionError):
+        GoogleAnalyticsSource.split_filters('ga:eventCategory==foo,ga:country==PL', 'ga:eventCategory')
+
+
+def test_dimension_fan_out():
+    source = get_source_with_mocked_client(DimensionMockedClient())
+    spec = {'metric': 'ga:totalEvents', 'filters': '{ga_filter}', 'dimension': 'ga:eventCategory'}
+
+    assert source.get_value(template={'ga_filter': 'ga:eventCategory==foo'}, **spec) == 1
+    assert source.get_value(template={'ga_filter': 'ga:eventCategory==baz'}, **spec) == 333
+
+    with raises(MycroftSourceError):
+        source.get_value(template={'ga_filter': 'ga:eventCategory==not_there'}, **spec)
+
+    assert source.get_values([
+        dict(template={'ga_filter': 'ga:eventCategory==bar'}, **spec),
+        dict(template={'ga_filter': 'ga:eventCategory==foo'}, **spec),
+    ]) == [22, 1]
+
+    # a single report fetched in two pages
+    bodies = source.client.bodies
+    assert len(bodies) == 2
+
+    report_request = bodies[0]['reportRequests'][0]
+    assert report_request['dimensions'] == [{'name': 'ga:eventCategory'}]
+    assert report_request['filtersExpression'] == ''
+    assert report_request['pageSize'] == GoogleAnalyticsSource.PAGE_SIZE
+    assert 'pageToken' not in report_request
+    assert bodies[1]['reportRequests'][0]['pageToken'] == '2'
+
+    # reports are dropped at the end of the run
+    source.close()
+    source.get_value(template={'ga_filter': 'ga:eventCategory==foo'}, **spec)
+    assert len(source.client.bodies) == 4
+
+
+def test_dimension_fan_out_errors():
+    source = get_source_with_mocked_client(FailingMockedClient())
+    spec = {'metric': 'ga:totalEvents', 'dimension': 'ga:eventCategory'}
+
+    values = source.get_values([
+        dict(filters='ga:eventCategory==foo', **spec),
+        dict(filters='ga:eventCategory==bar', **spec),
+    ])
+
+    assert isinstance(values[0], MycroftSourceError)
+    assert isinstance(values[1], MycroftSourceError)
+
+    # the failed report is not asked for again
+    assert source.client.calls == 1
+
+
 def test_client_exception_handling():
     source = get_source_with_mocked_client(MockedClient())
 
@@ -127,3 +344,24 @@ def test_client_credentials_validation():
         _ = source.client
 
     assert str(exc_info).endswith("Failed to load Google's service account JSON file")
+
+
+def test_client_per_thread(monkeypatch):
+    monkeypatch.setattr('mycroft_holmes.sources.analytics.Credentials.from_service_account_info',
+                        lambda info: info)
+    monkeypatch.setattr('mycroft_holmes.sources.analytics.build',
+                        lambda *args, **kwargs: MockedClient())
+
+    source = get_source_with_mocked_client(
+        mocked_client=None, credentials='{"client_email": "foo@example.com"}')
+
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(source.client)) for _ in range(2)]
+
+    for thread in threads:
+        thread.start()
+        thread.join()
+
+    assert source.client is source.client, 'A thread keeps its client'
+    assert len({id(client) for client in clients + [source.client]}) == 3, \
+        'httplib2 is not thread-safe, each thread needs its own client'
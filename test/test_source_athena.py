@@ -1,15 +1,112 @@
 """
 Set of unit test for MysqlSource class
 """
+import time
+
+from botocore.exceptions import ClientError
 from pytest import raises
 
+from mycroft_holmes.cache import PersistentCache
+
+from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.sources.base import SourceBase
 from mycroft_holmes.sources import AthenaSource
 
 
-def get_source(mocked_client=None):
+class AthenaMockedClient:
+    """
+    Mocked boto3 Athena client. Each query succeeds after being polled twice
+    and returns its length. Queries with "fail" fail, "GROUP BY" ones return two pages of rows.
+    """
+    def __init__(self):
+        self.queries = dict()  # execution ID -> [query, polls count]
+        self.max_running = 0
+        self.polls = 0
+        self.stopped = []
+
+    def _get_running(self):
+        return [query for query in self.queries.values() if query[1] < 2]
+
+    def start_query_execution(self, QueryString, ResultConfiguration):
+        # pylint: disable=invalid-name
+        assert ResultConfiguration == {'OutputLocation': 's3://foo/bar/'}
+
+        execution_id = 'query-%d' % len(self.queries)
+        self.queries[execution_id] = [QueryString, 0]
+
+        self.max_running = max(self.max_running, len(self._get_running()))
+        return {'QueryExecutionId': execution_id}
+
+    def batch_get_query_execution(self, QueryExecutionIds):
+        # pylint: disable=invalid-name
+        self.polls += 1
+        executions = []
+
+        for execution_id in QueryExecutionIds:
+            query = self.queries[execution_id]
+            query[1] += 1
+
+            if query[1] < 2:
+                state = 'RUNNING'
+            else:
+                state = 'FAILED' if 'fail' in query[0] else 'SUCCEEDED'
+
+            executions.append({
+                'QueryExecutionId': execution_id,
+                'Status': {'State': state},
+                'Statistics': {'EngineExecutionTimeInMillis': 1500, 'DataScannedInBytes': 1024},
+            })
+
+        return {'QueryExecutions': executions}
+
+    def get_query_results(self, QueryExecutionId, MaxResults, NextToken=None):
+        # pylint: disable=invalid-name
+        query = self.queries[QueryExecutionId][0]
+
+        if 'GROUP BY' not in query:
+            return {'ResultSet': {'Rows': [
+                {'Data': [{'VarCharValue': 'count'}]},
+                {'Data': [{'VarCharValue': str(len(query))}]},
+            ]}}
+
+        if NextToken is None:
+            return {'NextToken': 'page-2', 'ResultSet': {'Rows': [
+                {'Data': [{'VarCharValue': 'lang'}, {'VarCharValue': 'count'}]},
+                {'Data': [{'VarCharValue': 'pl'}, {'VarCharValue': '12'}]},
+            ]}}
+
+        assert NextToken == 'page-2'
+        return {'ResultSet': {'Rows': [
+            {'Data': [{'VarCharValue': 'de'}, {'VarCharValue': '34'}]},
+        ]}}
+
+    def stop_query_execution(self, QueryExecutionId):
+        # pylint: disable=invalid-name
+        self.stopped.append(QueryExecutionId)
+
+
+class AthenaMockedFailingClient(AthenaMockedClient):
+    """
+    Mocked boto3 Athena client which fails when states of queries are polled
+    """
+    def __init__(self):
+        super().__init__()
+        self.failing = True
+
+    def batch_get_query_execution(self, QueryExecutionIds):
+        # pylint: disable=invalid-name
+        if self.failing:
+            raise ClientError(
+                {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}},
+                'BatchGetQueryExecution')
+
+        return super().batch_get_query_execution(QueryExecutionIds)
+
+
+def get_source(mocked_client=None, mocked_athena_client=None):
     """
     :type mocked_client object
+    :type mocked_athena_client AthenaMockedClient
     :rtype: AthenaSource
     """
     return SourceBase.new_from_name(
@@ -17,9 +114,11 @@ def get_source(mocked_client=None):
         args={
             'access_key_id': '',
             'secret_access_key': '',
-            's3_staging_dir': '',
+            's3_staging_dir': 's3://foo/bar/',
             'region': 'us-foo-1',
-            'client': mocked_client
+            'max_concurrent_queries': 2,
+            'client': mocked_client,
+            'athena_client': mocked_athena_client,
         }
     )
 
@@ -34,3 +133,198 @@ def test_client_exception_handling():
     # AssertionError: "query" parameter needs to be provided
     with raises(AssertionError):
         source.get_value()
+
+
+def test_get_request_key():
+    source = get_source()
+    query = 'SELECT count(*) FROM stats.wikis WHERE lang = %(wiki_lang)s'
+
+    # only template variables bound in the query are taken into account
+    assert source.get_request_key(query=query, template={'wiki_lang': 'pl', 'component': 'Foo'}) == \
+        (query, (('wiki_lang', 'pl'),))
+    assert source.get_request_key(query=query, template={'wiki_lang': 'pl', 'component': 'Bar'}) == \
+        (query, (('wiki_lang', 'pl'),))
+
+
+def test_get_values():
+    source = get_source(mocked_athena_client=AthenaMockedClient())
+    source.POLL_INTERVAL = 0
+
+    values = source.get_values([
+        {'query': 'SELECT 1'},
+        {'query': 'SELECT %(foo)s', 'template': {'foo': "it's"}},
+        {'query': 'SELECT fail'},
+        {'query': 'SELECT 42'},
+    ])
+
+    assert values[0] == len('SELECT 1')
+    assert values[1] == len("SELECT 'it''s'"), 'Template variables are escaped'
+    assert isinstance(values[2], MycroftSourceError)
+    assert values[3] == len('SELECT 42')
+
+    client = source.athena_client
+    assert len(client.queries) == 4
+    assert client.max_running == 2, 'Up to two queries should be run at the same time'
+    assert client.polls == 4, 'States of running queries are polled together'
+
+    # all slots are free again
+    assert source.get_values([{'query': 'SELECT 1'}, {'query': 'SELECT 2'}]) == [8, 8]
+    assert client.stopped == []
+
+
+def test_get_values_stops_queries():
+    source = get_source(mocked_athena_client=AthenaMockedFailingClient())
+    source.POLL_INTERVAL = 0
+
+    values = source.get_values([
+        {'query': 'SELECT 1'},
+        {'query': 'SELECT 2'},
+        {'query': 'SELECT 3'},
+    ])
+
+    assert all(isinstance(value, MycroftSourceError) for value in values)
+
+    # the third query has never been started
+    client = source.athena_client
+    assert len(client.queries) == 2
+    assert sorted(client.stopped) == ['query-0', 'query-1'], 'Running queries are stopped'
+
+    # all slots are free again
+    client.failing = False
+    assert source.get_values([{'query': 'SELECT 1'}, {'query': 'SELECT 2'}]) == [8, 8]
+
+
+class AthenaMockedCursor:
+    """
+    Mocked PyAthena cursor returning the length of a query
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.data_scanned_in_bytes = 2048
+        self.query = None
+
+    def execute(self, operation, parameters=None):
+        self.connection.queries.append(operation)
+        self.query = operation
+
+    def fetchone(self):
+        return [len(self.query)]
+
+    def fetchall(self):
+        return [('pl', 12), ('de', 34), (1, 5)]
+
+
+class AthenaMockedConnection:
+    """
+    Mocked PyAthena connection
+    """
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return AthenaMockedCursor(self)
+
+
+def test_normalize_query():
+    assert AthenaSource.normalize_query('SELECT count(*)\n  FROM foo\tWHERE bar = 1; ') == \
+        'SELECT count(*) FROM foo WHERE bar = 1'
+
+
+def test_results_cache(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='database')
+
+    source = get_source(mocked_client=AthenaMockedConnection())
+    source._results_cache = cache
+
+    spec = {
+        'source': 'foo/athena',
+        'query': 'SELECT count(*) FROM foo WHERE lang = %(lang)s',
+        'template': {'lang': 'pl', 'component': 'Foo'},
+        'cache_ttl': 3600,
+    }
+
+    assert source.get_value(**spec) == 46
+    assert source.get_value(**dict(spec, query=spec['query'] + ';\n')) == 46, 'Normalized query is cached'
+    assert source.get_value(**dict(spec, template={'lang': 'pl', 'component': 'Bar'})) == 46
+    assert len(source.client.queries) == 1
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['bytes_saved'] == 2 * 2048
+
+    # metrics with no cache_ttl are not cached
+    spec['cache_ttl'] = None
+    source.get_value(**spec)
+    assert len(source.client.queries) == 2
+
+    # result is too old for this metric
+    spec['cache_ttl'] = 60
+    cache.set(source.get_cache_key(**spec), {
+        'value': 1, 'timestamp': time.time() - 120, 'seconds': 5, 'bytes': 1024})
+
+    assert source.get_value(**spec) == 46
+    assert len(source.client.queries) == 3
+
+
+def test_get_values_results_cache(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='database')
+
+    source = get_source(mocked_athena_client=AthenaMockedClient())
+    source.POLL_INTERVAL = 0
+    source._results_cache = cache
+
+    specs = [
+        {'source': 'foo/athena', 'query': 'SELECT 1', 'cache_ttl': 3600},
+        {'source': 'foo/athena', 'query': 'SELECT 42'},
+    ]
+
+    assert source.get_values(specs) == [8, 9]
+    assert source.get_values(specs) == [8, 9]
+
+    assert len(source.athena_client.queries) == 3, 'The first query should be taken from cache'
+    assert cache.get_stats() == {'hits': 1, 'misses': 1, 'seconds_saved': 1.5, 'bytes_saved': 1024}
+
+
+def test_group_by():
+    source = get_source(mocked_client=AthenaMockedConnection())
+    spec = {'query': 'SELECT lang, count(*) FROM foo GROUP BY lang', 'group_by': 'lang'}
+
+    with raises(AssertionError):
+        source.get_request_key(**spec)
+
+    assert source.get_request_key(template={'lang': 'pl'}, **spec) == (spec['query'], (), 'pl')
+
+    assert source.get_value(template={'lang': 'pl'}, **spec) == 12
+    assert source.get_value(template={'lang': 'de'}, **spec) == 34
+    assert source.get_value(template={'lang': 1}, **spec) == 5
+
+    with raises(MycroftSourceError):
+        source.get_value(template={'lang': 'fr'}, **spec)
+
+    assert len(source.client.queries) == 1, 'The query is run once per run'
+
+    # batched, "group_by" query is started together with the rest
+    source = get_source(mocked_athena_client=AthenaMockedClient())
+    source.POLL_INTERVAL = 0
+
+    values = source.get_values([
+        dict(template={'lang': 'de'}, **spec),
+        {'query': 'SELECT 1'},
+        dict(template={'lang': 'fr'}, **spec),
+        dict(template={'lang': 'pl'}, **spec),
+    ])
+
+    assert values[0] == 34
+    assert values[1] == 8
+    assert isinstance(values[2], MycroftSourceError)
+    assert values[3] == 12, 'All pages of results are fetched'
+
+    client = source.athena_client
+    assert len(client.queries) == 2, 'The query is run once per run'
+    assert client.max_running == 2
+    assert client.polls == 2
+
+    # results are kept until the source is closed
+    assert source.get_values([dict(template={'lang': 'pl'}, **spec)]) == [12]
+    assert len(client.queries) == 2
@@ -1,8 +1,13 @@
 """
 Set of unit test for http/json source
 """
+import asyncio
+import json
+import threading
+
 from pytest import raises
 
+from mycroft_holmes.cache import PersistentCache
 from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.sources.base import SourceBase
 from mycroft_holmes.sources import HttpJsonSource
@@ -38,6 +43,7 @@ class HttpClient:
     def __init__(self, data: dict = None):
         self.response = HttpResponse(data)
         self.requested_url: str = None
+        self.requested_urls = []
 
     def get(self, url: str):
         """
@@ -45,18 +51,97 @@ class HttpClient:
         :rtype: HttpResponse
         """
         self.requested_url = url
+        self.requested_urls.append(url)
         return self.response
 
 
-def get_source_with_mocked_client(mocked_client=None):
+class AsyncHttpResponse:
+    """
+    Mocked aiohttp response
+    """
+    def __init__(self, data: dict = None):
+        self.data = data
+        self.status = 200
+        self.headers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        if self.data is None:
+            raise Exception('Mocked HTTP exception')
+
+    async def text(self):
+        return json.dumps(self.data)
+
+
+class AsyncHttpClient:
+    """
+    Mocked aiohttp client session class
+    """
+    def __init__(self, data: dict = None):
+        self.data = data
+        self.requested_url: str = None
+
+    def get(self, url: str):
+        """
+        :type url str
+        :rtype: AsyncHttpResponse
+        """
+        self.requested_url = url
+        return AsyncHttpResponse(self.data)
+
+
+class ConditionalAsyncHttpClient(AsyncHttpClient):
+    """
+    Mocked aiohttp client session class that supports ETag-based conditional requests
+    """
+    def get(self, url: str, headers: dict = None):
+        """
+        :type url str
+        :type headers dict
+        :rtype: AsyncHttpResponse
+        """
+        resp = super().get(url)
+        resp.headers = {'ETag': '"v1"'}
+
+        if headers and headers.get('If-None-Match') == '"v1"':
+            resp.status = 304
+
+        return resp
+
+
+class ThreadsRecordingCache(PersistentCache):
+    """
+    Persistent cache that keeps track of threads it's queried from
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value):
+        self.threads.add(threading.get_ident())
+        return super().set(key, value)
+
+
+def get_source_with_mocked_client(mocked_client=None, mocked_async_client=None):
     """
     :type mocked_client HttpClient
+    :type mocked_async_client AsyncHttpClient
     :rtype: HttpXPathSource
     """
     return SourceBase.new_from_name(
         source_name=HttpJsonSource.NAME,
         args={
-            'client': mocked_client
+            'client': mocked_client,
+            'async_client': mocked_async_client,
         }
     )
 
@@ -108,10 +193,61 @@ def test_source_get_value():
     assert 'jq: error' in str(ex)
 
     # URL should be properly filled with template values
-    assert source._client.requested_url == 'http://foo.bar/get/foo'
+    # and each URL is fetched only once (responses are cached)
+    assert source._client.requested_urls == ['http://foo.bar/get/foo', 'http://foo.bar/{path}']
     assert source.get_more_link(**ARGS) == ('Fetch JSON', 'http://foo.bar/get/foo')
 
 
+def test_source_get_value_async():
+    source = get_source_with_mocked_client(mocked_async_client=AsyncHttpClient(DATA))
+    loop = asyncio.new_event_loop()
+
+    assert loop.run_until_complete(source.get_value_async(jq='.foo', **ARGS)) == 123.45
+    assert loop.run_until_complete(source.get_value_async(jq='.spaces', **ARGS)) == 12345.3
+    assert source.async_client.requested_url == 'http://foo.bar/get/foo'
+
+    with raises(MycroftSourceError) as ex:
+        loop.run_until_complete(source.get_value_async(jq='.test[3]', **ARGS))
+    assert 'jq pattern returned no matches' in str(ex)
+
+    # HTTP errors are reported as source errors
+    source = get_source_with_mocked_client(mocked_async_client=AsyncHttpClient(None))
+
+    with raises(MycroftSourceError) as ex:
+        loop.run_until_complete(source.get_value_async(jq='.foo', **ARGS))
+    assert 'Mocked HTTP exception' in str(ex)
+
+    loop.close()
+
+
+def test_source_get_value_async_conditional(tmpdir):
+    cache = ThreadsRecordingCache(path=str(tmpdir.join('cache.sqlite')), namespace='http')
+    loop = asyncio.new_event_loop()
+
+    # the first run - the page is fetched and the value is stored in the cache
+    source = get_source_with_mocked_client(mocked_async_client=ConditionalAsyncHttpClient(DATA))
+    source._conditional_cache = cache
+
+    assert loop.run_until_complete(source.get_value_async(jq='.foo', **ARGS)) == 123.45
+    source.close()
+
+    assert cache.get_stats() == {'hits': 0, 'misses': 1}
+
+    # the next run - the page has not changed, the value is taken from the cache
+    source = get_source_with_mocked_client(mocked_async_client=ConditionalAsyncHttpClient(None))
+    source._conditional_cache = cache
+
+    assert loop.run_until_complete(source.get_value_async(jq='.foo', **ARGS)) == 123.45
+    assert cache.get_stats() == {'hits': 1, 'misses': 1}
+    source.close()
+
+    loop.close()
+
+    # SQLite-backed cache is not queried from the event loop thread
+    assert cache.threads
+    assert threading.get_ident() not in cache.threads
+
+
 def test_client_exception_handling():
     source = get_source_with_mocked_client()
 
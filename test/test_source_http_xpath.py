@@ -3,9 +3,12 @@ Set of unit test for http/xpath source
 """
 from pytest import raises
 
+from mycroft_holmes.cache import PersistentCache
+from mycroft_holmes.config import Config
 from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.sources.base import SourceBase
 from mycroft_holmes.sources import HttpXPathSource
+from mycroft_holmes.sources.http.base import RESPONSES_CACHE, RESPONSES_CACHE_MAX_SIZE
 
 
 class HttpResponse:
@@ -28,6 +31,7 @@ class HttpClient:
     def __init__(self, text: str = None):
         self.response = HttpResponse(text)
         self.requested_url: str = None
+        self.requests_count = 0
 
     def get(self, url: str):
         """
@@ -35,9 +39,37 @@ class HttpClient:
         :rtype: HttpResponse
         """
         self.requested_url = url
+        self.requests_count += 1
         return self.response
 
 
+class ConditionalHttpClient:
+    """
+    Mocked requests class that supports ETag-based conditional requests
+    """
+    def __init__(self, text: str, etag: str):
+        self.text = text
+        self.etag = etag
+        self.statuses = []
+
+    def get(self, url: str, headers: dict = None):
+        """
+        :type url str
+        :type headers dict
+        :rtype: HttpResponse
+        """
+        if headers and headers.get('If-None-Match') == self.etag:
+            resp = HttpResponse('')
+            resp.status_code = 304
+        else:
+            resp = HttpResponse(self.text)
+
+        resp.headers = {'ETag': self.etag}
+
+        self.statuses.append(resp.status_code)
+        return resp
+
+
 def get_source_with_mocked_client(mocked_client=None):
     """
     :type mocked_client HttpClient
@@ -85,6 +117,88 @@ def test_source_get_value():
     assert source.get_more_link(**args) == ('Visit the page', 'http://foo.bar/get/foo')
 
 
+def test_responses_cache():
+    source = get_source_with_mocked_client(HttpClient('<p>foo<b>123</b><i>45,6</i></p>'))
+
+    assert source.get_value(url=URL, xpath='//p/b') == 123
+    assert source.get_value(url=URL, xpath='//p/i') == 45.6
+    assert source._client.requests_count == 1, 'The same page should be fetched only once'
+
+    # the parsed document is taken from the cache as well
+    assert source.get_document(URL) is source.get_document(URL)
+
+    # closing another source keeps responses cached by this one
+    other = get_source_with_mocked_client(HttpClient('<p>bar</p>'))
+    other.close()
+
+    assert source.get_value(url=URL, xpath='//p/b') == 123
+    assert source._client.requests_count == 1
+
+    # the cache is cleared when the collection run is completed
+    source.close()
+
+    assert source.get_value(url=URL, xpath='//p/b') == 123
+    assert source._client.requests_count == 2
+
+
+class ConfigWithCache(Config):
+    # pylint: disable=super-init-not-called
+    def __init__(self, cache_config):
+        self.data = {'cache': cache_config}
+
+
+def test_responses_cache_size():
+    source = get_source_with_mocked_client()
+
+    try:
+        source.configure(ConfigWithCache({'responses': {'max_size': 1024}}))
+        assert RESPONSES_CACHE.max_size == 1024
+
+        # 64 MB by default
+        source.configure(ConfigWithCache(None))
+        assert RESPONSES_CACHE.max_size == RESPONSES_CACHE_MAX_SIZE == 64 * 1024 * 1024
+
+        source.configure(ConfigWithCache({'responses': None}))
+        assert RESPONSES_CACHE.max_size == RESPONSES_CACHE_MAX_SIZE
+    finally:
+        RESPONSES_CACHE.max_size = RESPONSES_CACHE_MAX_SIZE
+
+
+def test_conditional_requests(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='http')
+    text = '<p>foo<b>123</b><i>45,6</i></p>'
+
+    # the first run - the page is fetched and values are stored in the cache
+    source = get_source_with_mocked_client(ConditionalHttpClient(text, etag='"v1"'))
+    source._conditional_cache = cache
+
+    assert source.get_value(url=URL, xpath='//p/b') == 123
+    assert source.get_value(url=URL, xpath='//p/i') == 45.6
+    assert source._client.statuses == [200]
+    source.close()
+
+    assert cache.get(URL) == {'etag': '"v1"', 'last_modified': None, 'values': {'//p/b': 123, '//p/i': 45.6}}
+    assert cache.get_stats() == {'hits': 0, 'misses': 2}
+
+    # the next run - the page has not changed, values are taken from the cache
+    source = get_source_with_mocked_client(ConditionalHttpClient('<p>changed</p>', etag='"v1"'))
+    source._conditional_cache = cache
+
+    assert source.get_value(url=URL, xpath='//p/b') == 123
+    assert source.get_value(url=URL, xpath='//p/i') == 45.6
+    assert source._client.statuses == [304], 'A single conditional request should be made'
+    assert cache.get_stats() == {'hits': 2, 'misses': 2}
+    source.close()
+
+    # the page has changed - fetch it and update the cache
+    source = get_source_with_mocked_client(ConditionalHttpClient('<p>foo<b>456</b></p>', etag='"v2"'))
+    source._conditional_cache = cache
+
+    assert source.get_value(url=URL, xpath='//p/b') == 456
+    assert source._client.statuses == [200], 'The page should not be downloaded twice'
+    assert cache.get(URL) == {'etag': '"v2"', 'last_modified': None, 'values': {'//p/b': 456}}
+
+
 def test_invalid_xpath_and_no_matches():
     source = get_source_with_mocked_client(HttpClient(TEXT))
 
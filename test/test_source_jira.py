@@ -1,8 +1,13 @@
 """
 Set of unit test for JiraSource class
 """
+import asyncio
+import threading
+import time
+
 from pytest import raises
 
+from mycroft_holmes.cache import PersistentCache
 from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.sources.base import SourceBase
 from mycroft_holmes.sources import JiraSource
@@ -17,12 +22,15 @@ class JiraMockedClient:
         self.last_query = None
         self.raise_exc = raise_exc
 
-    def search_issues(self, jql_str):
+    def _get_json(self, path, params):
         if self.raise_exc:
             raise Exception('Mocked exception thrown')
 
-        self.last_query = jql_str
-        return self.tickets
+        assert path == 'search'
+        assert params['maxResults'] == 0, 'Only the total should be requested'
+
+        self.last_query = params['jql']
+        return {'startAt': 0, 'maxResults': 0, 'total': len(self.tickets), 'issues': []}
 
     def get_last_query(self):
         """
@@ -31,9 +39,46 @@ class JiraMockedClient:
         return self.last_query
 
 
-def get_source_with_mocked_client(mocked_client):
+class JiraMockedAsyncResponse:
+    """
+    Mocked aiohttp response with Jira search API results
+    """
+    def __init__(self, tickets):
+        self.tickets = tickets
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        return {'startAt': 0, 'maxResults': 0, 'total': len(self.tickets), 'issues': []}
+
+
+class JiraMockedAsyncClient(JiraMockedClient):
+    """
+    Mocked aiohttp client session querying Jira search API
+    """
+    def get(self, url, params, headers):
+        if self.raise_exc:
+            raise Exception('Mocked exception thrown')
+
+        assert url == 'https://foo-company.attlasian.net/rest/api/2/search'
+        assert headers['Authorization'] == 'Basic TXJGb286Zm9vYmFy'  # MrFoo:foobar
+        assert params['maxResults'] == 0, 'Only the total should be requested'
+
+        self.last_query = params['jql']
+        return JiraMockedAsyncResponse(self.tickets)
+
+
+def get_source_with_mocked_client(mocked_client, mocked_async_client=None):
     """
     :type mocked_client JiraMockedClient
+    :type mocked_async_client JiraMockedAsyncClient
     :rtype: JiraSource
     """
     return SourceBase.new_from_name(
@@ -42,7 +87,8 @@ def get_source_with_mocked_client(mocked_client):
             'server': 'https://foo-company.attlasian.net',
             'user': 'MrFoo',
             'password': 'foobar',
-            'client': mocked_client
+            'client': mocked_client,
+            'async_client': mocked_async_client,
         }
     )
 
@@ -66,9 +112,156 @@ def test_source_get_value():
     assert source.client.get_last_query() == 'Project = "Foo"'
 
 
+def test_source_get_values():
+    source = get_source_with_mocked_client(JiraMockedClient(tickets_count=5))
+
+    assert source.get_values([
+        {'query': 'Project = "{project}"', 'template': {'project': 'Foo'}},
+        {'query': 'Project = "Bar"'},
+    ]) == [5, 5]
+    assert source.client.get_last_query() == 'Project = "Bar"'
+
+    source = get_source_with_mocked_client(JiraMockedClient(tickets_count=5, raise_exc=True))
+    values = source.get_values([{'query': 'Foo'}, {'query': 'Bar'}])
+
+    assert len(values) == 2
+    assert isinstance(values[0], MycroftSourceError)
+    assert isinstance(values[1], MycroftSourceError)
+
+
+class JiraMockedProbeClient:
+    """
+    Mocked Jira client class that keeps track of JQL queries and returns
+    the number of updated tickets for "updated >=" probes
+    """
+    def __init__(self, tickets_count, updated_count):
+        self.tickets_count = tickets_count
+        self.updated_count = updated_count
+        self.queries = []
+
+    def _get_json(self, path, params):
+        jql = params['jql']
+        self.queries.append(jql)
+
+        return {'total': self.updated_count if 'updated >=' in jql else self.tickets_count}
+
+
+def test_get_probe_jql():
+    since = time.time() - 150
+
+    assert JiraSource.get_probe_jql('project = "Foo"', since) == \
+        '(project = "Foo") AND updated >= -4m'
+    assert JiraSource.get_probe_jql('project = "Foo" OR key = FOO-1 order by created DESC', since) == \
+        '(project = "Foo" OR key = FOO-1) AND updated >= -4m'
+
+
+def test_incremental_counts(tmpdir):
+    cache = PersistentCache(path=str(tmpdir.join('cache.sqlite')), namespace='jira', ttl=3600)
+    jql = 'project = "Foo"'
+
+    # the first run - full count
+    source = get_source_with_mocked_client(JiraMockedProbeClient(tickets_count=5, updated_count=0))
+    source._counts_cache = cache
+
+    assert source.get_value(query=jql) == 5
+    assert source.client.queries == [jql]
+
+    # nothing has been updated since the last run - reuse the last count
+    source = get_source_with_mocked_client(JiraMockedProbeClient(tickets_count=6, updated_count=0))
+    source._counts_cache = cache
+
+    assert source.get_value(query=jql) == 5
+    assert source.client.queries == ['(project = "Foo") AND updated >= -2m']
+    assert cache.get_stats() == {'hits': 1, 'misses': 1}
+
+    # some tickets were updated - run the full count
+    source = get_source_with_mocked_client(JiraMockedProbeClient(tickets_count=7, updated_count=2))
+    source._counts_cache = cache
+
+    assert source.get_value(query=jql) == 7
+    assert source.client.queries == ['(project = "Foo") AND updated >= -2m', jql]
+
+    # the last count is too old - run the full count
+    cache.connection.execute('UPDATE cache SET updated_at = ?', (time.time() - 7200,))
+
+    source = get_source_with_mocked_client(JiraMockedProbeClient(tickets_count=8, updated_count=0))
+    source._counts_cache = cache
+
+    assert source.get_value(query=jql) == 8
+    assert source.client.queries == [jql]
+
+
 def test_client_exception_handling():
     source = get_source_with_mocked_client(JiraMockedClient(tickets_count=5, raise_exc=True))
 
     # AssertionError: "query" parameter needs to be provided
     with raises(MycroftSourceError):
         source.get_value(query='Foo')
+
+
+def test_source_get_value_async():
+    source = get_source_with_mocked_client(
+        mocked_client=None, mocked_async_client=JiraMockedAsyncClient(tickets_count=3))
+    loop = asyncio.new_event_loop()
+
+    assert loop.run_until_complete(
+        source.get_value_async(query='Project = "{project}"', template={'project': 'Foo'})) == 3
+    assert source.async_client.get_last_query() == 'Project = "Foo"'
+
+    source = get_source_with_mocked_client(
+        mocked_client=None, mocked_async_client=JiraMockedAsyncClient(tickets_count=3, raise_exc=True))
+
+    with raises(MycroftSourceError):
+        loop.run_until_complete(source.get_value_async(query='Foo'))
+
+    loop.close()
+
+
+class JiraMockedSlowClient(JiraMockedClient):
+    """
+    Mocked Jira client that keeps track of counts run at the same time
+    """
+    def __init__(self, tickets_count):
+        super().__init__(tickets_count)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def _get_json(self, path, params):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        time.sleep(0.05)
+
+        with self.lock:
+            self.running -= 1
+
+        return super()._get_json(path, params)
+
+
+def test_source_get_values_one_after_another():
+    source = get_source_with_mocked_client(JiraMockedSlowClient(tickets_count=5))
+    specs = [{'query': 'Project = "{}"'.format(project)} for project in range(3)]
+
+    # --workers and --concurrency bound the number of requests in flight
+    assert source.get_values(specs) == [5] * 3
+    assert source.client.max_running == 1, 'Counts of a batch should not run concurrently'
+
+    async def count(**kwargs):
+        source.client.running += 1
+        source.client.max_running = max(source.client.max_running, source.client.running)
+        await asyncio.sleep(0.01)
+        source.client.running -= 1
+
+        return 3
+
+    source.get_value_async = count
+
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(source.get_values_async(specs)) == [3] * 3
+    assert source.client.max_running == 1, 'Counts of a batch should not run concurrently'
+    loop.close()
+
+    # small batches are spread over collector workers
+    assert source.get_batches(specs * 4) == [list(range(0, 5)), list(range(5, 10)), [10, 11]]
@@ -1,7 +1,13 @@
 """
 Set of unit test for LogstashSource class
 """
-from pytest import raises
+import asyncio
+import json
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+
+from pytest import fixture, raises
 
 from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.sources.base import SourceBase
@@ -62,3 +68,224 @@ def test_client_exception_handling():
     # AssertionError: "query" parameter needs to be provided
     with raises(MycroftSourceError):
         source.get_value(query='Foo')
+
+
+class ElasticsearchStandInHandler(BaseHTTPRequestHandler):
+    """
+    Handles multi-search requests just like elasticsearch does.
+    The number of hits is the length of a query, "error" queries fail.
+    """
+    def do_POST(self):
+        # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        self.server.requests.append((self.path, self.headers['Content-Type'], body))
+
+        lines = body.rstrip('\n').split('\n')
+        responses = []
+
+        for header, search in zip(lines[::2], lines[1::2]):
+            assert 'logstash-app-' in json.loads(header)['index']
+
+            search = json.loads(search)
+            assert search['size'] == 0
+            assert search['track_total_hits'] is True
+
+            if 'aggs' in search:
+                # filters aggregation - the number of documents in bucket is the length of its query
+                filters = search['aggs']['fan_out']['filters']['filters']
+
+                responses.append({
+                    'hits': {'total': {'value': 1000, 'relation': 'eq'}},
+                    'aggregations': {'fan_out': {'buckets': {
+                        key: {'doc_count': len(query['query_string']['query'])}
+                        for key, query in filters.items()
+                    }}}
+                })
+                continue
+
+            query = search['query']['bool']['must'][0]['query_string']['query']
+
+            if query == 'error':
+                responses.append({'error': {'type': 'query_shard_exception'}, 'status': 400})
+            else:
+                responses.append({'hits': {'total': {'value': len(query), 'relation': 'eq'}}})
+
+        resp = json.dumps({'responses': responses}).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(resp)))
+        self.end_headers()
+        self.wfile.write(resp)
+
+    def log_message(self, *args):
+        pass
+
+
+@fixture
+def elasticsearch():
+    """
+    Runs a local HTTP stand-in for elasticsearch
+    """
+    server = HTTPServer(('127.0.0.1', 0), ElasticsearchStandInHandler)
+    server.requests = []
+
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def get_source_for_server(server):
+    """
+    :type server HTTPServer
+    :rtype: LogstashSource
+    """
+    return SourceBase.new_from_name(
+        source_name=LogstashSource.NAME,
+        args={
+            'host': 'http://127.0.0.1:%d' % server.server_port,
+            'index': 'logstash-app',
+            'batch_size': 3,
+        }
+    )
+
+
+def test_get_values(elasticsearch):
+    source = get_source_for_server(elasticsearch)
+    assert source.batch_size == 3
+
+    values = source.get_values([
+        {'query': 'foo'},
+        {'query': 'url: "{url}"', 'template': {'url': '/foo/bar'}},
+        {'query': 'error'},
+    ])
+
+    assert values[:2] == [3, 15]
+    assert isinstance(values[2], MycroftSourceError)
+
+    # a single multi-search request
+    assert len(elasticsearch.requests) == 1
+
+    path, content_type, body = elasticsearch.requests[0]
+    assert path == '/_msearch'
+    assert content_type == 'application/x-ndjson'
+    assert body.endswith('\n')
+    assert len(body.rstrip('\n').split('\n')) == 6
+
+
+def test_get_values_async(elasticsearch):
+    source = get_source_for_server(elasticsearch)
+    loop = asyncio.new_event_loop()
+
+    try:
+        values = loop.run_until_complete(
+            source.get_values_async([{'query': 'foo'}, {'query': 'foobar'}]))
+        loop.run_until_complete(source.close_async())
+    finally:
+        loop.close()
+
+    assert values == [3, 6]
+    assert len(elasticsearch.requests) == 1
+
+
+def test_fan_out(elasticsearch):
+    source = get_source_for_server(elasticsearch)
+    spec = {'query': "request: '{method}' AND url: '{url}'", 'field': 'url'}
+
+    assert source.get_batch_key(template={'method': 'GET', 'url': '/foo'}, **spec) == \
+        "request: 'GET' AND url: '{url}'"
+    assert source.get_batch_key(query='foo') is None
+
+    with raises(AssertionError):
+        source.get_values([dict(template={'method': 'GET'}, **spec)])
+
+    values = source.get_values([
+        dict(template={'method': 'GET', 'url': '/foo'}, **spec),
+        {'query': 'foo'},
+        dict(template={'method': 'GET', 'url': '/foo/bar'}, **spec),
+        dict(template={'method': 'POST', 'url': '/foo'}, **spec),
+    ])
+
+    assert values == [
+        len("request: 'GET' AND url: '/foo'"),
+        3,
+        len("request: 'GET' AND url: '/foo/bar'"),
+        len("request: 'POST' AND url: '/foo'"),
+    ]
+
+    # a single multi-search request with a count and two aggregations
+    assert len(elasticsearch.requests) == 1
+
+    searches = elasticsearch.requests[0][2].rstrip('\n').split('\n')[1::2]
+    assert len(searches) == 3
+
+    filters = json.loads(searches[1])['aggs']['fan_out']['filters']['filters']
+    assert filters == {
+        '/foo': {'query_string': {'query': "request: 'GET' AND url: '/foo'"}},
+        '/foo/bar': {'query_string': {'query': "request: 'GET' AND url: '/foo/bar'"}},
+    }
+
+
+def test_fan_out_batches(elasticsearch):
+    source = get_source_for_server(elasticsearch)
+    spec = {'query': "url: '{url}'", 'field': 'url'}
+
+    # more features than batch_size share the same query template
+    specs = [dict(template={'url': '/foo/%d' % index}, **spec) for index in range(10)]
+    specs += [{'query': 'foo'}, {'query': 'bar'}, {'query': 'error'}]
+
+    # the aggregation and two count queries, then the last count query
+    batches = source.get_batches(specs)
+    assert batches == [list(range(12)), [12]]
+
+    values = source.get_values([specs[index] for index in batches[0]])
+    assert values == [len("url: '/foo/0'")] * 10 + [3, 3]
+
+    # a single multi-search request with a single aggregation
+    assert len(elasticsearch.requests) == 1
+
+    searches = elasticsearch.requests[0][2].rstrip('\n').split('\n')[1::2]
+    assert len(searches) == 3
+    assert len(json.loads(searches[2])['aggs']['fan_out']['filters']['filters']) == 10
+
+
+def test_malformed_responses():
+    source = get_source_with_mocked_client(MockedClient(cnt=5))
+    searches = source._get_searches([
+        {'query': 'foo'},
+        {'query': "url: '{url}'", 'template': {'url': '/foo'}, 'field': 'url'},
+    ])
+
+    # a partial response - every metric fails
+    for res in [{}, {'responses': [{'hits': {'total': 1}}]}, ['foo'], None]:
+        values = source._get_values_from_responses(2, searches, res)
+        assert [type(value) for value in values] == [MycroftSourceError] * 2
+
+    # malformed hits or aggregations - a given metric fails
+    values = source._get_values_from_responses(2, searches, {'responses': [
+        {'hits': {'total': {'value': 4, 'relation': 'eq'}}},
+        {'aggregations': {'fan_out': {'buckets': {}}}},
+    ]})
+    assert values[0] == 4
+    assert isinstance(values[1], MycroftSourceError)
+
+    values = source._get_values_from_responses(2, searches, {'responses': [{'hits': {}}, 'foo']})
+    assert [type(value) for value in values] == [MycroftSourceError] * 2
+
+
+def test_get_values_failed_request():
+    # nothing listens there
+    source = SourceBase.new_from_name(
+        source_name=LogstashSource.NAME,
+        args={'host': 'http://127.0.0.1:1', 'index': 'logstash-app'}
+    )
+
+    values = source.get_values([{'query': 'foo'}, {'query': 'bar'}])
+
+    assert len(values) == 2
+    assert isinstance(values[0], MycroftSourceError)
+    assert isinstance(values[1], MycroftSourceError)
@@ -4,11 +4,13 @@ Set of unit test for MysqlSource class
 from os import environ
 from unittest import SkipTest
 
+from mysql.connector.errors import PoolError, ProgrammingError
 from pytest import raises
 
 from mycroft_holmes.errors import MycroftSourceError
 from mycroft_holmes.sources.base import SourceBase
 from mycroft_holmes.sources import MysqlSource
+from mycroft_holmes.sources.mysql import POOLS, close_pools
 
 
 def get_source(env):
@@ -102,3 +104,150 @@ def test_client_exception_handling():
     # AssertionError: "query" parameter needs to be provided
     with raises(AssertionError):
         source.get_value()
+
+
+class MockedConnection:
+    """
+    Mocked pooled MySQL connection
+    """
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params):
+        self.pool.queries += 1
+
+        if 'fail' in query:
+            raise ProgrammingError('1146 (42S02): Table \'foo.fail\' doesn\'t exist')
+
+        if 'bug' in query:
+            raise RuntimeError('Not a query error')
+
+    def fetchone(self):
+        return [len(self.pool.connections)]
+
+    def close(self):
+        self.pool.connections.remove(self)
+
+    def disconnect(self):
+        self.pool.connections.remove(self)
+        self.pool.disconnected += 1
+
+
+class MockedPool:
+    """
+    Mocked pool of MySQL connections
+    """
+    def __init__(self, size):
+        self.size = size
+        self.connections = []
+        self.checkouts = 0
+        self.queries = 0
+
+    def get_connection(self):
+        if len(self.connections) >= self.size:
+            raise PoolError('Failed getting connection; pool exhausted')
+
+        self.checkouts += 1
+        self.connections.append(MockedConnection(self))
+        return self.connections[-1]
+
+
+def test_pooled_connections():
+    source = SourceBase.new_from_name(
+        source_name=MysqlSource.NAME,
+        args={
+            'host': '127.0.0.1',
+            'database': 'foo',
+            'user': 'bar',
+            'password': '',
+            'pool_timeout': 0.2,
+            'client': MockedPool(size=1),
+        }
+    )
+
+    assert source.get_value(query='SELECT 1') == 1
+    assert source.get_value(query='SELECT 1') == 1
+    assert source.client.checkouts == 2
+    assert source.client.connections == [], 'Connections are returned to the pool'
+
+    # the pool is exhausted - wait for a free connection and give up
+    with source.checkout():
+        with raises(MycroftSourceError) as ex:
+            source.get_value(query='SELECT 1')
+
+    assert 'pool exhausted' in str(ex)
+
+
+def test_group_by_driver_errors():
+    source = SourceBase.new_from_name(
+        source_name=MysqlSource.NAME,
+        args={'host': '127.0.0.1', 'database': 'foo', 'user': 'bar', 'password': '',
+              'client': MockedPool(size=1)}
+    )
+
+    spec = {'query': 'SELECT lang, count(*) FROM fail GROUP BY lang', 'group_by': 'lang'}
+
+    for lang in ('pl', 'de'):
+        with raises(MycroftSourceError) as ex:
+            source.get_value(template={'lang': lang}, **spec)
+
+        assert 'Table' in str(ex)
+
+    assert source.client.queries == 1, 'The failed query is not run again for every feature'
+
+    # errors that do not come from the driver are not hidden
+    with raises(RuntimeError):
+        source.get_value(template={'lang': 'pl'}, **dict(spec, query='SELECT bug'))
+
+
+class MockedConnectionPool(MockedPool):
+    """
+    Mocked mysql.connector.pooling.MySQLConnectionPool
+    """
+    def __init__(self, pool_name, pool_size, **kwargs):
+        super(MockedConnectionPool, self).__init__(size=pool_size)
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.params = kwargs
+        self.disconnected = 0
+
+
+def test_pools_are_shared(monkeypatch):
+    monkeypatch.setattr('mycroft_holmes.sources.mysql.MySQLConnectionPool', MockedConnectionPool)
+
+    args = {'host': '127.0.0.1', 'database': 'foo', 'user': 'bar', 'password': '', 'pool_size': 3}
+
+    source = SourceBase.new_from_name(source_name=MysqlSource.NAME, args=args)
+    other = SourceBase.new_from_name(source_name=MysqlSource.NAME, args=args)
+
+    pool = source.client
+
+    assert isinstance(pool, MockedConnectionPool)
+    assert pool is other.client, 'Sources with the same params share the pool'
+    assert pool.size == 3
+    assert pool.params == {'host': '127.0.0.1', 'database': 'foo', 'user': 'bar', 'password': ''}
+    assert len(POOLS) == 1
+
+    # closing a source keeps the pool for other ones
+    source.close()
+
+    assert source._client is None
+    assert len(POOLS) == 1
+    assert other.get_value(query='SELECT 1') == 1
+    assert pool.disconnected == 0
+
+    # connections are closed once at the end of the run
+    other.close()
+    close_pools()
+
+    assert pool.disconnected == 3
+    assert len(POOLS) == 0
+    assert other._client is None
+
+    # pools set up again get unique names
+    assert source.client is not pool
+    assert source.client.pool_name != pool.pool_name
+    close_pools()
@@ -1,17 +1,24 @@
 """
 Set of unit test for metrics storage
 """
+from datetime import date
+from decimal import Decimal
 from unittest import SkipTest
 
+from mysql.connector.errors import DatabaseError
+from pytest import raises
+
 from os import environ
 
 from mycroft_holmes.config import Config
+from mycroft_holmes.errors import MycroftMetricsStorageError
 from mycroft_holmes.metric import Metric
-from mycroft_holmes.storage import MetricsStorage
+from mycroft_holmes.storage import MetricsStorage, MySqlMetricsStorage
+from mycroft_holmes.storage.pool import ConnectionPool
 
 
 class ConfigForMetricsStorage(Config):
-    def __init__(self):
+    def __init__(self, **kwargs):
         self.data = {
             'storage': {
                 'engine': 'mysql',
@@ -23,6 +30,60 @@ class ConfigForMetricsStorage(Config):
             }
         }
 
+        self.data['storage'].update(kwargs)
+
+
+class MockedConnection:
+    """
+    Mocked MySQL connection that keeps track of queries
+    """
+    def __init__(self, rows=None, rowcounts=None, count=0):
+        self.queries = []
+        self.committed = False
+        self.rows = rows or []
+        self.rowcounts = rowcounts or []
+        self.rowcount = 0
+        self.count = count
+
+    def ping(self, **kwargs):
+        pass
+
+    def cursor(self):
+        return self
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+        self.rowcount = self.rowcounts.pop(0) if self.rowcounts else 0
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return (self.count,) if self.count is not None else None
+
+    def executemany(self, query, rows):
+        self.queries.append((query, rows))
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def get_mocked_pool(connection):
+    """
+    :type connection MockedConnection
+    :rtype: ConnectionPool
+    """
+    return ConnectionPool(connect=lambda: connection, check=MySqlMetricsStorage.check_connection)
+
 
 TIMESTAMP = '2019-03-02 20:22:24'
 TIMESTAMP_LATER = '2019-03-04 10:22:24'
@@ -37,6 +98,8 @@ def test_storage():
     # clean up the storage
     cursor = storage.storage.cursor()
     cursor.execute('TRUNCATE TABLE features_metrics')
+    cursor.execute('TRUNCATE TABLE features_metrics_latest')
+    cursor.execute('TRUNCATE TABLE features_metrics_daily')
 
     # push some metrics and later on try to get them
     storage.push('foo', {'score': 123, 'bar/metric': 42.458})
@@ -58,6 +121,19 @@ def test_storage():
 
     assert storage.get(feature_id='not_existing', feature_metric='bar/metric') is None, 'Not existing metric'
 
+    # bulk reads
+    assert storage.get_many([('foo', 'score'), ('bar', 'score'), ('not_existing', 'score')]) == {
+        ('foo', 'score'): 123,
+        ('bar', 'score'): 5,
+    }
+
+    assert storage.get_all_latest() == {
+        ('foo', 'score'): 123,
+        ('foo', 'bar/metric'): 42.46,
+        ('bar', 'score'): 5,
+        ('bar', 'bar/metric'): -4,
+    }
+
     # now check if we can get the metric value
     metric = Metric(feature_name='Bar', config=ConfigForMetricsStorage(), spec={'name': 'bar/metric'})
     assert metric.value == -4, 'Get the most recent value from the storage'
@@ -84,3 +160,385 @@ def test_storage():
         {'date': '2019-03-04', 'metric': 'bar/metric', 'value': -4.0},
         {'date': '2019-03-04', 'metric': 'score', 'value': 5.0}
     ]
+
+    # other daily aggregates
+    assert list(storage.get_feature_metrics_history(feature__id='bar', aggregate='min')) == [
+        {'date': '2019-03-02', 'metric': 'bar/metric', 'value': -3.0},
+        {'date': '2019-03-02', 'metric': 'score', 'value': 1.0},
+        {'date': '2019-03-04', 'metric': 'bar/metric', 'value': -4.0},
+        {'date': '2019-03-04', 'metric': 'score', 'value': 5.0}
+    ]
+
+    assert list(storage.get_feature_metrics_history(feature__id='bar', aggregate='avg'))[0] == \
+        {'date': '2019-03-02', 'metric': 'bar/metric', 'value': 1.5}
+
+    # rebuilding the rollup table gives the same results
+    history = list(storage.get_feature_metrics_history(feature__id='bar', aggregate='last'))
+    assert history[0] == {'date': '2019-03-02', 'metric': 'bar/metric', 'value': 6.0}
+
+    assert storage.backfill_daily_metrics() == 2
+    assert list(storage.get_feature_metrics_history(feature__id='bar', aggregate='last')) == history
+
+    # values committed with an older timestamp do not replace the latest ones
+    storage.push('bar', {'score': 7})
+    storage.commit(timestamp=TIMESTAMP)
+
+    assert storage.get(feature_id='bar', feature_metric='score') == 5
+
+
+def test_commit_batches():
+    connection = MockedConnection()
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(
+            config=ConfigForMetricsStorage(host='mocked-host', batch_size=3), use_slave=False)
+        assert storage.batch_size == 3
+
+        storage.push('foo', {'score': 123, 'bar/metric': 42.458})
+        storage.push('bar', {'score': 1, 'bar/metric': -3, 'foo/metric': 5})
+        storage.commit(timestamp=TIMESTAMP)
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+
+    assert connection.committed is True
+    assert storage.data == {}
+
+    # five rows in two multi-row INSERT queries (for each table)
+    assert len(connection.queries) == 6
+
+    query, params = connection.queries[0]
+    assert query == 'INSERT INTO /* mycroft_holmes */ features_metrics ' \
+        '(feature, metric, value, timestamp) ' \
+        'VALUES (%s, %s, %s, %s), (%s, %s, %s, %s), (%s, %s, %s, %s)'
+    assert params == [
+        'foo', 'score', 123, TIMESTAMP,
+        'foo', 'bar/metric', 42.458, TIMESTAMP,
+        'bar', 'score', 1, TIMESTAMP,
+    ]
+
+    query, params = connection.queries[1]
+    assert query.endswith('VALUES (%s, %s, %s, %s), (%s, %s, %s, %s)')
+    assert params == [
+        'bar', 'bar/metric', -3, TIMESTAMP,
+        'bar', 'foo/metric', 5, TIMESTAMP,
+    ]
+
+    # the latest values are upserted
+    query, params = connection.queries[2]
+    assert query.startswith('INSERT INTO /* mycroft_holmes */ features_metrics_latest ')
+    assert 'ON DUPLICATE KEY UPDATE' in query
+    assert params == connection.queries[0][1]
+
+    # daily aggregates are updated
+    query, params = connection.queries[4]
+    assert query == 'INSERT INTO /* mycroft_holmes */ features_metrics_daily ' \
+        '(feature, metric, date, min_value, max_value, last_value, last_timestamp, sum_value, samples) ' \
+        'VALUES (%s, %s, DATE(%s), %s, %s, %s, %s, %s, 1), (%s, %s, DATE(%s), %s, %s, %s, %s, %s, 1), ' \
+        '(%s, %s, DATE(%s), %s, %s, %s, %s, %s, 1) ' \
+        'ON DUPLICATE KEY UPDATE min_value = LEAST(min_value, VALUES(min_value)), ' \
+        'max_value = GREATEST(max_value, VALUES(max_value)), ' \
+        'last_value = IF(VALUES(last_timestamp) >= last_timestamp, VALUES(last_value), last_value), ' \
+        'last_timestamp = GREATEST(last_timestamp, VALUES(last_timestamp)), ' \
+        'sum_value = sum_value + VALUES(sum_value), samples = samples + VALUES(samples)'
+    assert params[:8] == ['foo', 'score', TIMESTAMP, 123, 123, 123, TIMESTAMP, 123]
+
+    assert MetricsStorage(config=ConfigForMetricsStorage()).batch_size == \
+        MetricsStorage.DEFAULT_BATCH_SIZE
+
+
+def test_bulk_reads():
+    connection = MockedConnection(rows=[
+        ('foo', 'score', Decimal('123.00')),
+        ('foo', 'bar/metric', Decimal('42.46')),
+    ])
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(config=ConfigForMetricsStorage(host='mocked-host'))
+
+        assert storage.get_many([]) == {}
+        assert connection.queries == [], 'No query is made for an empty list of pairs'
+
+        values = storage.get_many([('foo', 'score'), ('foo', 'bar/metric')])
+        assert storage.get_all_latest() == values
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+
+    assert values == {('foo', 'score'): 123, ('foo', 'bar/metric'): 42.46}
+    assert isinstance(values[('foo', 'score')], int)
+
+    # a single query per call
+    assert len(connection.queries) == 2
+
+    query, params = connection.queries[0]
+    assert query == 'SELECT /* mycroft_holmes */ feature, metric, value ' \
+        'FROM features_metrics_latest WHERE (feature, metric) IN ((%s, %s), (%s, %s))'
+    assert params == ['foo', 'score', 'foo', 'bar/metric']
+
+    query, params = connection.queries[1]
+    assert query == 'SELECT /* mycroft_holmes */ feature, metric, value FROM features_metrics_latest'
+    assert params is None
+
+
+def test_compact():
+    assert MetricsStorage(config=ConfigForMetricsStorage()).get_retention_policy() is None
+    assert MetricsStorage(config=ConfigForMetricsStorage()).compact() == \
+        {'raw_removed': 0, 'features_downsampled': 0}
+
+    # three batches of raw rows are removed, two features are downsampled
+    connection = MockedConnection(rows=[('foo',), ('bar',)], rowcounts=[0, 2, 2, 1])
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(config=ConfigForMetricsStorage(
+            host='mocked-host', retention={'raw': 30, 'daily': 730, 'batch_size': 2}))
+
+        assert storage.get_retention_policy() == {'raw': 30, 'daily': 730, 'batch_size': 2}
+        stats = storage.compact(today=date(2019, 3, 31))
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+
+    assert stats == {'raw_removed': 5, 'features_downsampled': 2}
+    assert connection.committed is True
+
+    # coverage check, 3 x DELETE, SELECT, 2 x (INSERT, DELETE)
+    assert len(connection.queries) == 9
+
+    query, params = connection.queries[0]
+    assert query.startswith('SELECT /* mycroft_holmes */ COUNT(*) FROM (SELECT DISTINCT ')
+    assert 'FROM features_metrics WHERE timestamp < %s) AS raw WHERE NOT EXISTS' in query
+    assert params == ('2019-03-01',)
+
+    for query, params in connection.queries[1:4]:
+        assert query == 'DELETE /* mycroft_holmes */ FROM features_metrics ' \
+            'WHERE timestamp < %s ORDER BY entry_id LIMIT %s'
+        assert params == ('2019-03-01', 2)
+
+    # the whole month is kept as daily rows
+    assert connection.queries[4][1] == ('2017-03-01',)
+
+    query, params = connection.queries[5]
+    assert query.startswith('INSERT INTO /* mycroft_holmes */ features_metrics_daily ')
+    assert params == ('foo', '2017-03-01')
+
+    query, params = connection.queries[6]
+    assert query.startswith('DELETE /* mycroft_holmes */ FROM features_metrics_daily ')
+    assert params == ('foo', '2017-03-01')
+
+    assert connection.queries[8][1] == ('bar', '2017-03-01')
+
+
+def test_compact_uncovered_raw_rows():
+    # raw rows of 3 days have no daily rows
+    connection = MockedConnection(count=3)
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(config=ConfigForMetricsStorage(
+            host='mocked-host', retention={'raw': 30}))
+
+        with raises(MycroftMetricsStorageError) as ex:
+            storage.compact(today=date(2019, 3, 31))
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+
+    assert 'run backfill_daily_metrics first' in str(ex)
+    assert len(connection.queries) == 1, 'No raw rows are removed'
+
+
+def test_retention_policy_validation():
+    storage = MetricsStorage(config=ConfigForMetricsStorage(retention={'raw': 0}))
+
+    with raises(AssertionError):
+        storage.get_retention_policy()
+
+    # raw rows would be removed before their days are rolled up into per-month rows
+    storage = MetricsStorage(config=ConfigForMetricsStorage(retention={'raw': 60, 'daily': 30}))
+
+    with raises(AssertionError):
+        storage.get_retention_policy()
+
+
+def test_compact_schema_commit():
+    connection = MockedConnection()
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    # IDs are already cached, no lookups are made
+    MySqlMetricsStorage.DIMENSIONS_CACHE[('mocked-host', 'features')] = {'foo': 1}
+    MySqlMetricsStorage.DIMENSIONS_CACHE[('mocked-host', 'metrics')] = {'score': 3, 'bar/metric': 4}
+
+    try:
+        storage = MetricsStorage(
+            config=ConfigForMetricsStorage(host='mocked-host', compact_schema=True))
+        assert storage.raw_table == 'features_metrics_compact'
+
+        storage.push('foo', {'score': 123, 'bar/metric': 42.458})
+        storage.commit(timestamp=TIMESTAMP)
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+        MySqlMetricsStorage.DIMENSIONS_CACHE.clear()
+
+    query, params = connection.queries[0]
+    assert query == 'INSERT INTO /* mycroft_holmes */ features_metrics_compact ' \
+        '(feature_id, metric_id, value, timestamp) VALUES (%s, %s, %s, %s), (%s, %s, %s, %s)'
+    assert params == [1, 3, 123, TIMESTAMP, 1, 4, 42.458, TIMESTAMP]
+
+    # the latest values and daily aggregates are keyed by names
+    query, params = connection.queries[1]
+    assert query.startswith('INSERT INTO /* mycroft_holmes */ features_metrics_latest ')
+    assert params[:4] == ['foo', 'score', 123, TIMESTAMP]
+
+
+def test_get_dimension_ids():
+    connection = MockedConnection(rows=[('foo', 1), ('bar', 2)])
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(config=ConfigForMetricsStorage(host='mocked-host'))
+
+        assert storage.get_dimension_ids('features', {'foo', 'bar'}) == {'foo': 1, 'bar': 2}
+        assert len(connection.queries) == 1
+
+        query, params = connection.queries[0]
+        assert query == 'SELECT /* mycroft_holmes */ feature, feature_id FROM features ' \
+            'WHERE feature IN (%s, %s)'
+        assert params == ['bar', 'foo']
+
+        # cached now
+        assert storage.get_dimension_ids('features', {'foo'}) == {'foo': 1}
+        assert len(connection.queries) == 1
+
+        # a new name is added to the dimension table
+        connection.rows = [('baz', 3)]
+        assert storage.get_dimension_ids('features', {'foo', 'baz'}) == {'foo': 1, 'baz': 3}
+        assert len(connection.queries) == 2
+
+        # the name could not be added (e.g. the insert has failed)
+        connection.rows = []
+        with raises(MycroftMetricsStorageError) as ex:
+            storage.get_dimension_ids('metrics', {'score'})
+
+        assert "['score'] not found in metrics table" in str(ex)
+
+        query, params = connection.queries[-2]
+        assert query == 'INSERT IGNORE INTO /* mycroft_holmes */ metrics (metric) VALUES (%s)'
+        assert params == ['score']
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+        MySqlMetricsStorage.DIMENSIONS_CACHE.clear()
+
+
+class FailingCommitConnection(MockedConnection):
+    """
+    Mocked MySQL connection that fails to commit transactions
+    """
+    def commit(self):
+        raise DatabaseError('Lock wait timeout exceeded; try restarting transaction')
+
+
+class FailingUpsertConnection(MockedConnection):
+    """
+    Mocked MySQL connection that fails to update the latest values of metrics
+    """
+    def __init__(self, **kwargs):
+        super(FailingUpsertConnection, self).__init__(**kwargs)
+        self.log = []
+
+    def commit(self):
+        self.log.append('COMMIT')
+
+    def rollback(self):
+        self.log.append('ROLLBACK')
+
+    def execute(self, query, params=None):
+        super(FailingUpsertConnection, self).execute(query, params)
+        self.log.append(query.split(' (')[0])
+
+        if 'features_metrics_latest' in query:
+            raise DatabaseError('Deadlock found when trying to get lock')
+
+
+def test_failed_replay_is_rolled_back(tmpdir):
+    connection = FailingUpsertConnection(count=None)
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(config=ConfigForMetricsStorage(
+            host='mocked-host', spool_path=str(tmpdir.join('metrics.spool'))))
+
+        storage.spool.append([('foo', 'score', 5, TIMESTAMP), ('foo', 'bar/metric', 1, TIMESTAMP)])
+
+        storage.push('foo', {'score': 7})
+        storage.commit(timestamp=TIMESTAMP_LATER)
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+
+    # raw rows inserted by the failed replay (and the failed run) are not committed
+    insert_raw = 'INSERT INTO /* mycroft_holmes */ features_metrics'
+    insert_latest = 'INSERT INTO /* mycroft_holmes */ features_metrics_latest'
+
+    assert connection.log[-3:] == [insert_raw, insert_latest, 'ROLLBACK']
+    assert connection.log.count('ROLLBACK') == 2
+    assert connection.log.index('ROLLBACK') == connection.log.index(insert_latest) + 1
+
+    # both runs are kept in the spool
+    assert list(storage.spool.read().keys()) == [TIMESTAMP, TIMESTAMP_LATER]
+    assert len(storage.spool) == 3
+
+
+def test_dimension_ids_cached_after_commit():
+    connection = FailingCommitConnection(rows=[('foo', 1)])
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(
+            config=ConfigForMetricsStorage(host='mocked-host', compact_schema=True))
+
+        storage.push('foo', {'score': 123})
+
+        with raises(MycroftMetricsStorageError):
+            storage.write_rows(storage.get_rows(TIMESTAMP))
+
+        # IDs of dimensions that might have been rolled back are not kept
+        assert MySqlMetricsStorage.DIMENSIONS_CACHE[('mocked-host', 'features')] == {}
+        assert not any(query.startswith('INSERT INTO') for query, _ in connection.queries), \
+            'Rows are not inserted before dimensions are committed'
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+        MySqlMetricsStorage.DIMENSIONS_CACHE.clear()
+
+
+def test_compact_schema():
+    if environ.get('TEST_DATABASE') is None:
+        raise SkipTest('TEST_DATABASE env variable needs to be set to run this test.')
+
+    storage = MetricsStorage(config=ConfigForMetricsStorage(), use_slave=False)
+
+    # clean up the storage
+    cursor = storage.storage.cursor()
+    cursor.execute('TRUNCATE TABLE features_metrics')
+    cursor.execute('TRUNCATE TABLE features_metrics_daily')
+    cursor.execute('TRUNCATE TABLE features_metrics_compact')
+
+    storage.push('foo', {'score': 123, 'bar/metric': 42.458})
+    storage.commit(timestamp=TIMESTAMP)
+
+    history = list(storage.get_feature_metrics_history(feature__id='foo'))
+
+    # copy the history and then keep on storing metrics in compact form
+    assert storage.migrate_to_compact_schema(batch_size=1) == 2
+    assert storage.migrate_to_compact_schema() == 0, 'Rows are copied only once'
+
+    storage = MetricsStorage(
+        config=ConfigForMetricsStorage(compact_schema=True), use_slave=False)
+
+    storage.push('foo', {'score': 125})
+    storage.commit(timestamp=TIMESTAMP_LATER)
+
+    cursor.execute('TRUNCATE TABLE features_metrics_daily')
+    assert storage.backfill_daily_metrics() == 1
+
+    assert list(storage.get_feature_metrics_history(feature__id='foo')) == history + [
+        {'date': '2019-03-04', 'metric': 'score', 'value': 125.0},
+    ]
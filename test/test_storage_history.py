@@ -0,0 +1,93 @@
+"""
+Set of unit test for memory-mapped history store
+"""
+import numpy as np
+
+from mycroft_holmes.config import Config
+from mycroft_holmes.storage import MetricsStorage
+from mycroft_holmes.storage.history import HistoryStore
+
+TIMESTAMP = '2019-03-02 20:22:24'
+TIMESTAMP_LATER = '2019-03-04 10:22:24'
+
+
+class ConfigForHistoryStore(Config):
+    def __init__(self, tmpdir):
+        self.data = {
+            'storage': {
+                'engine': 'sqlite',
+                'path': str(tmpdir.join('metrics.sqlite')),
+                'history_path': str(tmpdir.join('history')),
+            }
+        }
+
+
+def test_history_store(tmpdir):
+    store = HistoryStore(path=str(tmpdir))
+
+    assert store.get_metrics('foo') == []
+    assert len(store.get_metric_history('foo', 'score')) == 0
+
+    store.append([
+        ('foo', 'score', 5, '2019-03-01 10:00:00'),
+        ('foo', 'bar/metric', 1.234, '2019-03-01 10:00:00'),
+    ])
+    store.append([('foo', 'score', 7, '2019-03-02 10:00:00')])
+    store.append([('foo', 'score', 6, '2019-03-03 10:00:00')])
+
+    assert store.get_metrics('foo') == ['bar/metric', 'score']
+    assert tmpdir.join('foo', 'bar%2Fmetric.bin').check()
+
+    # records are memory-mapped and sliced with no copy
+    records = store.get_metric_history('foo', 'score')
+    assert isinstance(records, np.memmap)
+    assert records['value'].tolist() == [5.0, 7.0, 6.0]
+
+    records = store.get_metric_history(
+        'foo', 'score', since='2019-03-02 00:00:00', until='2019-03-03 10:00:00')
+    assert isinstance(records, np.memmap)
+    assert records['value'].tolist() == [7.0]
+
+    # an older value is put in the right place
+    store.append([('foo', 'score', 3, '2019-03-01 20:00:00')])
+    assert store.get_metric_history('foo', 'score')['value'].tolist() == [5.0, 3.0, 7.0, 6.0]
+
+    assert list(store.get_feature_metrics_history('foo', aggregate='last')) == [
+        {'date': '2019-03-01', 'metric': 'bar/metric', 'value': 1.23},
+        {'date': '2019-03-01', 'metric': 'score', 'value': 3.0},
+        {'date': '2019-03-02', 'metric': 'score', 'value': 7.0},
+        {'date': '2019-03-03', 'metric': 'score', 'value': 6.0},
+    ]
+
+    assert [row['value'] for row in store.get_feature_metrics_history('foo', aggregate='avg')] == \
+        [1.23, 4.0, 7.0, 6.0]
+
+    store.clear()
+    assert store.get_metrics('foo') == []
+
+
+def test_storage_with_history_store(tmpdir):
+    storage = MetricsStorage(config=ConfigForHistoryStore(tmpdir))
+
+    storage.push('foo', {'score': 123, 'bar/metric': 42.458})
+    storage.push('bar', {'score': 1, 'bar/metric': -3})
+    storage.commit(timestamp=TIMESTAMP)
+
+    storage.push('bar', {'score': 1, 'bar/metric': 6})
+    storage.commit(timestamp=TIMESTAMP)
+
+    storage.push('bar', {'score': 5, 'bar/metric': -4})
+    storage.commit(timestamp=TIMESTAMP_LATER)
+
+    # the history store gives the same results as the database
+    for aggregate in MetricsStorage.HISTORY_AGGREGATES:
+        for feature_id in ['foo', 'bar']:
+            assert list(storage.get_feature_metrics_history(feature_id, aggregate=aggregate)) == \
+                list(storage.get_daily_metrics_history(feature_id, aggregate=aggregate))
+
+    history = list(storage.get_feature_metrics_history('bar'))
+    assert history[0] == {'date': '2019-03-02', 'metric': 'bar/metric', 'value': 6.0}
+
+    # it can be rebuilt from the database
+    assert storage.rebuild_history_store(batch_size=4) == 8
+    assert list(storage.get_feature_metrics_history('bar')) == history
@@ -0,0 +1,129 @@
+"""
+Set of unit test for storage connections pool
+"""
+import threading
+
+from pytest import raises
+
+from mycroft_holmes.errors import MycroftMetricsStorageError
+from mycroft_holmes.storage import MetricsStorage
+from mycroft_holmes.storage.pool import ConnectionPool
+
+from .test_storage import ConfigForMetricsStorage, MockedConnection, get_mocked_pool
+
+
+class PooledConnection:
+    """
+    Connection that can be told to stop working
+    """
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+
+    def ping(self):
+        if self.broken:
+            raise ConnectionError('Lost connection to MySQL server')
+
+    def close(self):
+        self.closed = True
+
+
+def get_pool(**kwargs):
+    """
+    :rtype: ConnectionPool
+    """
+    return ConnectionPool(
+        connect=PooledConnection, check=lambda connection: connection.ping(), **kwargs)
+
+
+def test_connections_are_reused():
+    pool = get_pool(size=2)
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+
+    pool.release(first)
+    assert pool.acquire() is first
+
+    # the connection has not been idle for long, so it's not checked
+    stats = pool.get_stats()
+    assert stats['checkouts'] == 3
+    assert stats['health_checks'] == 0
+    assert stats['connections'] == 2
+    assert stats['in_use'] == 2
+    assert stats['idle'] == 0
+
+
+def test_idle_connections_are_checked():
+    pool = get_pool(health_check_interval=0)
+
+    connection = pool.acquire()
+    pool.release(connection)
+
+    assert pool.acquire() is connection
+    pool.release(connection)
+
+    # the server has gone away, a new connection is made
+    connection.broken = True
+    new_connection = pool.acquire()
+
+    assert new_connection is not connection
+    assert connection.closed is True
+
+    stats = pool.get_stats()
+    assert stats['health_checks'] == 2
+    assert stats['reconnects'] == 1
+    assert stats['connections'] == 1
+
+
+def test_waiting_for_connection():
+    pool = get_pool(size=1, timeout=0.01)
+    connection = pool.acquire()
+
+    with raises(MycroftMetricsStorageError):
+        pool.acquire()
+
+    assert pool.get_stats()['timeouts'] == 1
+
+    # the connection is returned by another thread
+    pool.timeout = 5
+    timer = threading.Timer(0.05, pool.release, args=(connection,))
+    timer.start()
+
+    assert pool.acquire() is connection
+    timer.join()
+
+    stats = pool.get_stats()
+    assert stats['waits'] == 2
+    assert stats['timeouts'] == 1
+    assert stats['wait_time'] > 0
+
+    # broken connections are discarded and free their slot
+    pool.release(connection, discard=True)
+    assert connection.closed is True
+    assert pool.get_stats()['connections'] == 0
+    assert pool.acquire() is not connection
+
+
+def test_storage_uses_pool():
+    connection = MockedConnection(rows=[('foo', 'score', 1)])
+    MetricsStorage.CONNECTION_POOLS['mocked-host'] = get_mocked_pool(connection)
+
+    try:
+        storage = MetricsStorage(config=ConfigForMetricsStorage(host='mocked-host'))
+        storage.get_all_latest()
+        storage.get_all_latest()
+
+        assert MetricsStorage.get_pools_stats()['mocked-host']['in_use'] == 1
+
+        storage.close()
+        stats = MetricsStorage.get_pools_stats()['mocked-host']
+    finally:
+        del MetricsStorage.CONNECTION_POOLS['mocked-host']
+
+    # a single checkout per storage instance and no ping per query
+    assert stats['checkouts'] == 1
+    assert stats['health_checks'] == 0
+    assert stats['in_use'] == 0
+    assert stats['idle'] == 1
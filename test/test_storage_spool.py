@@ -0,0 +1,99 @@
+"""
+Set of unit test for metrics spool
+"""
+import pytest
+
+from mycroft_holmes.config import Config
+from mycroft_holmes.errors import MycroftMetricsStorageError
+from mycroft_holmes.storage import MetricsStorage
+from mycroft_holmes.storage.spool import MetricsSpool
+
+TIMESTAMP = '2019-03-02 20:22:24'
+TIMESTAMP_LATER = '2019-03-04 10:22:24'
+
+
+class ConfigForSpool(Config):
+    def __init__(self, tmpdir, spool=True):
+        self.data = {
+            'storage': {
+                'engine': 'sqlite',
+                'path': str(tmpdir.join('metrics.sqlite')),
+            }
+        }
+
+        if spool:
+            self.data['storage']['spool_path'] = str(tmpdir.join('spool', 'metrics.spool'))
+
+
+def test_spool(tmpdir):
+    spool = MetricsSpool(path=str(tmpdir.join('metrics.spool')))
+
+    assert spool.is_empty()
+    assert len(spool) == 0
+
+    spool.append([('foo', 'score', 5, TIMESTAMP), ('foo', 'bar/metric', 1.5, TIMESTAMP)])
+    spool.append([('foo', 'score', 7, TIMESTAMP_LATER)])
+
+    # the process was killed while writing the last record
+    tmpdir.join('metrics.spool').write('{"feature": "foo", "met', mode='a')
+
+    assert not spool.is_empty()
+    assert len(spool) == 3
+
+    runs = spool.read()
+    assert list(runs.keys()) == [TIMESTAMP, TIMESTAMP_LATER]
+    assert runs[TIMESTAMP] == [
+        ('foo', 'score', 5.0, TIMESTAMP), ('foo', 'bar/metric', 1.5, TIMESTAMP)]
+
+    spool.clear()
+    assert spool.is_empty()
+
+
+def test_commit_spools_metrics(tmpdir, monkeypatch):
+    storage = MetricsStorage(config=ConfigForSpool(tmpdir))
+    write_rows = storage.write_rows
+
+    def failing_write_rows(rows):
+        raise MycroftMetricsStorageError('Storage error occured: database is gone')
+
+    # the database can not be reached, metrics are kept in the spool
+    monkeypatch.setattr(storage, 'write_rows', failing_write_rows)
+
+    storage.push('foo', {'score': 123, 'bar/metric': 42.458})
+    storage.commit(timestamp=TIMESTAMP)
+
+    assert storage.data == {}
+    assert len(storage.spool) == 2
+    assert storage.get('foo', 'score') is None
+
+    # the next run stores spooled metrics first
+    monkeypatch.setattr(storage, 'write_rows', write_rows)
+
+    storage.push('foo', {'score': 124, 'bar/metric': 43})
+    storage.commit(timestamp=TIMESTAMP_LATER)
+
+    assert storage.spool.is_empty()
+    assert storage.get('foo', 'score') == 124
+    assert [row[3] for row in storage.get_raw_rows()] == [TIMESTAMP] * 2 + [TIMESTAMP_LATER] * 2
+
+    # replaying runs that are already stored is a no-op
+    storage.spool.append([('foo', 'score', 123, TIMESTAMP), ('foo', 'bar/metric', 42.458, TIMESTAMP)])
+    assert storage.replay_spool() == 0
+    assert len(list(storage.get_raw_rows())) == 4
+
+
+def test_commit_with_no_spool(tmpdir, monkeypatch):
+    storage = MetricsStorage(config=ConfigForSpool(tmpdir, spool=False))
+
+    def failing_write_rows(rows):
+        raise MycroftMetricsStorageError('Storage error occured: database is gone')
+
+    monkeypatch.setattr(storage, 'write_rows', failing_write_rows)
+
+    storage.push('foo', {'score': 123})
+
+    with pytest.raises(MycroftMetricsStorageError):
+        storage.commit(timestamp=TIMESTAMP)
+
+    with pytest.raises(MycroftMetricsStorageError):
+        storage.replay_spool()
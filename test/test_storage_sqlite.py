@@ -0,0 +1,191 @@
+"""
+Set of unit test for SQLite metrics storage
+"""
+from datetime import date, datetime
+
+from pytest import raises
+
+from mycroft_holmes.config import Config
+from mycroft_holmes.errors import MycroftMetricsStorageError
+from mycroft_holmes.metric import Metric
+from mycroft_holmes.storage import MetricsStorage, SqliteMetricsStorage
+
+TIMESTAMP = '2019-03-02 20:22:24'
+TIMESTAMP_LATER = '2019-03-04 10:22:24'
+
+
+class ConfigForSqliteStorage(Config):
+    def __init__(self, path, **kwargs):
+        self.data = {
+            'storage': {
+                'engine': 'sqlite',
+                'path': path,
+            }
+        }
+
+        self.data['storage'].update(kwargs)
+
+
+def test_engines():
+    assert sorted(MetricsStorage.engines().keys()) == ['mysql', 'sqlite']
+
+    with raises(MycroftMetricsStorageError):
+        MetricsStorage(config=ConfigForSqliteStorage(path='', engine='foo'))
+
+    with raises(AssertionError):
+        MetricsStorage(config=ConfigForSqliteStorage(path=''))
+
+
+def test_storage(tmpdir):
+    config = ConfigForSqliteStorage(path=str(tmpdir.join('metrics.sqlite')))
+    storage = MetricsStorage(config=config)
+
+    assert isinstance(storage, SqliteMetricsStorage)
+    assert storage.get_the_latest_timestamp() is None
+
+    # push some metrics and later on try to get them
+    storage.push('foo', {'score': 123, 'bar/metric': 42.458})
+    storage.push('bar', {'score': 1, 'bar/metric': -3})
+    storage.commit(timestamp=TIMESTAMP)
+
+    # multiple values in the same day - test values aggregation
+    storage.push('bar', {'score': 1, 'bar/metric': 6})
+    storage.commit(timestamp=TIMESTAMP)
+
+    storage.push('bar', {'score': 5, 'bar/metric': -4})
+    storage.commit(timestamp=TIMESTAMP_LATER)
+
+    assert storage.get(feature_id='foo', feature_metric='score') == 123
+    assert storage.get(feature_id='foo', feature_metric='bar/metric') == 42.46
+
+    assert storage.get(feature_id='bar', feature_metric='score') == 5, 'The most recent value should be taken'
+    assert storage.get(feature_id='bar', feature_metric='bar/metric') == -4, 'Negative values are accepted'
+    assert storage.get(feature_id='not_existing', feature_metric='bar/metric') is None
+
+    assert storage.get_many([('foo', 'score'), ('bar', 'score'), ('not_existing', 'score')]) == {
+        ('foo', 'score'): 123,
+        ('bar', 'score'): 5,
+    }
+    assert len(storage.get_all_latest()) == 4
+
+    # metrics read their values from the storage
+    metric = Metric(feature_name='Bar', config=config, spec={'name': 'bar/metric'})
+    assert metric.value == -4
+
+    assert storage.get_the_latest_timestamp() == TIMESTAMP_LATER
+
+    # get metrics history
+    assert list(storage.get_feature_metrics_history(feature__id='not_existing')) == []
+
+    assert list(storage.get_feature_metrics_history(feature__id='bar')) == [
+        {'date': '2019-03-02', 'metric': 'bar/metric', 'value': 6.0},  # get max value for the day
+        {'date': '2019-03-02', 'metric': 'score', 'value': 1.0},
+        {'date': '2019-03-04', 'metric': 'bar/metric', 'value': -4.0},
+        {'date': '2019-03-04', 'metric': 'score', 'value': 5.0}
+    ]
+
+    assert list(storage.get_feature_metrics_history(feature__id='bar', aggregate='avg'))[0] == \
+        {'date': '2019-03-02', 'metric': 'bar/metric', 'value': 1.5}
+
+    # rebuilding the rollup table gives the same results
+    history = list(storage.get_feature_metrics_history(feature__id='bar', aggregate='last'))
+    assert history[0] == {'date': '2019-03-02', 'metric': 'bar/metric', 'value': 6.0}
+
+    assert storage.backfill_daily_metrics() == 2
+    assert list(storage.get_feature_metrics_history(feature__id='bar', aggregate='last')) == history
+
+    # values committed with an older timestamp do not replace the latest ones
+    storage.push('bar', {'score': 7})
+    storage.commit(timestamp=TIMESTAMP)
+
+    assert storage.get(feature_id='bar', feature_metric='score') == 5
+
+    # the current day is read from raw rows
+    storage.push('foo', {'score': 10})
+    storage.commit()
+    storage.push('foo', {'score': 20})
+    storage.commit()
+
+    assert list(storage.get_feature_metrics_history(feature__id='foo', aggregate='last'))[-1] == \
+        {'date': str(date.today()), 'metric': 'score', 'value': 20.0}
+
+
+def test_compact(tmpdir):
+    storage = MetricsStorage(config=ConfigForSqliteStorage(
+        path=str(tmpdir.join('metrics.sqlite')),
+        retention={'raw': 30, 'daily': 50, 'batch_size': 2}
+    ))
+
+    for day in range(1, 29):
+        storage.push('foo', {'score': day})
+        storage.commit(timestamp=str(datetime(2019, 1, day, 12, 0, 0)))
+
+    storage.push('foo', {'score': 1})
+    storage.commit(timestamp=TIMESTAMP)
+
+    assert storage.compact(today=date(2019, 3, 31)) == {'raw_removed': 28, 'features_downsampled': 1}
+    assert storage.compact(today=date(2019, 3, 31)) == {'raw_removed': 0, 'features_downsampled': 0}
+
+    # January is now stored as a single per-month row
+    history = {
+        aggregate: list(storage.get_feature_metrics_history(feature__id='foo', aggregate=aggregate))
+        for aggregate in ['min', 'max', 'last', 'avg']
+    }
+
+    assert history['min'] == [
+        {'date': '2019-01-01', 'metric': 'score', 'value': 1.0},
+        {'date': '2019-03-02', 'metric': 'score', 'value': 1.0},
+    ]
+
+    assert history['max'][0]['value'] == 28.0
+    assert history['last'][0]['value'] == 28.0
+    assert history['avg'][0]['value'] == 14.5
+
+
+def test_compact_uncovered_raw_rows(tmpdir):
+    storage = MetricsStorage(config=ConfigForSqliteStorage(
+        path=str(tmpdir.join('metrics.sqlite')),
+        retention={'raw': 30, 'daily': 50}
+    ))
+
+    storage.push('foo', {'score': 1})
+    storage.commit(timestamp='2019-01-15 12:00:00')
+
+    assert storage.compact(today=date(2019, 3, 31)) == {'raw_removed': 1, 'features_downsampled': 1}
+
+    # per-month rows cover raw rows of days that have already been downsampled
+    with storage.storage:
+        storage.storage.execute(
+            'INSERT INTO features_metrics (feature, metric, value, timestamp) VALUES (?, ?, ?, ?)',
+            ('foo', 'score', 2, '2019-01-20 12:00:00'))
+
+    assert storage.count_uncovered_days(before=date(2019, 3, 1)) == 0
+
+    # raw rows with no daily ones are not removed
+    with storage.storage:
+        storage.storage.execute(
+            'INSERT INTO features_metrics (feature, metric, value, timestamp) VALUES (?, ?, ?, ?)',
+            ('foo', 'score', 3, '2019-02-20 12:00:00'))
+
+    assert storage.count_uncovered_days(before=date(2019, 3, 1)) == 1
+
+    with raises(MycroftMetricsStorageError):
+        storage.compact(today=date(2019, 3, 31))
+
+    assert len(list(storage.get_raw_rows())) == 2
+
+    storage.backfill_daily_metrics()
+    assert storage.compact(today=date(2019, 3, 31))['raw_removed'] == 2
+
+
+def test_close(tmpdir):
+    storage = MetricsStorage(config=ConfigForSqliteStorage(path=str(tmpdir.join('metrics.sqlite'))))
+
+    storage.push('foo', {'score': 5})
+    storage.commit(timestamp=TIMESTAMP)
+    storage.close()
+    storage.close()
+
+    # the database file is opened again
+    assert storage.get(feature_id='foo', feature_metric='score') == 5
+    storage.close()